@@ -0,0 +1,204 @@
+import fnmatch
+import math
+import time
+from collections import OrderedDict, deque
+
+ANOMALY_TTL = 3600.0  # forget sensors silent for an hour
+MAX_TRACKED_SENSORS = 100000
+
+
+# ------------ Streaming detection rules ------------
+#
+# A rule is built from a spec dict such as
+#   {"rule": "threshold", "field": "temperature", "above": 50, "type": "temperature_high"}
+# and checks one reading at a time. Stateful rules keep one small state
+# object per sensor, created by new_state().
+
+
+class ThresholdRule:
+    def __init__(self, field, above=None, below=None, type=None):
+        if above is None and below is None:
+            raise ValueError("threshold rule needs 'above' or 'below'")
+        self.field = field
+        self.above = above
+        self.below = below
+        self.type = type or f"{field}_{'high' if above is not None else 'low'}"
+
+    def new_state(self):
+        return None
+
+    def check(self, state, value, now):
+        if self.above is not None and value > self.above:
+            return True
+        return self.below is not None and value < self.below
+
+
+class RateOfChangeRule:
+    # Fires when the value moves faster than max_rate units per second
+    # between two consecutive readings of the same sensor.
+    def __init__(self, field, max_rate, type=None):
+        self.field = field
+        self.max_rate = max_rate
+        self.type = type or f"{field}_rate"
+
+    def new_state(self):
+        return [None, None]  # last value, last arrival time
+
+    def check(self, state, value, now):
+        last_value, last_time = state
+        state[0] = value
+        state[1] = now
+        if last_value is None or now <= last_time:
+            return False
+        return abs(value - last_value) / (now - last_time) > self.max_rate
+
+
+class ZScoreRule:
+    # Fires when a value is more than threshold standard deviations away
+    # from the mean of the previous `window` readings.
+    def __init__(self, field, window=30, threshold=3.0, min_samples=10, type=None):
+        self.field = field
+        self.window = window
+        self.threshold = threshold
+        self.min_samples = min(min_samples, window)
+        self.type = type or f"{field}_zscore"
+
+    def new_state(self):
+        return [deque(maxlen=self.window), 0.0, 0.0]  # values, sum, sum of squares
+
+    def check(self, state, value, now):
+        values, total, sq = state
+        fired = False
+        n = len(values)
+        if n >= self.min_samples:
+            mean = total / n
+            std = math.sqrt(max(sq / n - mean * mean, 0.0))
+            fired = std > 0 and abs(value - mean) / std > self.threshold
+        if n == self.window:
+            old = values[0]
+            total -= old
+            sq -= old * old
+        values.append(value)
+        state[1] = total + value
+        state[2] = sq + value * value
+        return fired
+
+
+class EWMARule:
+    # Exponentially weighted mean and variance; fires when a value is more
+    # than threshold EW standard deviations from the EW mean.
+    def __init__(self, field, alpha=0.1, threshold=3.0, warmup=10, type=None):
+        if not 0 < alpha <= 1:
+            raise ValueError("EWMA alpha must be in (0, 1]")
+        self.field = field
+        self.alpha = alpha
+        self.threshold = threshold
+        self.warmup = warmup
+        self.type = type or f"{field}_ewma"
+
+    def new_state(self):
+        return [0, 0.0, 0.0]  # samples seen, mean, variance
+
+    def check(self, state, value, now):
+        n, mean, var = state
+        if n == 0:
+            state[0], state[1] = 1, value
+            return False
+        diff = value - mean
+        fired = n >= self.warmup and var > 0 and abs(diff) > self.threshold * math.sqrt(var)
+        incr = self.alpha * diff
+        state[0] = n + 1
+        state[1] = mean + incr
+        state[2] = (1 - self.alpha) * (var + diff * incr)
+        return fired
+
+
+RULES = {
+    "threshold": ThresholdRule,
+    "rate": RateOfChangeRule,
+    "zscore": ZScoreRule,
+    "ewma": EWMARule,
+}
+
+# The checks the drone has always made.
+DEFAULT_RULES = [
+    {"rule": "threshold", "field": "temperature", "above": 50, "type": "temperature_high"},
+    {"rule": "threshold", "field": "humidity", "below": 10, "type": "humidity_low"},
+]
+
+
+def build_rule(spec):
+    spec = dict(spec)
+    kind = spec.pop("rule", None)
+    if kind not in RULES:
+        raise ValueError(f"Unknown anomaly rule {kind!r}; expected one of {', '.join(RULES)}")
+    if spec.get("field") not in ("temperature", "humidity"):
+        raise ValueError(f"Anomaly rule needs field 'temperature' or 'humidity', got {spec.get('field')!r}")
+    return RULES[kind](**spec)
+
+
+class DetectorPipeline:
+    """Runs every reading through its sensor's rules as it is received.
+
+    sensor_rules maps sensor IDs or fnmatch patterns (e.g. "greenhouse-*")
+    to rule specs that replace the defaults for matching sensors; the first
+    matching pattern wins. Rule state is kept per sensor: expire() drops
+    sensors not evaluated for ttl seconds, and beyond max_sensors the least
+    recently evaluated one makes room for a new one.
+    """
+
+    def __init__(self, rules=DEFAULT_RULES, sensor_rules=None, ttl=ANOMALY_TTL, max_sensors=MAX_TRACKED_SENSORS):
+        self.default_rules = [build_rule(spec) for spec in rules]
+        self.sensor_rules = [(pattern, [build_rule(spec) for spec in specs])
+                             for pattern, specs in (sensor_rules or {}).items()]
+        self.ttl = ttl
+        self.max_sensors = max_sensors
+        self._sensors = OrderedDict()  # sensor_id -> [[(rule, state), ...], last evaluated], least recent first
+
+    def rules_for(self, sensor_id):
+        for pattern, rules in self.sensor_rules:
+            if pattern == sensor_id or fnmatch.fnmatchcase(sensor_id, pattern):
+                return rules
+        return self.default_rules
+
+    def evaluate(self, sensor_id, temperature, humidity, timestamp=None, now=None):
+        now = time.monotonic() if now is None else now
+        sensors = self._sensors
+        entry = sensors.get(sensor_id)
+        if entry is None:
+            entry = sensors[sensor_id] = [[(rule, rule.new_state()) for rule in self.rules_for(sensor_id)], now]
+            if len(sensors) > self.max_sensors:
+                sensors.popitem(last=False)
+        else:
+            entry[1] = now
+            sensors.move_to_end(sensor_id)
+        anomalies = []
+        for rule, state in entry[0]:
+            value = temperature if rule.field == "temperature" else humidity
+            if rule.check(state, value, now):
+                anomalies.append({
+                    "sensor_id": sensor_id,
+                    "type": rule.type,
+                    "value": value,
+                    "timestamp": timestamp
+                })
+        return anomalies
+
+    def forget(self, sensor_id):
+        self._sensors.pop(sensor_id, None)
+
+    def expire(self, now=None):
+        # Drops rule state for sensors idle for longer than ttl.
+        now = time.monotonic() if now is None else now
+        sensors = self._sensors
+        expired = 0
+        while sensors:
+            sensor_id, entry = next(iter(sensors.items()))
+            if now - entry[1] <= self.ttl:
+                break
+            del sensors[sensor_id]
+            expired += 1
+        return expired
+
+    def __len__(self):
+        return len(self._sensors)
@@ -0,0 +1,98 @@
+import argparse
+import asyncio
+import multiprocessing
+import os
+import tempfile
+import time
+
+from central_server import CentralEngine
+from protocol import FrameDecoder, pack_json
+
+# Runs a CentralEngine in this process and N simulated drones in a client
+# process, for several worker counts, and reports how many packets (and
+# sensor averages) per second are processed and acknowledged, and stored
+# once the time-series writers have committed. Each worker writes its own
+# SQLite file, so scaling with workers is bounded by the cores available.
+
+WINDOW = 64  # packets each drone keeps in flight, like the uplink
+
+
+def make_frames(drone_id, packets, sensors):
+    averages = {f"sensor{n}": {"avg_temperature": 20.0 + n % 10, "avg_humidity": 50.0}
+                for n in range(sensors)}
+    return [pack_json({"drone_id": drone_id, "timestamp": "2024-01-01T00:00:00",
+                       "averages": averages, "anomalies": [], "seq": seq})
+            for seq in range(1, packets + 1)]
+
+
+async def run_drone(port, drone_id, frames):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(pack_json({"type": "hello", "session": os.urandom(8).hex(), "drone_id": drone_id}))
+    decoder = FrameDecoder()
+    acked = sent = 0
+    while acked < len(frames):
+        while sent < len(frames) and sent - acked < WINDOW:
+            writer.write(frames[sent])
+            sent += 1
+        await writer.drain()
+        data = await reader.read(65536)
+        if not data:
+            raise ConnectionError(f"{drone_id}: connection closed at ack {acked}")
+        for ack in decoder.feed_json(data):
+            acked = max(acked, ack["ack"])
+    writer.close()
+
+
+async def run_drones(port, frames):
+    start = time.perf_counter()
+    await asyncio.gather(*(run_drone(port, drone_id, f) for drone_id, f in frames.items()))
+    return time.perf_counter() - start
+
+
+def client(port, drones, packets, sensors, results):
+    frames = {f"drone{n}": make_frames(f"drone{n}", packets, sensors) for n in range(drones)}
+    results.put("ready")
+    results.put(asyncio.run(run_drones(port, frames)))
+
+
+def run(ctx, workers, drones, packets, sensors):
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = CentralEngine("127.0.0.1", 0, os.path.join(tmp, "bench.db"), workers).start()
+        engine.ready.wait()
+        results = ctx.Queue()
+        proc = ctx.Process(target=client, args=(engine.port, drones, packets, sensors, results))
+        proc.start()
+        results.get()
+        elapsed = results.get()
+        proc.join()
+        start = time.perf_counter()
+        engine.stop()  # waits for every store to commit
+        flush = time.perf_counter() - start
+    return elapsed, flush
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Central server multi-drone benchmark")
+    parser.add_argument("--workers", type=int, nargs="+", default=[0, 1, 2, 4],
+                        help="Worker process counts to compare (default: 0 1 2 4)")
+    parser.add_argument("--drones", type=int, nargs="+", default=[1, 10, 25, 50],
+                        help="Drone counts to compare (default: 1 10 25 50)")
+    parser.add_argument("--packets", type=int, default=100, help="Packets per drone (default: 100)")
+    parser.add_argument("--sensors", type=int, default=100, help="Sensor averages per packet (default: 100)")
+    args = parser.parse_args()
+
+    ctx = multiprocessing.get_context("spawn")
+    print(f"cores: {os.cpu_count()}, {args.packets} packets x {args.sensors} sensors per drone")
+    print(f"{'workers':>7} {'drones':>6} {'packets/s':>10} {'averages/s':>11} {'stored/s':>10} "
+          f"{'acked in':>9} {'db flush':>9}")
+    for workers in args.workers:
+        for drones in args.drones:
+            elapsed, flush = run(ctx, workers, drones, args.packets, args.sensors)
+            packets = drones * args.packets
+            averages = packets * args.sensors
+            print(f"{workers:>7} {drones:>6} {packets / elapsed:>10,.0f} {averages / elapsed:>11,.0f} "
+                  f"{averages / (elapsed + flush):>10,.0f} {elapsed:>8.2f}s {flush:>8.2f}s")
+
+
+if __name__ == "__main__":
+    main()
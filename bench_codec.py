@@ -0,0 +1,51 @@
+import argparse
+import time
+
+from codec import ReadingDecoder, make_encoder
+from protocol import FrameDecoder
+from sensor_node import generate_payload
+
+# Compares the JSON and compact struct reading codecs: encode and decode cost
+# per reading (including framing) and bytes on the wire.
+
+
+def bench(codec, readings):
+    encoder = make_encoder(codec)
+    start = time.perf_counter()
+    chunks = [encoder.encode(r) for r in readings]
+    encode_time = time.perf_counter() - start
+
+    wire = b"".join(chunks)
+    frames = FrameDecoder()
+    decoder = ReadingDecoder()
+    decoded = []
+    start = time.perf_counter()
+    for offset in range(0, len(wire), 65536):
+        for frame in frames.feed(wire[offset:offset + 65536]):
+            msg = decoder.decode(frame)
+            if msg is not None:
+                decoded.append(msg)
+    decode_time = time.perf_counter() - start
+    assert len(decoded) == len(readings)
+    return encode_time, decode_time, len(wire)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reading codec benchmark")
+    parser.add_argument("--readings", type=int, default=200000, help="Readings to encode (default: 200000)")
+    parser.add_argument("--sensors", type=int, default=100, help="Distinct sensor IDs (default: 100)")
+    args = parser.parse_args()
+
+    readings = [generate_payload(f"sensor{n % args.sensors}") for n in range(args.readings)]
+    results = {codec: bench(codec, readings) for codec in ("json", "struct")}
+
+    n = args.readings
+    print(f"{'codec':8} {'encode us':>10} {'decode us':>10} {'bytes':>8}")
+    for codec, (enc, dec, size) in results.items():
+        print(f"{codec:8} {enc / n * 1e6:10.2f} {dec / n * 1e6:10.2f} {size / n:8.1f}")
+    j, s = results["json"], results["struct"]
+    print(f"struct vs json: {j[0] / s[0]:.1f}x encode, {j[1] / s[1]:.1f}x decode, {j[2] / s[2]:.1f}x smaller")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+import argparse
+import asyncio
+import multiprocessing
+import socket
+import tempfile
+import threading
+import time
+
+import drone_server
+from bench_ingest import raise_fd_limit, run_sensor
+from protocol import FrameDecoder, pack_json
+
+# Floods a DroneEngine with sensor readings while its uplink talks to a
+# deliberately slow central server, and reports ingest throughput and lock
+# waits per uplink latency. Aggregation runs every AGGREGATION_INTERVAL so
+# the tick contends with ingest as often as possible.
+
+AGGREGATION_INTERVAL = 0.05
+
+
+class SlowCentral:
+    """Acknowledges uplink packets, but only `latency` seconds after each recv."""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.sock = socket.create_server(("127.0.0.1", 0))
+        self.port = self.sock.getsockname()[1]
+        threading.Thread(target=self.serve, daemon=True).start()
+
+    def serve(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            threading.Thread(target=self.handle, args=(conn,), daemon=True).start()
+
+    def handle(self, conn):
+        decoder = FrameDecoder()
+        with conn:
+            try:
+                while True:
+                    data = conn.recv(65536)
+                    if not data:
+                        return
+                    acks = [p["seq"] for p in decoder.feed_json(data) if "seq" in p]
+                    time.sleep(self.latency)
+                    if acks:
+                        conn.sendall(pack_json({"ack": acks[-1]}))
+            except OSError:
+                pass  # the drone hung up first
+
+    def close(self):
+        self.sock.close()
+
+
+def client(port, sensors, messages, concurrency):
+    async def run():
+        gate = asyncio.Semaphore(concurrency)
+        writers = await asyncio.gather(*(run_sensor("127.0.0.1", port, f"sensor{n}", messages, gate)
+                                         for n in range(sensors)))
+        await asyncio.sleep(5)  # let the drone drain before the sockets close
+        for w in writers:
+            w.close()
+
+    raise_fd_limit(sensors + 64)
+    asyncio.run(run())
+
+
+def received():
+    return sum(drone_server.SENSOR_MESSAGES.values.values())
+
+
+def run(ctx, latency, sensors, messages, concurrency):
+    central = SlowCentral(latency)
+    wait = drone_server.INGEST_LOCK_WAIT
+    wait_count, wait_sum = wait.count, wait.sum
+    wait.max = 0.0
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = drone_server.DroneEngine("127.0.0.1", 0, "127.0.0.1", central.port, tmp, battery_drain=False)
+        engine.start()
+        engine.sensor_server.ready.wait()
+        before = received()
+        expected = sensors * messages
+        proc = ctx.Process(target=client, args=(engine.sensor_server.port, sensors, messages, concurrency))
+        start = time.perf_counter()
+        proc.start()
+        while received() - before < expected and proc.is_alive():
+            time.sleep(0.01)
+        elapsed = time.perf_counter() - start
+        count = received() - before
+        backlog = engine.uplink.backlog()
+        proc.join()
+        engine.stop()
+    central.close()
+    waits = wait.count - wait_count
+    mean_wait = (wait.sum - wait_sum) / waits if waits else 0.0
+    return count, elapsed, mean_wait, wait.max, backlog
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drone ingest vs. uplink latency benchmark")
+    parser.add_argument("--latency", type=float, nargs="+", default=[0, 0.05, 0.5, 2],
+                        help="Central server ack delays in seconds (default: 0 0.05 0.5 2)")
+    parser.add_argument("--sensors", type=int, default=2000, help="Simulated sensors (default: 2000)")
+    parser.add_argument("--messages", type=int, default=20, help="Readings per sensor (default: 20)")
+    parser.add_argument("--concurrency", type=int, default=500, help="Concurrent connects (default: 500)")
+    args = parser.parse_args()
+
+    raise_fd_limit(args.sensors + 64)
+    drone_server.AGGREGATION_INTERVAL = AGGREGATION_INTERVAL
+    ctx = multiprocessing.get_context("spawn")
+    print(f"{args.sensors} sensors x {args.messages} readings, aggregation every {AGGREGATION_INTERVAL}s")
+    print(f"{'latency':>8} {'readings/s':>11} {'lock wait mean':>15} {'lock wait max':>14} {'uplink backlog':>15}")
+    for latency in args.latency:
+        count, elapsed, mean_wait, max_wait, backlog = run(ctx, latency, args.sensors, args.messages,
+                                                           args.concurrency)
+        print(f"{latency:>7.2f}s {count / elapsed:>11,.0f} {mean_wait * 1e6:>12.2f} us "
+              f"{max_wait * 1e6:>11.1f} us {backlog:>15}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+import argparse
+import asyncio
+import resource
+import threading
+import time
+from collections import defaultdict, deque
+
+from protocol import pack_json
+from sensor_ingest import SensorIngestServer
+
+# Opens N simulated sensors against a SensorIngestServer in this process and
+# reports how quickly every reading makes it into the per-sensor buffers.
+
+
+def raise_fd_limit(needed):
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < needed:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (min(needed, hard), hard))
+    return resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+
+
+async def run_sensor(host, port, sensor_id, messages, connect_gate):
+    async with connect_gate:
+        reader, writer = await asyncio.open_connection(host, port)
+    for i in range(messages):
+        writer.write(pack_json({
+            "sensor_id": sensor_id,
+            "temperature": 20.0 + i % 10,
+            "humidity": 50.0,
+            "timestamp": f"2024-01-01T00:00:{i % 60:02d}"
+        }))
+        await writer.drain()
+        await asyncio.sleep(0)
+    return writer
+
+
+async def run_clients(server, sensors, messages, concurrency, done):
+    connect_gate = asyncio.Semaphore(concurrency)
+    start = time.perf_counter()
+    writers = await asyncio.gather(*(
+        run_sensor(server.host, server.port, f"sensor{n}", messages, connect_gate)
+        for n in range(sensors)))
+    sent = time.perf_counter()
+    await asyncio.get_running_loop().run_in_executor(None, done.wait, 120)
+    elapsed = time.perf_counter() - start
+    peak_connections = server.connections
+    for w in writers:
+        w.close()
+    return sent - start, elapsed, peak_connections
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sensor ingest benchmark")
+    parser.add_argument("--sensors", type=int, default=5000, help="Simulated sensors (default: 5000)")
+    parser.add_argument("--messages", type=int, default=20, help="Readings per sensor (default: 20)")
+    parser.add_argument("--concurrency", type=int, default=500, help="Concurrent connects (default: 500)")
+    args = parser.parse_args()
+
+    # Client and server sockets both live in this process.
+    limit = raise_fd_limit(2 * args.sensors + 64)
+    if limit < 2 * args.sensors + 64:
+        print(f"File descriptor limit {limit} is too low for {args.sensors} sensors")
+        return
+
+    buffers = defaultdict(lambda: deque(maxlen=5))
+    lock = threading.Lock()
+    received = [0]
+    done = threading.Event()
+    expected = args.sensors * args.messages
+
+    def on_message(msg, addr):
+        with lock:
+            buffers[msg["sensor_id"]].append(msg)
+            received[0] += 1
+            if received[0] == expected:
+                done.set()
+
+    server = SensorIngestServer("127.0.0.1", 0, on_message, lambda text: None).start()
+    server.ready.wait()
+
+    send_time, elapsed, peak_connections = asyncio.run(
+        run_clients(server, args.sensors, args.messages, args.concurrency, done))
+
+    rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"sensors:         {args.sensors} ({peak_connections} connected at peak)")
+    print(f"readings:        {received[0]}/{expected}")
+    print(f"client send:     {send_time:.2f}s")
+    print(f"total elapsed:   {elapsed:.2f}s")
+    print(f"throughput:      {received[0] / elapsed:,.0f} readings/s")
+    print(f"peak RSS:        {rss_mb:.1f} MiB")
+    server.stop()
+
+
+if __name__ == "__main__":
+    main()
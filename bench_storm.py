@@ -0,0 +1,83 @@
+import argparse
+import subprocess
+import sys
+import threading
+import time
+
+import sensor_ingest
+from bench_ingest import raise_fd_limit
+from sensor_ingest import SensorIngestServer
+
+# Reconnect storm: a sensor_node load generator keeps N sensors connected
+# to a SensorIngestServer in this process; after --warmup seconds the
+# server is stopped (dropping every connection) and restarted on the same
+# port --downtime seconds later. Prints readings/s for every second and how
+# long after the restart the rate was back to its level before the drop.
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sensor reconnect storm benchmark")
+    parser.add_argument("--sensors", type=int, default=10000, help="Simulated sensors (default: 10000)")
+    parser.add_argument("--rate", type=float, default=5000, help="Aggregate readings/s (default: 5000)")
+    parser.add_argument("--warmup", type=float, default=15, help="Seconds before the drop (default: 15)")
+    parser.add_argument("--downtime", type=float, default=2, help="Seconds the server stays down (default: 2)")
+    parser.add_argument("--duration", type=float, default=45, help="Total seconds (default: 45)")
+    parser.add_argument("--connect-rate", type=float, default=2000,
+                        help="Load generator connection attempts per second (default: 2000)")
+    parser.add_argument("--port", type=int, default=5099, help="Port to listen on (default: 5099)")
+    args = parser.parse_args()
+
+    raise_fd_limit(args.sensors + 256)
+    received = [0]
+
+    def on_message(msg, addr):
+        received[0] += 1
+
+    def start_server():
+        server = SensorIngestServer("127.0.0.1", args.port, on_message, lambda text: None).start()
+        server.ready.wait()
+        return server
+
+    server = start_server()
+    client = subprocess.Popen(
+        [sys.executable, "sensor_node.py", "127.0.0.1", str(args.port), "storm", "--codec", "json",
+         "--sensors", str(args.sensors), "--rate", str(args.rate), "--duration", str(args.duration),
+         "--connect-rate", str(args.connect_rate), "--report-interval", str(args.duration)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    def restart():
+        nonlocal server
+        time.sleep(args.warmup)
+        server.stop()
+        time.sleep(args.downtime)
+        server = start_server()
+
+    threading.Thread(target=restart, daemon=True).start()
+    print(f"{args.sensors} sensors at {args.rate:,.0f} readings/s; drop at {args.warmup:.0f}s "
+          f"for {args.downtime:.0f}s")
+    print(f"{'second':>6} {'readings/s':>11} {'connected':>10} {'accepted':>9}")
+    start = time.monotonic()
+    rates = []
+    last = 0
+    while client.poll() is None and time.monotonic() - start < args.duration + 5:
+        time.sleep(1)
+        count = received[0]
+        rates.append(count - last)
+        last = count
+        print(f"{len(rates):>6} {rates[-1]:>11,} {server.connections:>10} "
+              f"{sensor_ingest.ACCEPTED.value:>9}", flush=True)
+    client.wait()
+    server.stop()
+
+    before = rates[int(args.warmup) - 5:int(args.warmup)]
+    baseline = sum(before) / len(before) if before else 0
+    back_up = args.warmup + args.downtime
+    recovered = next((second + 1 for second, rate in enumerate(rates)
+                      if second + 1 > back_up and rate >= 0.9 * baseline), None)
+    print(f"baseline {baseline:,.0f} readings/s; "
+          + (f"back to 90% {recovered - back_up:.0f}s after the restart" if recovered
+             else "never back to 90% of it"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import random
+import resource
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import capture
+import central_server
+import drone_server
+import tsdb
+from bench_ingest import raise_fd_limit
+
+# Named load scenarios, each a deterministic capture (see capture.py)
+# replayed through a DroneEngine and CentralEngine in a fresh process:
+#   steady         every sensor reports at a fixed rate
+#   anomaly_burst  steady, plus a second where BURST_FRACTION of sensors
+#                  report out-of-range values
+#   rtb_flush      one drone's return-to-base backlog arriving at once
+#   churn          CHURN_FRACTION of the sensors replaced by new IDs
+#                  every second
+# Results are JSON: throughput, end-to-end latency percentiles (reading fed
+# to the drone -> central server processing a packet that covers it; for
+# rtb_flush, packet fed -> acknowledged) and peak memory per scenario.
+
+SCENARIOS = ("steady", "anomaly_burst", "rtb_flush", "churn")
+EPOCH = datetime(2024, 1, 1)
+BURST_FRACTION = 0.2
+CHURN_FRACTION = 0.2
+RTB_PACKETS_PER_SECOND = 10  # backlog packets per second of trace
+# The drone flushes a sensor's window once its oldest reading is this old,
+# so latency doesn't hinge on the aggregation tick.
+FLUSH_AGE = 0.25
+FLUSH_CHECK_INTERVAL = 0.05
+
+
+# ------------ Scenarios ------------
+
+def reading(rng, sensor_id, t, anomalous=False):
+    if anomalous:
+        temperature, humidity = rng.uniform(51.0, 60.0), rng.uniform(30.0, 80.0)
+    else:
+        temperature, humidity = rng.uniform(18.0, 35.0), rng.uniform(30.0, 80.0)
+    return {"t": round(t, 6), "kind": "sensor", "source": sensor_id,
+            "msg": {"sensor_id": sensor_id, "temperature": round(temperature, 2), "humidity": round(humidity, 2),
+                    "timestamp": (EPOCH + timedelta(seconds=t)).isoformat()}}
+
+
+def sensor_trace(rng, sensors, seconds, rate, name_at=None, anomalous_at=None):
+    # name_at(slot, t) -> sensor ID; anomalous_at(slot, t) -> bool
+    records = []
+    period = 1.0 / rate
+    for tick in range(int(seconds * rate)):
+        for slot in range(sensors):
+            t = tick * period + rng.uniform(0, period)
+            sensor_id = name_at(slot, t) if name_at else f"sensor{slot}"
+            records.append(reading(rng, sensor_id, t, anomalous_at is not None and anomalous_at(slot, t)))
+    records.sort(key=lambda record: record["t"])
+    return records
+
+
+def steady(rng, sensors, seconds, rate):
+    return sensor_trace(rng, sensors, seconds, rate)
+
+
+def anomaly_burst(rng, sensors, seconds, rate):
+    burst = set(rng.sample(range(sensors), int(sensors * BURST_FRACTION)))
+    start = seconds / 2
+    return sensor_trace(rng, sensors, seconds, rate,
+                        anomalous_at=lambda slot, t: slot in burst and start <= t < start + 1)
+
+
+def churn(rng, sensors, seconds, rate):
+    # Each slot's sensor is replaced at a random second with probability
+    # CHURN_FRACTION per second, so IDs keep appearing and going quiet.
+    generations = [[0] for _ in range(sensors)]
+    for slot in range(sensors):
+        for second in range(1, int(seconds)):
+            if rng.random() < CHURN_FRACTION:
+                generations[slot].append(second)
+
+    def name_at(slot, t):
+        generation = sum(1 for second in generations[slot] if second <= t)
+        return f"sensor{slot}-{generation}"
+
+    return sensor_trace(rng, sensors, seconds, rate, name_at=name_at)
+
+
+def rtb_flush(rng, sensors, seconds, rate):
+    # What a drone back from return-to-base forwards: a spool of aggregate
+    # packets, all at once, over one uplink session.
+    source = "drone-rtb"
+    records = [{"t": 0.0, "kind": "drone", "source": source,
+                "msg": {"type": "hello", "session": "%016x" % rng.getrandbits(64), "drone_id": source}}]
+    for seq in range(1, int(seconds * RTB_PACKETS_PER_SECOND) + 1):
+        t = seq / RTB_PACKETS_PER_SECOND
+        averages = {f"sensor{n}": {"avg_temperature": round(rng.uniform(18.0, 35.0), 2),
+                                   "avg_humidity": round(rng.uniform(30.0, 80.0), 2)}
+                    for n in range(sensors)}
+        records.append({"t": 0.0, "kind": "drone", "source": source,
+                        "msg": {"drone_id": source, "timestamp": (EPOCH + timedelta(seconds=t)).isoformat(),
+                                "averages": averages, "anomalies": [], "seq": seq}})
+    return records
+
+
+BUILDERS = {"steady": steady, "anomaly_burst": anomaly_burst, "rtb_flush": rtb_flush, "churn": churn}
+
+
+# ------------ Measurement ------------
+
+def percentiles(values):
+    if not values:
+        return None
+    values = sorted(values)
+    pick = lambda q: values[min(len(values) - 1, int(q * len(values)))] * 1000
+    return {"count": len(values), "p50_ms": pick(0.5), "p95_ms": pick(0.95), "p99_ms": pick(0.99),
+            "max_ms": values[-1] * 1000}
+
+
+def stored_rows(db_path):
+    # Averages and anomalies committed, across every shard's file.
+    total = 0
+    for path in tsdb.shard_paths(db_path):
+        conn = sqlite3.connect(path)
+        total += sum(conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] for table in ("averages", "anomalies"))
+        conn.close()
+    return total
+
+
+def run_scenario(name, args, results):
+    drone_server.FLUSH_CHECK_INTERVAL = FLUSH_CHECK_INTERVAL
+    drone_server.DEADBAND_REFRESH = 0  # every flushed window goes out, so latency is measurable
+    raise_fd_limit(1024)
+    rng = random.Random(f"{args.seed}-{name}")
+    records = BUILDERS[name](rng, args.sensors, args.seconds, args.rate)
+    if args.save_dir:
+        capture.write_capture(os.path.join(args.save_dir, f"{name}.capture"), records)
+
+    pending = {}      # sensor ID -> time its oldest undelivered reading was fed
+    alerts = {}       # (sensor ID, timestamp) -> time the anomalous reading was fed
+    sent = {}         # uplink seq -> time fed
+    latencies = []
+    alert_latencies = []
+
+    def on_record(record):
+        now = time.monotonic()
+        if record["kind"] == "sensor":
+            msg = record["msg"]
+            pending.setdefault(msg["sensor_id"], now)
+            if msg["temperature"] > 50:
+                alerts[(msg["sensor_id"], msg["timestamp"])] = now
+        elif record["kind"] == "drone" and "seq" in record["msg"]:
+            sent[record["msg"]["seq"]] = now
+
+    def on_packet(msg):
+        if not (isinstance(msg, tuple) and msg[0] == "packet"):
+            return
+        now = time.monotonic()
+        payload = msg[1]
+        for sensor_id in payload.get("averages", ()):
+            fed = pending.pop(sensor_id, None)
+            if fed is not None:
+                latencies.append(now - fed)
+        for anomaly in payload.get("anomalies", ()):
+            fed = alerts.pop((anomaly["sensor_id"], anomaly["timestamp"]), None)
+            if fed is not None:
+                alert_latencies.append(now - fed)
+
+    def on_ack(source, seq):
+        now = time.monotonic()
+        for acked in [s for s in sent if s <= seq]:
+            latencies.append(now - sent.pop(acked))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        central = central_server.CentralEngine("127.0.0.1", 0, os.path.join(tmp, "bench.db"), args.workers)
+        central.subscribe(on_packet)
+        central.start()
+        central.ready.wait()
+        drone = None
+        if any(record["kind"] == "sensor" for record in records):
+            drone = drone_server.DroneEngine("127.0.0.1", 0, "127.0.0.1", central.port, os.path.join(tmp, "spool"),
+                                             battery_drain=False, flush_age=FLUSH_AGE).start()
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        started = time.monotonic()
+        stats = capture.replay(records, drone, central, args.speed, on_record, on_ack)
+        drained = True
+        sensors_tracked = 0
+        if drone is not None:
+            drained = capture.drain(drone)
+            deadline = time.monotonic() + capture.ACK_TIMEOUT
+            while pending and time.monotonic() < deadline:
+                time.sleep(0.01)
+            sensors_tracked = len(drone.buffers)
+        total = time.monotonic() - started
+        if drone is not None:
+            drone.stop()
+        central.stop()
+        stored = stored_rows(os.path.join(tmp, "bench.db"))
+
+    fed = sum(stats["records"].values())
+    results.put({
+        "scenario": name,
+        "records": stats["records"],
+        "feed_seconds": round(stats["feed_seconds"], 4),
+        "total_seconds": round(total, 4),
+        "fed_per_second": round(fed / stats["feed_seconds"], 1) if stats["feed_seconds"] else None,
+        "processed_per_second": round(fed / total, 1),
+        "rows_stored": stored,
+        "latency": percentiles(latencies),
+        "undelivered": len(pending) + len(sent),
+        "alert_latency": percentiles(alert_latencies),
+        "drained": drained,
+        "sensors_tracked": sensors_tracked,
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "rss_before_replay_mb": round(rss_before / 1024, 1),
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Trace-driven drone + central benchmark suite")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS),
+                        help="Scenarios to run (default: all)")
+    parser.add_argument("--sensors", type=int, default=500, help="Sensors per scenario (default: 500)")
+    parser.add_argument("--seconds", type=float, default=10, help="Trace length in seconds (default: 10)")
+    parser.add_argument("--rate", type=float, default=2, help="Readings per sensor per second (default: 2)")
+    parser.add_argument("--speed", type=float, default=0,
+                        help="Replay speed: 1 = real time, 0 = as fast as possible (default: 0)")
+    parser.add_argument("--workers", type=int, default=0, help="Central server worker processes (default: 0)")
+    parser.add_argument("--seed", default="1", help="Trace seed; the same seed gives the same traces (default: 1)")
+    parser.add_argument("--save-dir", help="Also write each scenario's capture file here")
+    parser.add_argument("--output", help="Write the JSON results here instead of stdout")
+    args = parser.parse_args()
+
+    if args.save_dir:
+        os.makedirs(args.save_dir, exist_ok=True)
+    # One process per scenario, so peak memory is the scenario's own.
+    ctx = multiprocessing.get_context("spawn")
+    report = {"started": datetime.utcnow().isoformat(), "cores": os.cpu_count(), "python": sys.version.split()[0],
+              "config": {key: value for key, value in vars(args).items() if key not in ("output", "save_dir")},
+              "scenarios": []}
+    for name in args.scenarios:
+        results = ctx.Queue()
+        proc = ctx.Process(target=run_scenario, args=(name, args, results))
+        proc.start()
+        while True:
+            try:
+                report["scenarios"].append(results.get(timeout=1))
+                break
+            except queue.Empty:
+                if not proc.is_alive():
+                    report["scenarios"].append({"scenario": name, "error": f"exit code {proc.exitcode}"})
+                    break
+        proc.join()
+        print(f"{name}: done", file=sys.stderr)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+import argparse
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+from protocol import FrameDecoder, pack_json
+
+# Capture files: a header frame followed by one length-prefixed JSON frame
+# per record (the same framing as the spool and the wire), each
+#   {"t": seconds since capture start, "kind": ..., "source": ..., "msg": ...}
+# Kinds:
+#   "sensor"   a decoded sensor reading, as passed to DroneEngine.handle_sensor
+#   "drone"    a decoded uplink frame (hello or packet), as read by
+#              CentralEngine.handle_drone; source identifies the connection
+#   "battery"  {"level": n}, replayed through DroneEngine.set_battery_level
+# Drones record with --record (sensor readings), the central server too
+# (uplink frames); bench_suite.py generates them for its scenarios.
+
+VERSION = 1
+KINDS = ("sensor", "drone", "battery")
+ACK_TIMEOUT = 30  # seconds replay waits for the last uplink ack per connection
+
+
+class Recorder:
+    """Appends timestamped records to a capture file; safe from any thread."""
+
+    def __init__(self, path):
+        self.path = path
+        self.records = 0
+        self._file = open(path, "wb")
+        self._lock = threading.Lock()
+        self._start = time.monotonic()
+        self._file.write(pack_json({"type": "capture", "version": VERSION,
+                                    "started": datetime.utcnow().isoformat()}))
+
+    def record(self, kind, source, msg):
+        frame = pack_json({"t": round(time.monotonic() - self._start, 6), "kind": kind,
+                           "source": str(source), "msg": msg})
+        with self._lock:
+            self._file.write(frame)
+            self.records += 1
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+def write_capture(path, records):
+    with open(path, "wb") as f:
+        f.write(pack_json({"type": "capture", "version": VERSION, "started": datetime.utcnow().isoformat()}))
+        for record in records:
+            f.write(pack_json(record))
+
+
+def read_capture(path):
+    """Yields the records of a capture file in file order."""
+    decoder = FrameDecoder()
+    header = None
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(65536)
+            if not chunk:
+                break
+            for record in decoder.feed_json(chunk):
+                if header is None:
+                    header = record
+                    if header.get("type") != "capture" or header.get("version") != VERSION:
+                        raise ValueError(f"{path} is not a version {VERSION} capture file")
+                    continue
+                yield record
+    if header is None:
+        raise ValueError(f"{path} is empty")
+
+
+# ------------ Replay ------------
+
+class DroneConnection:
+    """One recorded uplink connection, replayed into CentralEngine.handle_drone
+    over a socketpair; tracks the acks coming back."""
+
+    def __init__(self, central, source, on_ack=None):
+        self.source = source
+        self.on_ack = on_ack
+        self.sock, server_end = socket.socketpair()
+        self.acked = 0
+        self.last_seq = 0
+        self._cond = threading.Condition()
+        # A sharded central server routes the connection to a worker, as it
+        # would a real one.
+        handler = central.route_drone if central.shards else central.handle_drone
+        threading.Thread(target=handler, args=(server_end, source), daemon=True).start()
+        threading.Thread(target=self._read_acks, daemon=True).start()
+
+    def send(self, payload):
+        self.last_seq = payload.get("seq") or self.last_seq
+        self.sock.sendall(pack_json(payload))
+
+    def _read_acks(self):
+        decoder = FrameDecoder()
+        while True:
+            try:
+                data = self.sock.recv(65536)
+            except OSError:
+                data = b""
+            if not data:
+                break
+            for msg in decoder.feed_json(data):
+                if "ack" in msg:
+                    if self.on_ack is not None:
+                        self.on_ack(self.source, msg["ack"])
+                    with self._cond:
+                        self.acked = max(self.acked, msg["ack"])
+                        self._cond.notify_all()
+        with self._cond:
+            self._cond.notify_all()
+
+    def close(self, timeout=ACK_TIMEOUT):
+        # Waits for the last packet sent to be acknowledged, then hangs up.
+        with self._cond:
+            self._cond.wait_for(lambda: self.acked >= self.last_seq, timeout)
+        self.sock.close()
+
+
+def replay(records, drone=None, central=None, speed=0, on_record=None, on_ack=None):
+    """Feeds records into a DroneEngine and/or CentralEngine.
+
+    speed=1 keeps the recorded timing, 2 replays twice as fast, 0 as fast
+    as possible. on_record(record) is called just before each is fed in,
+    on_ack(source, seq) for each ack the central engine sends back.
+    Sensor readings are fed on this thread, so don't replay into a drone
+    whose sensor port is also taking live traffic. Returns replay stats.
+    """
+    connections = {}
+    counts = Counter()
+    max_lag = 0.0
+    start = time.monotonic()
+    for record in records:
+        if speed:
+            lag = time.monotonic() - start - record["t"] / speed
+            if lag < 0:
+                time.sleep(-lag)
+            else:
+                max_lag = max(max_lag, lag)
+        if on_record is not None:
+            on_record(record)
+        kind = record["kind"]
+        if kind == "sensor" and drone is not None:
+            drone.handle_sensor(record["msg"], record["source"])
+        elif kind == "battery" and drone is not None:
+            drone.set_battery_level(record["msg"]["level"])
+        elif kind == "drone" and central is not None:
+            connection = connections.get(record["source"])
+            if connection is None:
+                connection = connections[record["source"]] = DroneConnection(central, record["source"], on_ack)
+            connection.send(record["msg"])
+        else:
+            continue
+        counts[kind] += 1
+    fed = time.monotonic() - start
+    for connection in connections.values():
+        connection.close()
+    return {"records": dict(counts), "seconds": time.monotonic() - start, "feed_seconds": fed,
+            "max_lag": max_lag}
+
+
+def drain(drone, timeout=ACK_TIMEOUT):
+    """Aggregates what the drone still holds and waits for the uplink to
+    empty; returns False on timeout."""
+    drone.edge_processing()
+    deadline = time.monotonic() + timeout
+    while drone.uplink.backlog():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+# ------------ CLI ------------
+
+def describe(path):
+    counts = Counter()
+    sources = {kind: set() for kind in KINDS}
+    last = 0.0
+    for record in read_capture(path):
+        counts[record["kind"]] += 1
+        sources.setdefault(record["kind"], set()).add(record["source"])
+        last = max(last, record["t"])
+    print(f"{path}: {sum(counts.values())} records over {last:.1f}s")
+    for kind, n in sorted(counts.items()):
+        print(f"  {kind:<8} {n:>10} records from {len(sources[kind])} sources")
+
+
+def replay_file(path, speed, workers):
+    # Fresh engines in a scratch directory: the capture's drone packets go
+    # straight to the central engine, its sensor readings through a drone
+    # whose uplink points at that same central engine.
+    from central_server import CentralEngine
+    from drone_server import DroneEngine
+
+    records = list(read_capture(path))
+    kinds = {record["kind"] for record in records}
+    with tempfile.TemporaryDirectory() as tmp:
+        central = CentralEngine("127.0.0.1", 0, os.path.join(tmp, "replay.db"), workers).start()
+        central.ready.wait()
+        drone = None
+        if kinds & {"sensor", "battery"}:
+            drone = DroneEngine("127.0.0.1", 0, "127.0.0.1", central.port, os.path.join(tmp, "spool"),
+                                battery_drain=False).start()
+        stats = replay(records, drone, central, speed)
+        if drone is not None:
+            drain(drone)
+            drone.stop()
+        central.stop()
+    print(json.dumps(stats, indent=2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or replay a capture file")
+    sub = parser.add_subparsers(dest="command", required=True)
+    info = sub.add_parser("info", help="Summarize a capture")
+    info.add_argument("path")
+    play = sub.add_parser("replay", help="Replay a capture into fresh in-process engines")
+    play.add_argument("path")
+    play.add_argument("--speed", type=float, default=1.0,
+                      help="1 = recorded timing, 2 = twice as fast, 0 = as fast as possible (default: 1)")
+    play.add_argument("--workers", type=int, default=0, help="Central server worker processes (default: 0)")
+    args = parser.parse_args()
+
+    if args.command == "info":
+        describe(args.path)
+    else:
+        replay_file(args.path, args.speed, args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,188 +1,617 @@
+import argparse
+import multiprocessing
+import signal
 import socket
 import threading
 import json
-import tkinter as tk
+import zlib
 from datetime import datetime
+from multiprocessing import reduction
 from queue import Queue
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-import matplotlib.dates as mdates
-from collections import defaultdict
+from collections import OrderedDict
 import time
+from time import perf_counter
 
-# Global variables
+import metrics
+from capture import Recorder
+from protocol import FrameDecoder, FrameError, choose_compression, expand_frames, pack_json, set_keepalive
+from scheduler import Scheduler
+from tsdb import TimeSeriesStore, shard_path
+
+# Configuration
+HOST = 'localhost'
 PORT = 6000
-server_socket = None
-stop_server = False #unused
-restart_server = False
+PLOT_INTERVAL_MS = 1000  # blitted redraws are cheap enough to refresh every second
+DB_PATH = 'central.db'  # averages and anomalies history; query with tsdb.py
+# With workers, every shard writes its own file next to it: central.shard0.db, ...
+# Highest processed sequence number per uplink session, so packets a drone
+# resends after a reconnect are acknowledged but not processed twice.
+MAX_SESSIONS = 1024
+# Drone connections can be sharded across worker processes by drone ID, so
+# every packet (and session) of one drone is always handled by the same one.
+WORKERS = 0  # 0 handles every drone in this process
+LISTEN_BACKLOG = 128  # a fleet reconnecting at once must not overflow the accept queue
+HELLO_TIMEOUT = 10  # seconds a new connection has to name its drone
+# A drone connection that completes no frame for this long is closed, be it
+# silent, half-open or trickling bytes. Drones send at least every
+# aggregation interval (30 s at the slowest) plus uplink linger.
+DRONE_IDLE_TIMEOUT = 120
+# Without workers, accepting pauses at this many open drone connections;
+# the rest wait in the listen backlog.
+MAX_DRONE_CONNECTIONS = 1024
+# Fleet rollups combine the latest averages of every drone per sensor ID.
+ROLLUP_INTERVAL = 5
+FLEET_MAX_AGE = 60  # seconds a drone's last averages keep counting
 
-# GUI queues
-log_queue = Queue()
-avg_queue = Queue()
-anomaly_queue = Queue()
-plot_queue = Queue()
+DRONE_PACKETS = metrics.keyed("central_drone_packets", "Packets processed per drone", "drone")
+DUPLICATES = metrics.counter("central_duplicate_packets_total", "Resent packets acknowledged but not processed")
+DECODE_ERRORS = metrics.counter("central_decode_errors_total", "Drone frames that were not valid JSON")
+PROCESS_TIME = metrics.histogram("central_process_packet_seconds", "Time to process one drone packet")
+IDLE_CLOSED = metrics.counter("central_idle_closed_total", "Drone connections closed for completing no frame in time")
 
-# For plotting
-plot_data = defaultdict(lambda: {"time": [], "temp": [], "hum": []})
 
-def handle_drone(conn, addr):
-    log_queue.put(f"[{datetime.now()}] Connected to Drone: {addr}")
-    try:
-        while True:
-            data = conn.recv(4096)
-            if not data:
-                break
+def merge_rollups(partials):
+    # Partials map sensor ID -> [drones, sum_t, sum_h, min_t, max_t, min_h, max_h].
+    merged = {}
+    for partial in partials:
+        for sid, (n, sum_t, sum_h, min_t, max_t, min_h, max_h) in partial.items():
+            acc = merged.get(sid)
+            if acc is None:
+                merged[sid] = [n, sum_t, sum_h, min_t, max_t, min_h, max_h]
+                continue
+            acc[0] += n
+            acc[1] += sum_t
+            acc[2] += sum_h
+            acc[3] = min(acc[3], min_t)
+            acc[4] = max(acc[4], max_t)
+            acc[5] = min(acc[5], min_h)
+            acc[6] = max(acc[6], max_h)
+    return {sid: {"drones": n, "avg_temperature": round(sum_t / n, 2), "min_temperature": min_t,
+                  "max_temperature": max_t, "avg_humidity": round(sum_h / n, 2),
+                  "min_humidity": min_h, "max_humidity": max_h}
+            for sid, (n, sum_t, sum_h, min_t, max_t, min_h, max_h) in merged.items()}
+
+
+class CentralEngine:
+    """Drone uplink server and time-series store, with no GUI.
+
+    Subscribers get status lines (str), ("packet", payload, received_at)
+    for every packet processed and ("rollup", fleet) every ROLLUP_INTERVAL.
+    With workers > 0 drones are handled by DroneShard processes instead,
+    each with its own store.
+    """
+
+    def __init__(self, host=HOST, port=PORT, db_path=DB_PATH, workers=WORKERS):
+        self.host = host
+        self.port = port
+        self.db_path = db_path
+        self.workers = workers
+        self.subscribers = []
+        # Shards each keep their own store (see shard_path); this process has none then.
+        self.store = None if workers else TimeSeriesStore(db_path, log=self.log)
+        self.latest = {}  # (drone_id, sensor_id) -> (monotonic time, temperature, humidity)
+        self.latest_lock = threading.Lock()
+        self.fleet = {}
+        self.shards = []
+        self.shard_partials = {}
+        self.shard_metrics = {}
+        self.server_socket = None
+        self.restart_server = False
+        self.session_seq = OrderedDict()
+        self.session_lock = threading.Lock()
+        self.connections = 0
+        self.ready = threading.Event()
+        self.scheduler = Scheduler(self.log, name="central-scheduler")
+        self.recorder = None  # a capture.Recorder while recording (workers=0 only)
+        self._stop = threading.Event()
+
+        metrics.gauge("central_drone_connections", "Open drone connections", lambda: self.connections)
+        if self.store is not None:
+            metrics.gauge("central_store_queue_depth", "Rows waiting for the time-series writer",
+                          self.store._queue.qsize)
+            metrics.gauge("central_store_rows_written_total", "Rows committed to the time-series store",
+                          lambda: self.store.written)
+            metrics.gauge("central_store_rows_rejected_total", "Rows not stored because a value had the wrong type",
+                          lambda: self.store.rejected)
+            metrics.gauge("central_store_rows_failed_total", "Rows the time-series store failed to commit",
+                          lambda: self.store.failed)
+        metrics.gauge("central_sessions", "Uplink sessions tracked for deduplication", lambda: len(self.session_seq))
+        metrics.gauge("central_fleet_sensors", "Sensor IDs in the latest fleet rollup", lambda: len(self.fleet))
+
+    def subscribe(self, callback):
+        self.subscribers.append(callback)
+
+    def emit(self, msg):
+        for callback in self.subscribers:
+            callback(msg)
+
+    def log(self, text):
+        if self.subscribers:
+            self.emit(f"[{datetime.now()}] {text}")
+
+    def start(self):
+        if self.workers:
+            # Spawned, not forked: this process already runs threads.
+            ctx = multiprocessing.get_context("spawn")
+            events = ctx.Queue()
+            self.shards = [DroneShard(ctx, i, self.db_path, events, bool(self.subscribers))
+                           for i in range(self.workers)]
+            threading.Thread(target=self.collect_events, args=(events,), daemon=True).start()
+            metrics.lines("central_shards", "Metrics reported by each shard process", self.render_shard_metrics)
+        threading.Thread(target=self.start_server, daemon=True).start()
+        self.scheduler.every(ROLLUP_INTERVAL, self.rollup)
+        self.scheduler.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self.scheduler.stop()
+        self._close_socket()
+        for shard in self.shards:
+            shard.stop()
+        if self.store is not None:
+            self.store.close()
+        if self.recorder is not None:
+            self.recorder.close()
+
+    def _close_socket(self):
+        if self.server_socket:
             try:
-                payload = json.loads(data.decode())
-                log_queue.put(f"[{datetime.now()}] Received packet.")
-                timestamp = datetime.utcnow()
-                for sid, stats in payload.get("averages", {}).items():
-                    avg_queue.put(f"{sid}: Temp={stats['avg_temperature']}°C | Hum={stats['avg_humidity']}%")
-                    plot_queue.put((sid, timestamp, stats['avg_temperature'], stats['avg_humidity']))
-                for a in payload.get("anomalies", []):
-                    anomaly_queue.put(f"{a['sensor_id']} | {a['type']} | {a['value']}")
-            except json.JSONDecodeError:
-                log_queue.put(f"[{datetime.now()}] ❌ Invalid JSON received.")
-    finally:
-        conn.close()
-        log_queue.put(f"[{datetime.now()}] Connection closed: {addr}")
+                self.server_socket.close()
+            except OSError:
+                pass
+
+    def change_port(self, new_port):
+        if not (0 < new_port < 65536):
+            self.log("Invalid port number. Must be between 1 and 65535.")
+            return
+        if new_port == self.port:
+            self.log(f"Port is already set to {self.port}.")
+            return
+        self.port = new_port
+        self.restart_server = True
+        self._close_socket()
+        self.log(f"Changing to port {self.port}...")
+
+    # ------------ Packet Processing ------------
+
+    def process_packet(self, payload):
+        # Returns the store's mark for the packet's rows (see TimeSeriesStore).
+        started = perf_counter()
+        self.log("Received packet.")
+        mark = self.store.record_packet(payload)
+        drone_id = payload.get("drone_id", "unknown")
+        DRONE_PACKETS.inc(drone_id)
+        now = time.monotonic()
+        averages = payload.get("averages", {})
+        with self.latest_lock:
+            for sid, stats in averages.items() if isinstance(averages, dict) else ():
+                if isinstance(stats, dict):
+                    self.latest[(drone_id, sid)] = (now, stats.get("avg_temperature"), stats.get("avg_humidity"))
+        if self.subscribers:
+            self.emit(("packet", payload, datetime.utcnow()))
+        PROCESS_TIME.observe(perf_counter() - started)
+        return mark
+
+    def is_new_packet(self, session, seq):
+        with self.session_lock:
+            last = self.session_seq.get(session, 0)
+            self.session_seq[session] = max(last, seq)
+            self.session_seq.move_to_end(session)
+            if len(self.session_seq) > MAX_SESSIONS:
+                self.session_seq.popitem(last=False)
+            return seq > last
+
+    # ------------ Fleet Rollups ------------
 
-def start_server():
-    global server_socket, restart_server, stop_server
+    def partial_rollup(self):
+        # This process's share of the fleet rollup; stale drones are forgotten.
+        cutoff = time.monotonic() - FLEET_MAX_AGE
+        partial = {}
+        with self.latest_lock:
+            for key in [key for key, (seen, _, _) in self.latest.items() if seen < cutoff]:
+                del self.latest[key]
+            entries = list(self.latest.items())
+        for (_, sid), (_, t, h) in entries:
+            if t is None or h is None:
+                continue
+            acc = partial.get(sid)
+            if acc is None:
+                partial[sid] = [1, t, h, t, t, h, h]
+                continue
+            acc[0] += 1
+            acc[1] += t
+            acc[2] += h
+            acc[3] = min(acc[3], t)
+            acc[4] = max(acc[4], t)
+            acc[5] = min(acc[5], h)
+            acc[6] = max(acc[6], h)
+        return partial
 
-    while not stop_server:
+    def rollup(self):
+        partials = list(self.shard_partials.values()) if self.shards else [self.partial_rollup()]
+        self.fleet = merge_rollups(partials)
+        if self.subscribers and self.fleet:
+            self.emit(("rollup", self.fleet))
+
+    def collect_events(self, events):
+        # Shard processes report status, packets and rollup partials here.
+        while not self._stop.is_set():
+            msg = events.get()
+            if isinstance(msg, tuple) and msg[0] == "partial":
+                self.shard_partials[msg[1]] = msg[2]
+            elif isinstance(msg, tuple) and msg[0] == "metrics":
+                self.shard_metrics[msg[1]] = msg[2]
+            elif self.subscribers:
+                self.emit(msg)
+
+    def render_shard_metrics(self):
+        for index, text in sorted(self.shard_metrics.items()):
+            yield from metrics.relabel(text, "shard", index)
+
+    # ------------ Drone TCP Server ------------
+
+    def handle_drone(self, conn, addr, data=b""):
+        # data: bytes already read from conn (by route_drone) before the hand-off.
+        self.log(f"Connected to Drone: {addr}")
+        with self.session_lock:
+            self.connections += 1
+        decoder = FrameDecoder()
+        session = None
+        last_frame = time.monotonic()
         try:
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-                server_socket = s
-                s.settimeout(1.0)  # Makes all operations interruptible
-                s.bind(('localhost', PORT))
-                s.listen(1)
-                log_queue.put(f"[{datetime.now()}] Central Server started listening on port {PORT}...")
-                while not (stop_server or restart_server):
+            conn.settimeout(DRONE_IDLE_TIMEOUT)
+            while True:
+                if not data:
+                    data = conn.recv(65536)
+                    if not data:
+                        break
+                try:
+                    # A corrupt batch drops the connection; the drone resends it.
+                    frames, data = list(expand_frames(decoder.feed(data))), b""
+                except (FrameError, zlib.error, RuntimeError) as e:
+                    self.log(f"❌ Dropping {addr}: {str(e)}")
+                    break
+                if frames:
+                    last_frame = time.monotonic()
+                elif time.monotonic() - last_frame > DRONE_IDLE_TIMEOUT:
+                    raise socket.timeout("no complete frame")
+                ack = None
+                mark = 0
+                for frame in frames:
                     try:
-                        conn, addr = server_socket.accept()
-                        threading.Thread(target=handle_drone, args=(conn, addr), daemon=True).start()
-                    except socket.timeout:
+                        payload = json.loads(frame)
+                    except (json.JSONDecodeError, UnicodeDecodeError):
+                        payload = None
+                    if not isinstance(payload, dict):
+                        DECODE_ERRORS.inc()
+                        self.log("❌ Invalid JSON received.")
                         continue
-                    except OSError:
-                        log_queue.put(f"[{datetime.now()}] Closing current server...")
-                        break
-                    except Exception as e:
-                        log_queue.put(f"[{datetime.now()}] Error: {str(e)}")
-                        time.sleep(2)
-                if restart_server:
-                    log_queue.put(f"[{datetime.now()}] Restarting server on port {PORT}...")
-                    restart_server = False
-                    continue
-        except Exception as e:
-            log_queue.put(f"[{datetime.now()}] Error starting server: {str(e)}")
-            time.sleep(2)
-
-def update_gui():
-    while not log_queue.empty():
-        msg = log_queue.get()
-        list_log.insert(tk.END, msg)
-        list_log.yview(tk.END)
-    while not avg_queue.empty():
-        msg = avg_queue.get()
-        list_avg.insert(tk.END, msg)
-        list_avg.yview(tk.END)
-    while not anomaly_queue.empty():
-        msg = anomaly_queue.get()
-        list_anom.insert(tk.END, msg)
-        list_anom.itemconfig(tk.END, {'fg': 'red'})
-        list_anom.yview(tk.END)
-    root.after(100, update_gui)
+                    if self.recorder is not None:
+                        self.recorder.record("drone", addr, payload)
+                    if payload.get("type") == "hello":
+                        session = payload.get("session")
+                        compression = choose_compression(payload.get("compression"))
+                        if compression:
+                            conn.sendall(pack_json({"type": "welcome", "compression": compression}))
+                        continue
+                    seq = payload.get("seq")
+                    if seq is not None:
+                        ack = seq
+                        if session is not None and not self.is_new_packet(session, seq):
+                            DUPLICATES.inc()
+                            # The first copy may not be committed yet.
+                            mark = max(mark, self.store.queued)
+                            continue
+                    mark = max(mark, self.process_packet(payload))
+                # One cumulative ack per recv covers every packet pipelined in
+                # it, sent once their rows are committed: an acked packet is
+                # one the drone may forget.
+                if ack is not None and self.store.wait_written(mark):
+                    conn.sendall(pack_json({"ack": ack}))
+        except socket.timeout:
+            IDLE_CLOSED.inc()
+            self.log(f"Closing idle connection from {addr}")
+        except OSError as e:
+            self.log(f"Error on connection {addr}: {str(e)}")
+        finally:
+            with self.session_lock:
+                self.connections -= 1
+            conn.close()
+            self.log(f"Connection closed: {addr}")
 
-def update_plot():
-    while not plot_queue.empty():
-        sid, timestamp, temp, hum = plot_queue.get()
-        d = plot_data[sid]
-        d["time"].append(timestamp)
-        d["temp"].append(temp)
-        d["hum"].append(hum)
-        if len(d["time"]) > 20:
-            d["time"].pop(0)
-            d["temp"].pop(0)
-            d["hum"].pop(0)
-
-    ax.clear()
-    for sid, d in plot_data.items():
-        ax.plot(d["time"], d["temp"], label=f"{sid} Temp")
-        ax.plot(d["time"], d["hum"], label=f"{sid} Hum")
-    ax.set_title("Sensor Averages")
-    ax.set_xlabel("Time")
-    ax.set_ylabel("Value")
-    ax.legend()
-    ax.xaxis.set_major_formatter(mdates.DateFormatter('%H:%M:%S'))
-    fig.autofmt_xdate()
-    canvas.draw()
-    root.after(5000, update_plot)
-
-# GUI setup
-root = tk.Tk()
-root.title("Central Server")
-
-frame = tk.Frame(root)
-frame.pack(padx=10, pady=10)
-
-tk.Label(frame, text="Live Logs").grid(row=0, column=0)
-tk.Label(frame, text="Averages").grid(row=0, column=1)
-tk.Label(frame, text="Anomalies").grid(row=0, column=2)
-
-list_log = tk.Listbox(frame, width=50, height=15)
-list_avg = tk.Listbox(frame, width=50, height=15)
-list_anom = tk.Listbox(frame, width=50, height=15)
-
-list_log.grid(row=1, column=0, padx=5)
-list_avg.grid(row=1, column=1, padx=5)
-list_anom.grid(row=1, column=2, padx=5)
-
-# Plot panel
-fig, ax = plt.subplots(figsize=(10, 4))
-plot_frame = tk.Frame(root)
-plot_frame.pack()
-canvas = FigureCanvasTkAgg(fig, master=plot_frame)
-canvas.get_tk_widget().pack()
-
-# port config
-frm_port = tk.Frame(frame)
-frm_port.grid(row=1, column=3, padx=10, pady=5)	
-
-tk.Label(frm_port, text="Server Port:").pack(side=tk.TOP)
-ent_port = tk.Entry(frm_port, width=10)
-ent_port.insert(0, "6000")  # Default
-ent_port.pack(side=tk.TOP, pady=5)
-
-def change_port():
-    global PORT, restart_server
-    try:
-        new_port = int(ent_port.get())
-        if not (0 < new_port < 65536):
-            raise ValueError
-    except ValueError:
-        log_queue.put(f"[{datetime.now()}] Invalid port number. Must be between 1 and 65535.")
-        return
-    
-    if new_port == PORT:
-        log_queue.put(f"[{datetime.now()}] Port is already set to {PORT}.")
-        return
-    
-    if server_socket:
+    def route_drone(self, conn, addr):
+        # Reads up to the first frame (the uplink hello, or a packet from an
+        # older drone), then hands the socket to the shard owning that drone.
+        decoder = FrameDecoder()
+        data = b""
         try:
-            server_socket.close()
-        except:
+            conn.settimeout(HELLO_TIMEOUT)
+            frames = []
+            while not frames:
+                chunk = conn.recv(65536)
+                if not chunk:
+                    return
+                data += chunk
+                frames = decoder.feed(chunk)
+            first = json.loads(frames[0])
+            if not isinstance(first, dict):
+                raise ValueError("first frame is not a JSON object")
+            drone_id = str(first.get("drone_id", "unknown"))
+            conn.settimeout(None)
+            shard = self.shards[zlib.crc32(drone_id.encode()) % len(self.shards)]
+            shard.hand_off(conn, addr, data)
+        except (OSError, ValueError) as e:
+            self.log(f"❌ Dropping {addr}: {str(e)}")
+        finally:
+            # The shard has its own copy of the socket by now.
+            conn.close()
+
+    def start_server(self):
+        while not self._stop.is_set():
+            try:
+                with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+                    self.server_socket = s
+                    s.settimeout(1.0)  # Makes all operations interruptible
+                    s.bind((self.host, self.port))
+                    s.listen(LISTEN_BACKLOG)
+                    self.port = s.getsockname()[1]
+                    self.ready.set()
+                    self.log(f"Central Server started listening on port {self.port}...")
+                    while not (self._stop.is_set() or self.restart_server):
+                        if not self.shards and self.connections >= MAX_DRONE_CONNECTIONS:
+                            self._stop.wait(0.1)
+                            continue
+                        try:
+                            conn, addr = s.accept()
+                            set_keepalive(conn)
+                            handler = self.route_drone if self.shards else self.handle_drone
+                            threading.Thread(target=handler, args=(conn, addr), daemon=True).start()
+                        except socket.timeout:
+                            continue
+                        except OSError:
+                            self.log("Closing current server...")
+                            break
+                        except Exception as e:
+                            self.log(f"Error: {str(e)}")
+                            time.sleep(2)
+                    if self.restart_server:
+                        self.log(f"Restarting server on port {self.port}...")
+                        self.restart_server = False
+                        continue
+            except Exception as e:
+                self.log(f"Error starting server: {str(e)}")
+                self._stop.wait(2)
+
+
+class DroneShard:
+    """A worker process running its own CentralEngine for a subset of drones."""
+
+    def __init__(self, ctx, index, db_path, events, verbose):
+        self.pipe, child = ctx.Pipe()
+        self.lock = threading.Lock()
+        self.process = ctx.Process(target=run_shard, args=(index, db_path, child, events, verbose), daemon=True)
+        self.process.start()
+        child.close()
+
+    def hand_off(self, conn, addr, data):
+        with self.lock:
+            self.pipe.send((addr, data))
+            reduction.send_handle(self.pipe, conn.fileno(), self.process.pid)
+        conn.close()
+
+    def stop(self):
+        try:
+            with self.lock:
+                self.pipe.send(None)
+        except OSError:
             pass
-    
-    PORT = new_port
-    restart_server = True
-    log_queue.put(f"[{datetime.now()}] Changing to port {PORT}...")
-
-btn_check = tk.Button(frm_port, text="Change Ports", command=change_port)
-btn_check.pack(side = tk.TOP, pady=5)
-
-# Start everything
-threading.Thread(target=start_server, daemon=True).start()
-root.after(100, update_gui)
-root.after(1000, update_plot)
-root.mainloop()
+        self.process.join(timeout=15)
+
+
+def run_shard(index, db_path, pipe, events, verbose):
+    # The parent handles Ctrl+C and shuts shards down through the pipe.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    engine = CentralEngine(db_path=shard_path(db_path, index))
+    if verbose:
+        engine.subscribe(events.put)
+
+    def report():
+        events.put(("partial", index, engine.partial_rollup()))
+        events.put(("metrics", index, metrics.REGISTRY.render()))
+
+    engine.scheduler.every(ROLLUP_INTERVAL, report)
+    engine.scheduler.start()
+    while True:
+        try:
+            msg = pipe.recv()
+        except EOFError:
+            break
+        if msg is None:
+            break
+        addr, data = msg
+        conn = socket.socket(fileno=reduction.recv_handle(pipe))
+        threading.Thread(target=engine.handle_drone, args=(conn, addr, data), daemon=True).start()
+    engine._stop.set()
+    engine.scheduler.stop()
+    engine.store.close()
+
+
+# ------------ GUI ------------
+
+def run_gui(engine):
+    # Tk and matplotlib are only imported when a window is actually wanted.
+    import tkinter as tk
+    import matplotlib.pyplot as plt
+    from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+    from gui_log import LogView
+    from sensor_plot import SensorPlot
+
+    log_queue = Queue()
+    avg_queue = Queue()
+    anomaly_queue = Queue()
+    plot_queue = Queue()
+    for name, q in (("log", log_queue), ("avg", avg_queue), ("anomaly", anomaly_queue), ("plot", plot_queue)):
+        metrics.gauge(f"central_gui_{name}_queue_depth", f"Entries waiting in the GUI {name} queue", q.qsize)
+
+    def on_message(msg):
+        # Plot series are "<drone>/<sensor>", plus "fleet/<sensor>" rollups.
+        if isinstance(msg, str):
+            log_queue.put(msg)
+            return
+        if msg[0] == "rollup":
+            timestamp = datetime.utcnow()
+            for sid, stats in msg[1].items():
+                plot_queue.put((f"fleet/{sid}", timestamp, stats['avg_temperature'], stats['avg_humidity']))
+            return
+        _, payload, timestamp = msg
+        drone_id = payload.get("drone_id", "unknown")
+        for sid, stats in payload.get("averages", {}).items():
+            avg_queue.put(f"{drone_id}/{sid}: Temp={stats['avg_temperature']}°C | Hum={stats['avg_humidity']}%")
+            plot_queue.put((f"{drone_id}/{sid}", timestamp, stats['avg_temperature'], stats['avg_humidity']))
+        for a in payload.get("anomalies", []):
+            anomaly_queue.put(f"{drone_id}/{a['sensor_id']} | {a['type']} | {a['value']}")
+
+    engine.subscribe(on_message)
+
+    def update_gui():
+        log_view.drain(log_queue)
+        avg_view.drain(avg_queue)
+        anom_view.drain(anomaly_queue)
+        root.after(100, update_gui)
+
+    def update_plot():
+        while not plot_queue.empty():
+            sensor_plot.add(*plot_queue.get())
+        update_plot_now()
+        root.after(PLOT_INTERVAL_MS, update_plot)
+
+    def apply_plot_filter():
+        sensor_plot.set_filter(ent_filter.get())
+        update_plot_now()
+
+    def turn_plot_page(delta):
+        sensor_plot.turn_page(delta)
+        update_plot_now()
+
+    def update_plot_now():
+        sensor_plot.refresh()
+        lbl_page.config(text=f"Page {sensor_plot.page + 1}/{sensor_plot.pages()}")
+
+    # GUI setup
+    root = tk.Tk()
+    root.title("Central Server")
+
+    frame = tk.Frame(root)
+    frame.pack(padx=10, pady=10)
+
+    tk.Label(frame, text="Live Logs").grid(row=0, column=0)
+    tk.Label(frame, text="Averages").grid(row=0, column=1)
+    tk.Label(frame, text="Anomalies").grid(row=0, column=2)
+
+    list_log = tk.Listbox(frame, width=50, height=15)
+    list_avg = tk.Listbox(frame, width=50, height=15)
+    list_anom = tk.Listbox(frame, width=50, height=15)
+
+    list_log.grid(row=1, column=0, padx=5)
+    list_avg.grid(row=1, column=1, padx=5)
+    list_anom.grid(row=1, column=2, padx=5)
+
+    log_view = LogView(list_log)
+    avg_view = LogView(list_avg)
+    anom_view = LogView(list_anom, color='red')
+
+    # Plot panel
+    fig, ax = plt.subplots(figsize=(10, 4))
+    plot_frame = tk.Frame(root)
+    plot_frame.pack()
+    canvas = FigureCanvasTkAgg(fig, master=plot_frame)
+    canvas.get_tk_widget().pack()
+    sensor_plot = SensorPlot(fig, ax, canvas)
+
+    # Only the filtered page of sensors is drawn
+    frm_filter = tk.Frame(plot_frame)
+    frm_filter.pack(pady=5)
+    tk.Label(frm_filter, text="Sensor filter (e.g. drone1/*, */sensor1, fleet/*):").pack(side=tk.LEFT)
+    ent_filter = tk.Entry(frm_filter, width=30)
+    ent_filter.pack(side=tk.LEFT, padx=5)
+    ent_filter.bind("<Return>", lambda event: apply_plot_filter())
+    tk.Button(frm_filter, text="Apply", command=apply_plot_filter).pack(side=tk.LEFT)
+    tk.Button(frm_filter, text="< Prev", command=lambda: turn_plot_page(-1)).pack(side=tk.LEFT, padx=(15, 0))
+    lbl_page = tk.Label(frm_filter, text="Page 1/1")
+    lbl_page.pack(side=tk.LEFT, padx=5)
+    tk.Button(frm_filter, text="Next >", command=lambda: turn_plot_page(1)).pack(side=tk.LEFT)
+
+    # port config
+    frm_port = tk.Frame(frame)
+    frm_port.grid(row=1, column=3, padx=10, pady=5)
+
+    tk.Label(frm_port, text="Server Port:").pack(side=tk.TOP)
+    ent_port = tk.Entry(frm_port, width=10)
+    ent_port.insert(0, str(engine.port))
+    ent_port.pack(side=tk.TOP, pady=5)
+
+    def change_port():
+        try:
+            new_port = int(ent_port.get())
+        except ValueError:
+            engine.log("Invalid port number. Must be between 1 and 65535.")
+            return
+        engine.change_port(new_port)
+
+    btn_check = tk.Button(frm_port, text="Change Ports", command=change_port)
+    btn_check.pack(side = tk.TOP, pady=5)
+
+    # Start everything
+    engine.start()
+    root.after(100, update_gui)
+    root.after(1000, update_plot)
+    root.mainloop()
+
+
+def print_status(msg):
+    if isinstance(msg, str):
+        print(msg, flush=True)
+
+
+def run_headless(engine, quiet):
+    if not quiet:
+        engine.subscribe(print_status)
+    engine.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        print(f"[{datetime.now()}] Stopping central server...")
+    finally:
+        engine.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Central Server")
+    parser.add_argument("--headless", action="store_true", help="Run without the Tk GUI")
+    parser.add_argument("--quiet", action="store_true", help="Headless: don't print status lines")
+    parser.add_argument("--host", default=HOST, help=f"Listen address (default: {HOST})")
+    parser.add_argument("--port", type=int, default=PORT, help=f"Drone port (default: {PORT})")
+    parser.add_argument("--db", default=DB_PATH, help=f"Time-series database (default: {DB_PATH})")
+    parser.add_argument("--workers", type=int, default=WORKERS,
+                        help="Worker processes to shard drones across (default: 0, all in this process)")
+    parser.add_argument("--record", metavar="PATH",
+                        help="Record every uplink frame to a capture file (see capture.py); needs --workers 0")
+    metrics.add_arguments(parser)
+    args = parser.parse_args()
+    if args.record and args.workers:
+        parser.error("--record needs --workers 0")
+    metrics.start_from_args(args)
+
+    engine = CentralEngine(args.host, args.port, args.db, args.workers)
+    if args.record:
+        engine.recorder = Recorder(args.record)
+    if args.headless:
+        run_headless(engine, args.quiet)
+    else:
+        run_gui(engine)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+import calendar
+import json
+import struct
+import time
+from datetime import datetime
+
+from protocol import encode_frame
+
+# Sensor reading encodings. JSON frames always start with "{"; compact
+# "struct" frames start with a tag byte. Sensor IDs are interned per
+# connection: a DEFINE frame binds a 16-bit index to an ID once, and every
+# READING frame after that carries only the index, an epoch-millisecond
+# timestamp and two float32 values (19 bytes instead of ~110 of JSON).
+#
+# A sensor that wants the compact codec opens with a JSON hello listing the
+# codecs it speaks; the drone answers with a welcome naming the one to use.
+# Sensors that skip the hello just keep sending JSON.
+
+CODECS = ("struct", "json")
+
+TAG_DEFINE = 0x01
+TAG_READING = 0x02
+DEFINE = struct.Struct("!BH")
+READING = struct.Struct("!BHqff")
+MAX_INTERNED = 0xFFFF
+
+
+def hello_frame(codecs=CODECS):
+    return encode_frame(json.dumps({"type": "hello", "codecs": list(codecs)}).encode())
+
+
+def welcome_frame(codec):
+    return encode_frame(json.dumps({"type": "welcome", "codec": codec}).encode())
+
+
+def choose_codec(offered):
+    for codec in CODECS:
+        if codec in offered:
+            return codec
+    return "json"
+
+
+def to_epoch_ms(timestamp):
+    if isinstance(timestamp, (int, float)):
+        return int(timestamp * 1000)
+    # Naive ISO strings from datetime.utcnow().isoformat() are UTC.
+    dt = datetime.fromisoformat(timestamp)
+    return calendar.timegm(dt.utctimetuple()) * 1000 + dt.microsecond // 1000
+
+
+class _IsoFormatter:
+    # Epoch ms -> the naive UTC ISO string the rest of the drone expects.
+    # Readings arrive in time order, so the per-second prefix is cached.
+    def __init__(self):
+        self._second = None
+        self._prefix = ""
+
+    def __call__(self, ms):
+        second, millis = divmod(ms, 1000)
+        if second != self._second:
+            self._second = second
+            self._prefix = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(second))
+        return f"{self._prefix}.{millis:03d}000"
+
+
+class JsonEncoder:
+    name = "json"
+
+    def encode(self, reading):
+        return encode_frame(json.dumps(reading, separators=(",", ":")).encode())
+
+
+class StructEncoder:
+    """Per-connection encoder for the compact codec; returns framed bytes."""
+
+    name = "struct"
+
+    def __init__(self):
+        self._ids = {}
+
+    def encode(self, reading):
+        sensor_id = reading["sensor_id"]
+        index = self._ids.get(sensor_id)
+        prefix = b""
+        if index is None:
+            if len(self._ids) > MAX_INTERNED:
+                raise ValueError("Too many sensor IDs on one connection")
+            index = self._ids[sensor_id] = len(self._ids)
+            prefix = encode_frame(DEFINE.pack(TAG_DEFINE, index) + sensor_id.encode())
+        body = READING.pack(TAG_READING, index, to_epoch_ms(reading["timestamp"]),
+                            reading["temperature"], reading["humidity"])
+        return prefix + encode_frame(body)
+
+
+def make_encoder(codec):
+    return StructEncoder() if codec == "struct" else JsonEncoder()
+
+
+class ReadingDecoder:
+    """Per-connection decoder accepting JSON and struct frames alike.
+
+    decode() returns the reading dict, a hello/welcome control dict, or None
+    for frames that only update connection state (sensor ID definitions).
+    """
+
+    def __init__(self):
+        self._ids = {}
+        self._iso = _IsoFormatter()
+
+    def decode(self, frame):
+        if not frame:
+            raise ValueError("Empty frame")
+        tag = frame[0]
+        if tag == TAG_READING:
+            _, index, ms, temperature, humidity = READING.unpack(frame)
+            return {
+                "sensor_id": self._ids[index],
+                "temperature": round(temperature, 2),
+                "humidity": round(humidity, 2),
+                "timestamp": self._iso(ms)
+            }
+        if tag == TAG_DEFINE:
+            _, index = DEFINE.unpack_from(frame)
+            self._ids[index] = frame[DEFINE.size:].decode()
+            return None
+        msg = json.loads(frame)
+        if not isinstance(msg, dict):
+            raise ValueError("JSON frame is not an object")
+        return msg
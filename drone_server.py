@@ -1,291 +1,1026 @@
-import socket
-import threading
+import argparse
 import json
-import tkinter as tk
-from datetime import datetime
-from queue import Queue
-from collections import defaultdict, deque
+import multiprocessing
+import signal
+import struct
+import threading
 import time
+from collections import deque
+from time import perf_counter
+from datetime import datetime
+from queue import Empty, Full, Queue
+
+import metrics
+from capture import Recorder
+from codec import ReadingDecoder
+from protocol import MAX_FRAME_SIZE, FrameDecoder, FrameError
+from ring import Ring
+from scheduler import Scheduler
+from sensor_ingest import DECODE_ERRORS, FRAMES, FRAMING_ERRORS, SensorIngestServer
+from sensor_registry import SENSOR_TTL, SensorRegistry, merge_summaries
+from uplink import MAX_BATCH, Uplink
+from window_stats import ShardedWindowStats
+from anomaly import DetectorPipeline, DEFAULT_RULES
+from spool import Spool
 
 # Configuration
+DRONE_ID = 'drone1'  # must be unique per drone; the central server keys all state by it
 HOST = 'localhost'
 PORT = 5000
-new_sensor_port = PORT
 CENTRAL_SERVER_HOST = 'localhost'
 CENTRAL_SERVER_PORT = 6000
+WINDOW_SIZE = 5  # readings kept per sensor
+AGGREGATIONS = ("mean",)  # any of mean, min, max, stddev, p50, p95, ...
+# Streaming anomaly rules (see anomaly.py): defaults for every sensor, plus
+# per-sensor overrides keyed by sensor ID or fnmatch pattern, e.g.
+#   {"greenhouse-*": [{"rule": "zscore", "field": "humidity", "threshold": 4}]}
+ANOMALY_RULES = DEFAULT_RULES
+SENSOR_ANOMALY_RULES = {}
+# Return-to-base backlog lives on disk, not in memory.
+SPOOL_DIR = 'drone_spool'
+SPOOL_MAX_BYTES = 256 * 1024 * 1024
+SPOOL_DROP_POLICY = 'oldest'  # or 'newest' to keep the oldest data when full
+SPOOL_BATCH = 100  # packets forwarded per acknowledged batch
+SPOOL_QUEUE_MAX = 1024  # packets waiting for the spool writer; then SPOOL_DROP_POLICY applies
+# Periodic jobs and what each does after falling behind (see scheduler.py):
+# aggregation and forwarding just resume, the battery simulation catches up.
+AGGREGATION_INTERVAL = 10
+AGGREGATION_POLICY = 'skip'
+FORWARD_INTERVAL = 5
+FORWARD_POLICY = 'skip'
+BATTERY_INTERVAL = 5
+BATTERY_POLICY = 'catch-up'
+# Per-sensor flush triggers: a sensor's window is also sent ahead of the
+# aggregation tick once it has FLUSH_READINGS new readings, or its oldest
+# unsent reading is FLUSH_AGE seconds old (checked every FLUSH_CHECK_INTERVAL).
+# None disables a trigger.
+FLUSH_READINGS = None
+FLUSH_AGE = None
+FLUSH_CHECK_INTERVAL = 0.5
+# A sensor's averages are only sent again once one moves by at least its
+# deadband, or every DEADBAND_REFRESH seconds while it keeps reporting (keep
+# this below the central server's FLEET_MAX_AGE).
+DEADBAND = {"avg_temperature": 0.1, "avg_humidity": 0.5}
+DEADBAND_REFRESH = 30
+# Radio economy by battery level: (at or below %, aggregation interval,
+# uplink linger seconds, max packets per uplink batch), lowest level first.
+PACING = ((30, 30, 20.0, 256), (50, 20, 10.0, 128))
+# A slow or failing link batches harder too.
+POOR_LINK_RTT = 2.0
+POOR_LINK_LINGER = 10.0
+POOR_LINK_BATCH = 256
+# Packets go to the spool instead of the uplink's in-memory queue while the
+# uplink has been down this many seconds, or has this many packets queued
+# or in flight; forward_queued_data sends them on once it's back.
+UPLINK_SPILL_AFTER = 10
+UPLINK_SPILL_BACKLOG = 256
+# Decoding, anomaly detection and reading windows can run in worker
+# processes instead of the ingest thread, each taking a share of the sensor
+# connections (see SensorWorkers). 0 keeps everything in this process.
+WORKERS = 0
+WORKER_REPLY_TIMEOUT = 5      # seconds an aggregation waits for every worker's summaries
+WORKER_RETRY_INTERVAL = 0.005  # seconds between retries while a worker's ring is full
+WORKER_BATCH_BYTES = 1024 * 1024  # ring bytes a worker decodes between control checks
+WORKER_REPORT_INTERVAL = 5    # seconds between worker metrics reports
+# Packets bigger than this are split, so each fits in one uplink frame with
+# room for the sequence number the uplink adds.
+MAX_PACKET_BYTES = MAX_FRAME_SIZE - 1024
 
-drone_socket = None
-stop_server = False  # unused
-restart_server = False
-
-# Shared state
-message_queue = Queue()
-buffers = defaultdict(lambda: deque(maxlen=5))
-outgoing_data = []
-battery_level = 100
-return_to_base = False
-lock = threading.Lock()
-reported_anomalies = set()
-
-# GUI setup
-root = tk.Tk()
-root.title("Drone Server")
-
-top_frame = tk.Frame(root)
-top_frame.grid(row=0, column=0, padx=10, pady=5)
-
-# battery gui start
-battery_frame = tk.Frame(top_frame)
-battery_frame.grid(row=0, column=0, padx=10, pady=5)
-
-battery_label = tk.Label(battery_frame, text=f"Battery Level: {battery_level}%", font=("Arial", 12, "bold"))
-battery_label.grid(row=0, column=0, padx=10, pady=5)
-
-battery_slider = tk.Scale(battery_frame, from_=0, to=100, orient="horizontal", label="Adjust Battery Level",
-                          command=lambda val: set_battery_level(int(val)))
-battery_slider.set(100)
-battery_slider.grid(row=1, column=0, padx=10, pady=5)
-# battery gui end
-
-# port config start
-frm_ports = tk.Frame(top_frame)
-frm_ports.grid(row=0, column=1, padx=10)
-
-tk.Label(frm_ports, text="Sensor Port").pack()
-ent_sensor_port = tk.Entry(frm_ports)
-ent_sensor_port.insert(0, "5000")  # Default
-ent_sensor_port.pack()
-
-tk.Label(frm_ports, text="Central Server Port").pack()
-ent_central_port = tk.Entry(frm_ports)
-ent_central_port.insert(0, "6000")  # Default
-ent_central_port.pack()
-
-def change_ports():
-    global PORT, CENTRAL_SERVER_PORT, restart_server, drone_socket, new_sensor_port
+SENSOR_MESSAGES = metrics.keyed("drone_sensor_messages", "Readings received per sensor", "sensor")
+INVALID_READINGS = metrics.counter("drone_invalid_readings_total", "Decoded messages missing valid readings")
+INGEST_LOCK_WAIT = metrics.histogram("drone_lock_wait_seconds_handle_sensor", "Buffer lock wait in handle_sensor")
+AGGREGATE_LOCK_WAIT = metrics.histogram("drone_lock_wait_seconds_edge_processing",
+                                        "Buffer lock wait per shard in edge_processing")
+AGGREGATE_TIME = metrics.histogram("drone_aggregate_seconds", "Time to summarize every sensor window")
+DEADBAND_SKIPPED = metrics.counter("drone_deadband_skipped_total", "Sensor averages not sent because they barely moved")
+ANOMALIES = metrics.counter("drone_anomalies_total", "Anomalies detected")
+WORKER_RESTARTS = metrics.counter("drone_worker_restarts_total", "Sensor worker processes restarted after dying")
+SENSORS_EXPIRED = metrics.counter("drone_sensors_expired_total", "Sensors forgotten after going silent")
+SPOOL_QUEUE_DROPPED = metrics.counter("drone_spool_queue_dropped_total",
+                                      "Packets dropped because the spool writer fell behind")
+SPOOL_WRITE_ERRORS = metrics.counter("drone_spool_write_errors_total", "Packets that failed to write to the spool")
+WORKER_FRAME_ERRORS = metrics.counter("drone_worker_frame_errors_total",
+                                      "Sensor frames a worker failed to handle unexpectedly")
+
+
+def parse_reading(msg):
+    """Returns (sensor_id, temperature, humidity, timestamp), or None if msg
+    holds no valid reading."""
     try:
-        new_sensor_port = int(ent_sensor_port.get())
-        new_central_port = int(ent_central_port.get())
-        if not (0 < new_sensor_port < 65536) or not (0 < new_central_port < 65536):
-            raise ValueError
-    except ValueError:
-        message_queue.put(f"[{datetime.now()}] Invalid port number. Must be between 1 and 65535.")
+        temperature = float(msg["temperature"])
+        humidity = float(msg["humidity"])
+    except (KeyError, TypeError, ValueError):
+        return None
+    sensor_id = msg.get("sensor_id", "unknown")
+    if not isinstance(sensor_id, str):
+        # It keys windows, metrics and JSON objects; 1 and "1" must not split.
+        return None
+    return sensor_id, temperature, humidity, msg.get("timestamp")
+
+
+def sensor_health(registry):
+    # Metric lines from registry.health(), the sensors with the most errors
+    # and then the longest silent first.
+    health = registry.health()
+    yield f"drone_sensor_unattributed_errors {registry.unattributed_errors}"
+    worst = sorted(health, key=lambda sensor_id: (health[sensor_id]["errors"], health[sensor_id]["last_seen"]),
+                   reverse=True)
+    for sensor_id in worst[:metrics.MAX_LABELS]:
+        info = health[sensor_id]
+        yield f'drone_sensor_errors{{sensor="{sensor_id}"}} {info["errors"]}'
+        yield f'drone_sensor_seconds_since_seen{{sensor="{sensor_id}"}} {info["last_seen"]}'
+        yield f'drone_sensor_readings_per_second{{sensor="{sensor_id}"}} {info["rate"]}'
+
+
+def split_packet(packet, limit=MAX_PACKET_BYTES):
+    """Yields packet, or several copies each carrying a share of its averages
+    and anomalies, so that each one encodes to at most limit bytes. Only the
+    first copy keeps the sensor registry summary."""
+    if len(json.dumps(packet, separators=(",", ":"))) <= limit:
+        yield packet
         return
-    
-    if new_sensor_port == PORT and new_central_port == CENTRAL_SERVER_PORT:
-        message_queue.put(f"[{datetime.now()}] Ports are already set to {PORT} and {CENTRAL_SERVER_PORT}.")
+    items = [("averages", item) for item in packet["averages"].items()]
+    items += [("anomalies", anomaly) for anomaly in packet["anomalies"]]
+    if len(items) < 2:
+        yield packet  # can't be split; the uplink drops it
         return
+    half = len(items) // 2
+    for i, share in enumerate((items[:half], items[half:])):
+        part = dict(packet, averages={}, anomalies=[])
+        if i:
+            part.pop("sensors", None)
+        for key, item in share:
+            if key == "averages":
+                part["averages"][item[0]] = item[1]
+            else:
+                part["anomalies"].append(item)
+        yield from split_packet(part, limit)
 
-    CENTRAL_SERVER_PORT = new_central_port
 
-    if new_sensor_port !=  PORT:
-        if drone_socket:
-            try:
-                drone_socket.close()
-            except:
-                pass
-        restart_server = True
-    
-    message = f"[{datetime.now()}] Current Ports, Sensor Port: {new_sensor_port}, Central Server Port: {CENTRAL_SERVER_PORT}"
-    message_queue.put(message)
+class DroneEngine:
+    """Sensor ingest, edge aggregation and uplink forwarding, with no GUI.
 
-btn_check = tk.Button(frm_ports, text="Change Ports", command=change_ports)
-btn_check.pack(pady=5)
+    Status lines (str) and battery updates (("update_battery", level)) are
+    passed to every callback registered with subscribe(); with no
+    subscribers the per-reading log lines are never even formatted.
+    """
 
-# port config end
+    def __init__(self, host=HOST, port=PORT, central_host=CENTRAL_SERVER_HOST,
+                 central_port=CENTRAL_SERVER_PORT, spool_dir=SPOOL_DIR, battery_drain=True,
+                 drone_id=DRONE_ID, aggregation_interval=None, flush_readings=None, flush_age=None,
+                 workers=None):
+        self.drone_id = drone_id
+        self.host = host
+        self.port = port
+        self.central_host = central_host
+        self.central_port = central_port
+        self.drain_battery = battery_drain
+        self.subscribers = []
 
-frm_log = tk.Frame(master=root, relief=tk.RIDGE, borderwidth=3)
-listbox = tk.Listbox(master=frm_log, width=120, height=35)
-scrollbar = tk.Scrollbar(master=frm_log, orient="vertical")
-listbox.pack(side=tk.LEFT, fill=tk.BOTH)
-scrollbar.pack(side=tk.RIGHT, fill=tk.BOTH)
-listbox.config(yscrollcommand=scrollbar.set)
-scrollbar.config(command=listbox.yview)
-frm_log.grid(row=2, column=0, padx=10, pady=10)
+        # Each sensor shard has its own lock; battery state has state_lock.
+        # No I/O, logging or emitting happens while any of them is held.
+        self.buffers = ShardedWindowStats(WINDOW_SIZE, AGGREGATIONS)
+        self.outgoing_data = Spool(spool_dir, max_bytes=SPOOL_MAX_BYTES, drop_policy=SPOOL_DROP_POLICY)
+        self.battery_level = 100
+        self.return_to_base = False
+        self.state_lock = threading.Lock()
+        self.last_sent = {}  # sensor ID -> (monotonic time, summary) last sent
+        self.base_interval = aggregation_interval or AGGREGATION_INTERVAL
+        self.aggregation_interval = self.base_interval
+        self.flush_readings = flush_readings or FLUSH_READINGS
+        self.flush_age = flush_age or FLUSH_AGE
+        self.pacing = None
+        self.pacing_lock = threading.Lock()  # adapt_pacing runs from the scheduler and battery setters
+        self.detector = DetectorPipeline(ANOMALY_RULES, SENSOR_ANOMALY_RULES)
+        self.registry = SensorRegistry(SENSOR_TTL)  # live sensors; the workers keep their own
+        workers = WORKERS if workers is None else workers
+        self.workers = SensorWorkers(self, workers) if workers else None
+        self.sensor_server = SensorIngestServer(host, port, self.handle_sensor, self.log, forward=self.workers,
+                                                on_error=self.registry.error)
+        self.uplink = Uplink(central_host, central_port, self.log, drone_id=drone_id)
+        self.scheduler = Scheduler(self.log, name="drone-scheduler")
+        self.aggregation_job = None
+        self.recorder = None  # a capture.Recorder while recording
+        self._stop = threading.Event()
+        # Spool writes (and their fsyncs) happen on their own thread, never
+        # on the ingest loop that raises alerts.
+        self._spool_queue = Queue(SPOOL_QUEUE_MAX)
+        self._spool_thread = None
 
-# ------------ Sensor TCP Server ------------
+        metrics.gauge("drone_sensors", "Sensors with a reading window",
+                      lambda: len(self.workers.summaries) if self.workers else len(self.buffers))
+        metrics.gauge("drone_uplink_backlog", "Packets queued or in flight to the central server",
+                      self.uplink.backlog)
+        metrics.gauge("drone_uplink_connected", "1 while the uplink is connected", lambda: int(self.uplink.connected))
+        metrics.gauge("drone_spool_pending_bytes", "Return-to-base backlog on disk", self.outgoing_data.pending_bytes)
+        metrics.gauge("drone_spool_dropped_total", "Packets dropped by a full spool", lambda: self.outgoing_data.dropped)
+        metrics.gauge("drone_spool_queue_depth", "Packets waiting to be written to the spool", self._spool_queue.qsize)
+        metrics.gauge("drone_sensor_connections", "Open sensor connections", lambda: self.sensor_server.connections)
+        metrics.gauge("drone_battery_level", "Simulated battery level", lambda: self.battery_level)
+        # With workers, each reports its own sensors; errors the ingest server
+        # can't pin on a worker's connection are still counted here.
+        metrics.lines("drone_sensor_health", "Per-sensor errors, silence and reading rate",
+                      lambda: sensor_health(self.registry))
 
-def handle_sensor(conn, addr):
-    try:
+    def subscribe(self, callback):
+        self.subscribers.append(callback)
+
+    def emit(self, msg):
+        for callback in self.subscribers:
+            callback(msg)
+
+    def log(self, text):
+        if self.subscribers:
+            self.emit(f"[{datetime.now()}] {text}")
+
+    def start(self):
+        if self.workers is not None:
+            self.workers.start()
+        self._spool_thread = threading.Thread(target=self.spool_writer, name="spool-writer", daemon=True)
+        self._spool_thread.start()
+        self.uplink.start()
+        self.sensor_server.start()
+        self.adapt_pacing()
+        scheduler = self.scheduler
+        self.aggregation_job = scheduler.every(self.aggregation_interval, self.edge_processing,
+                                               policy=AGGREGATION_POLICY)
+        # Draining the spool waits on acks, so it gets its own thread.
+        scheduler.every(FORWARD_INTERVAL, self.forward_queued_data, policy=FORWARD_POLICY, blocking=True)
+        if self.drain_battery:
+            scheduler.every(BATTERY_INTERVAL, self.battery_drain, policy=BATTERY_POLICY)
+        if self.flush_readings or self.flush_age:
+            scheduler.every(FLUSH_CHECK_INTERVAL, self.flush_sensors)
+        scheduler.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self.scheduler.stop()
+        self.sensor_server.stop()
+        if self.workers is not None:
+            self.workers.stop()
+        self.uplink.stop()
+        if self._spool_thread is not None:
+            # Unacknowledged packets are kept for next time. The central
+            # server may have processed some of them already.
+            for packet in self.uplink.unsent():
+                self._spool_queue.put((packet, "unacknowledged packet"))
+            self._spool_queue.put(None)
+            self._spool_thread.join(timeout=5)
+        self.outgoing_data.close()
+        if self.recorder is not None:
+            self.recorder.close()
+
+    def change_ports(self, sensor_port, central_port):
+        if not (0 < sensor_port < 65536) or not (0 < central_port < 65536):
+            self.log("Invalid port number. Must be between 1 and 65535.")
+            return
+        if sensor_port == self.port and central_port == self.central_port:
+            self.log(f"Ports are already set to {self.port} and {self.central_port}.")
+            return
+
+        self.central_port = central_port
+        self.uplink.set_address(self.central_host, self.central_port)
+
+        if sensor_port != self.port:
+            self.port = sensor_port
+            self.sensor_server.change_port(self.port)
+
+        self.log(f"Current Ports, Sensor Port: {sensor_port}, Central Server Port: {self.central_port}")
+
+    # ------------ Sensor TCP Server + Anomaly Detection ------------
+
+    def handle_sensor(self, msg, addr):
+        # Runs on the ingest event loop thread for every decoded reading.
+        if self.recorder is not None:
+            self.recorder.record("sensor", addr, msg)
+        reading = parse_reading(msg)
+        if reading is None:
+            INVALID_READINGS.inc()
+            self.registry.error(addr)
+            self.log(f"Invalid reading from {addr}: {msg}")
+            return
+        sensor_id, temperature, humidity, timestamp = reading
+        SENSOR_MESSAGES.inc(sensor_id)
+        self.registry.seen(sensor_id, addr)
+        self.buffers.append(sensor_id, temperature, humidity, timestamp, INGEST_LOCK_WAIT.observe)
+        if self.subscribers:
+            self.emit(f"[{datetime.now()}] Received from {sensor_id}: {msg}")
+        # Detector state is only touched from the ingest loop, so no lock.
+        anomalies = self.detector.evaluate(sensor_id, temperature, humidity, timestamp)
+        if anomalies:
+            ANOMALIES.inc(len(anomalies))
+            self.send_alert(anomalies)
+
+    def send_alert(self, anomalies):
+        # Alerts go out immediately instead of waiting for the next tick.
+        packet = {
+            "drone_id": self.drone_id,
+            "timestamp": datetime.utcnow().isoformat(),
+            "averages": {},
+            "anomalies": anomalies
+        }
+        self.queue_or_send(packet, "alert")
+
+    def queue_or_send(self, packet, kind):
+        for part in split_packet(packet):
+            self.queue_or_send_one(part, kind)
+
+    def queue_or_send_one(self, packet, kind):
+        if not self.return_to_base and not self.uplink_stalled():
+            self.send_to_central(packet, urgent=kind == "alert")
+        else:
+            self.spool(packet, kind)
+
+    def spool(self, packet, kind):
+        # Never blocks the caller, which may be the ingest loop.
         while True:
-            data = conn.recv(1024)
-            if not data:
-                break
             try:
-                msg = json.loads(data.decode())
-                sensor_id = msg.get("sensor_id", "unknown")
-                with lock:
-                    buffers[sensor_id].append(msg)
-                message = f"[{datetime.now()}] Received from {sensor_id}: {msg}"
-                message_queue.put(message)
-            except json.JSONDecodeError:
-                message_queue.put(f"[{datetime.now()}] Invalid JSON from {addr}")
-    finally:
-        conn.close()
-        message_queue.put(f"[{datetime.now()}] Connection closed for {addr}")
+                self._spool_queue.put_nowait((packet, kind))
+                return
+            except Full:
+                pass
+            dropped = kind
+            if SPOOL_DROP_POLICY == "oldest":
+                try:
+                    dropped = self._spool_queue.get_nowait()[1]
+                except Empty:
+                    continue
+            SPOOL_QUEUE_DROPPED.inc()
+            self.log(f"Spool writer behind, dropped {dropped}")
+            if SPOOL_DROP_POLICY == "newest":
+                return
 
-def start_sensor_server():
-    global PORT, drone_socket, stop_server, restart_server
+    def uplink_stalled(self):
+        # True when more packets would only pile up in the uplink's memory.
+        # forward_queued_data keeps one batch queued, so the uplink goes on
+        # retrying and the spool drains once it's back.
+        uplink = self.uplink
+        down_since = uplink.down_since
+        return (uplink.backlog() >= UPLINK_SPILL_BACKLOG
+                or (down_since is not None and time.monotonic() - down_since > UPLINK_SPILL_AFTER))
 
-    while not stop_server:
-        try:
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as server:
-                drone_socket = server
-                server.settimeout(1.0)  # Makes all operations interruptible
-                server.bind((HOST, PORT))
-                server.listen()
-                message_queue.put(f"[{datetime.now()}] Drone started listening on {HOST}:{PORT}...")
-
-                while not (stop_server or restart_server):
-                    try:
-                        conn, addr = server.accept()
-                        threading.Thread(target=handle_sensor, args=(conn, addr), daemon=True).start()
-                    except socket.timeout:
-                        continue
-                    except OSError:
-                        message_queue.put(f"[{datetime.now()}] Closing current server...")
-                        break
-                    except Exception as e:
-                        message_queue.put(f"[{datetime.now()}] Error: {str(e)}")
-                        time.sleep(2)
-                
-                if restart_server:
-                    message_queue.put(f"[{datetime.now()}] Restarting server on {HOST}:{PORT}...")
-                    restart_server = False
-                    PORT = new_sensor_port
-                    continue
-        except Exception as e:
-            message_queue.put(f"[{datetime.now()}] Error starting server: {str(e)}")
-            time.sleep(2)
-        
-            
+    def spool_writer(self):
+        while True:
+            item = self._spool_queue.get()
+            if item is None:
+                return
+            packet, kind = item
+            try:
+                appended = self.outgoing_data.append(packet)
+            except Exception as e:
+                # e.g. a full disk; the next packet may still fit.
+                SPOOL_WRITE_ERRORS.inc()
+                self.log(f"Error writing {kind} to the spool: {str(e)}")
+                continue
+            if appended:
+                self.log(f"Queued {kind} to the spool")
+            else:
+                self.log(f"Spool full, dropped {kind}")
 
-# ------------ Edge Processing + Anomaly Detection ------------
+    # ------------ Edge Processing ------------
 
-def edge_processing():
-    global reported_anomalies
-    while True:
-        time.sleep(10)
+    def aggregate(self, flush=False):
+        # flush=True sends only the windows whose flush trigger has fired;
+        # otherwise the packet also carries the sensor registry's summary.
         packet = {
-            "drone_id": "drone1",
+            "drone_id": self.drone_id,
             "timestamp": datetime.utcnow().isoformat(),
             "averages": {},
             "anomalies": []
         }
-        with lock:
-            for sensor_id, readings in buffers.items():
-                if not readings:
-                    continue
-                avg_temp = sum(r["temperature"] for r in readings) / len(readings)
-                avg_hum = sum(r["humidity"] for r in readings) / len(readings)
-                packet["averages"][sensor_id] = {
-                    "avg_temperature": round(avg_temp, 2),
-                    "avg_humidity": round(avg_hum, 2)
-                }
-                for r in readings:
-                    anomaly_key = f"{sensor_id}_{r['timestamp']}"
-                    if r["temperature"] > 50 and anomaly_key not in reported_anomalies:
-                        packet["anomalies"].append({
-                            "sensor_id": sensor_id,
-                            "type": "temperature_high",
-                            "value": r["temperature"],
-                            "timestamp": r["timestamp"]
-                        })
-                        reported_anomalies.add(anomaly_key)
-                    if r["humidity"] < 10 and anomaly_key not in reported_anomalies:
-                        packet["anomalies"].append({
-                            "sensor_id": sensor_id,
-                            "type": "humidity_low",
-                            "value": r["humidity"],
-                            "timestamp": r["timestamp"]
-                        })
-                        reported_anomalies.add(anomaly_key)
-
-            if return_to_base:
-                outgoing_data.append(packet)
-                message_queue.put(f"[{datetime.now()}] Queued data (return-to-base active)")
-            else:
-                send_to_central(packet)
+        started = perf_counter()
+        if self.workers is not None:
+            averages = self.workers.flush(self.flush_readings, self.flush_age) if flush else self.workers.snapshot()
+        elif flush:
+            averages = self.buffers.flush(self.flush_readings, self.flush_age, AGGREGATE_LOCK_WAIT.observe)
+        else:
+            averages = self.buffers.snapshot(AGGREGATE_LOCK_WAIT.observe)
+        packet["averages"] = self.changed_averages(averages, time.monotonic())
+        if not flush:
+            packet["sensors"] = self.workers.sensor_summary if self.workers is not None else self.registry.summary()
+        AGGREGATE_TIME.observe(perf_counter() - started)
+        return packet
 
-# ------------ Central Server Forwarding ------------
+    def changed_averages(self, averages, now):
+        last_sent = self.last_sent
+        changed = {}
+        for sensor_id, summary in averages.items():
+            last = last_sent.get(sensor_id)
+            # Unchanged windows hand back the very same summary object; with
+            # no new readings there's nothing to refresh, and the central
+            # server ages the sensor out of its fleet rollup as it should.
+            if last is not None and (summary is last[1] or now - last[0] < DEADBAND_REFRESH and all(
+                    abs(summary[key] - last[1][key]) < band for key, band in DEADBAND.items())):
+                continue
+            changed[sensor_id] = summary
+            last_sent[sensor_id] = (now, summary)
+        DEADBAND_SKIPPED.inc(len(averages) - len(changed))
+        return changed
 
-def send_to_central(packet):
-    global CENTRAL_SERVER_PORT
-    try:
-        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-            s.connect((CENTRAL_SERVER_HOST, CENTRAL_SERVER_PORT))
-            s.sendall(json.dumps(packet).encode())
-            for sensor in packet["averages"]:
-                message_queue.put(f"[{datetime.now()}] {sensor} averages: Temp={packet['averages'][sensor]['avg_temperature']}°C | "
-                                  f"Hum={packet['averages'][sensor]['avg_humidity']}%")
+    def adapt_pacing(self):
+        interval, linger, batch = self.base_interval, 0.0, MAX_BATCH
+        reason = "normal"
+        for level, level_interval, level_linger, level_batch in PACING:
+            if self.battery_level <= level:
+                # Low battery only ever slows aggregation down.
+                interval, linger, batch = max(self.base_interval, level_interval), level_linger, level_batch
+                reason = f"battery <= {level}%"
+                break
+        uplink = self.uplink
+        if uplink.failures or (uplink.rtt is not None and uplink.rtt > POOR_LINK_RTT):
+            linger, batch = max(linger, POOR_LINK_LINGER), max(batch, POOR_LINK_BATCH)
+            reason += ", poor link"
+        pacing = (interval, linger, batch)
+        with self.pacing_lock:
+            changed = pacing != self.pacing
+            if changed:
+                self.pacing = pacing
+                self.aggregation_interval = interval
+                if self.aggregation_job is not None:
+                    self.scheduler.set_interval(self.aggregation_job, interval)
+                uplink.set_pacing(batch, linger)
+        if changed:
+            self.log(f"Uplink pacing ({reason}): aggregate every {interval}s, "
+                     f"batches of up to {batch} held for up to {linger}s")
+
+    def edge_processing(self):
+        packet = self.aggregate()
+        # Detector state belongs to the ingest loop; expire sensors there.
+        # (Workers expire their own on every snapshot.)
+        if self.workers is None and self.sensor_server.loop is not None:
+            self.sensor_server.loop.call_soon_threadsafe(self.expire_sensors)
+        sensors = packet["sensors"]
+        if packet["averages"] or sensors["joined"] or sensors["expired"] or sensors["errors"]:
+            self.queue_or_send(packet, "data")
+        self.adapt_pacing()
+
+    def expire_sensors(self):
+        self.detector.expire()
+        expired = self.registry.expire()
+        if expired:
+            self.forget_sensors(expired)
+
+    def forget_sensors(self, sensor_ids):
+        self.buffers.forget(sensor_ids)
+        for sensor_id in sensor_ids:
+            self.detector.forget(sensor_id)
+            self.last_sent.pop(sensor_id, None)
+            SENSOR_MESSAGES.forget(sensor_id)
+        SENSORS_EXPIRED.inc(len(sensor_ids))
+        self.log(f"Forgot {len(sensor_ids)} sensors silent for over {SENSOR_TTL:g}s")
+
+    def flush_sensors(self):
+        packet = self.aggregate(flush=True)
+        if packet["averages"]:
+            self.queue_or_send(packet, "data")
+
+    # ------------ Central Server Forwarding ------------
+
+    def send_to_central(self, packet, urgent=False):
+        # Queues the packet on the persistent uplink; it is (re)sent until acked.
+        seq = self.uplink.send(packet, urgent)
+        if self.subscribers:
+            for sensor, stats in packet["averages"].items():
+                self.log(f"{sensor} averages: Temp={stats['avg_temperature']}°C | Hum={stats['avg_humidity']}%")
             for anomaly in packet["anomalies"]:
-                message_queue.put(f"[{datetime.now()}] Anomaly detected: {anomaly['sensor_id']} | {anomaly['type']} | "
-                                  f"Value={anomaly['value']} | Timestamp={anomaly['timestamp']}")
-            message_queue.put(f"[{datetime.now()}] Forwarded data to Central Server.")
-    except Exception as e:
-        message_queue.put(f"[{datetime.now()}] Error sending to Central Server: {str(e)}")
-
-def forward_queued_data():
-    global outgoing_data
-    while True:
-        time.sleep(5)
-        with lock:
-            if not return_to_base and outgoing_data:
-                message_queue.put(f"[{datetime.now()}] Sending queued data...")
-                for packet in outgoing_data:
-                    send_to_central(packet)
-                outgoing_data.clear()
-
-# ------------ Battery Simulation ------------
-
-def battery_drain():
-    global battery_level, return_to_base
-    while True:
-        time.sleep(5)
-        with lock:
-            if battery_level > 0:
-                battery_level -= 1
-                message_queue.put(("update_battery", battery_level))
-
-            if battery_level <= 20 and not return_to_base:
-                return_to_base = True
-                message_queue.put(f"[{datetime.now()}] Battery low. Entering return-to-base mode.")
-
-            elif battery_level > 20 and return_to_base:
-                return_to_base = False
-                message_queue.put(f"[{datetime.now()}] Battery restored. Resuming normal operation.")
-
-def set_battery_level(val):
-    global battery_level, return_to_base
-    with lock:
-        battery_level = val
-        battery_label.config(text=f"Battery Level: {battery_level}%")
-        if battery_level <= 20:
-            return_to_base = True
-            message_queue.put(f"[{datetime.now()}] Manual battery low. Return-to-base mode ON.")
-        else:
-            if return_to_base:
-                return_to_base = False
-                message_queue.put(f"[{datetime.now()}] Manual battery restore. Normal mode ON.")
-
-# ------------ GUI Updater ------------
-
-def update_gui():
-    while not message_queue.empty():
-        msg = message_queue.get()
-        if isinstance(msg, tuple) and msg[0] == "update_battery":
-            battery_slider.set(msg[1])
-            battery_label.config(text=f"Battery Level: {msg[1]}%")
+                self.log(f"Anomaly detected: {anomaly['sensor_id']} | {anomaly['type']} | "
+                         f"Value={anomaly['value']} | Timestamp={anomaly['timestamp']}")
+            self.log(f"Forwarded data to Central Server (seq {seq}, backlog {self.uplink.backlog()}).")
+        return seq
+
+    def forward_queued_data(self):
+        if self.return_to_base or not self.outgoing_data:
+            return
+        self.log("Sending queued data...")
+        # Drain in batches; a batch is only consumed from the spool once the
+        # central server has acknowledged all of it, so a crash resumes from
+        # the last committed offset.
+        while not self.return_to_base and not self._stop.is_set():
+            packets, cursor = self.outgoing_data.read_batch(SPOOL_BATCH)
+            if not packets:
+                break
+            for packet in packets:
+                seq = self.send_to_central(packet)
+            # The uplink keeps resending until acked, so just wait it out.
+            while not self.uplink.wait_acked(seq, timeout=30):
+                if self._stop.is_set():
+                    return
+                self.log("Waiting for Central Server to acknowledge queued data...")
+            self.outgoing_data.commit(cursor)
+
+    # ------------ Battery Simulation ------------
+
+    def battery_drain(self):
+        with self.state_lock:
+            drained = self.battery_level > 0
+            if drained:
+                self.battery_level -= 1
+            level = self.battery_level
+            was_returning = self.return_to_base
+            returning = self.return_to_base = level <= 20
+
+        if drained:
+            self.emit(("update_battery", level))
+            self.adapt_pacing()
+        if returning and not was_returning:
+            self.log("Battery low. Entering return-to-base mode.")
+        elif was_returning and not returning:
+            self.log("Battery restored. Resuming normal operation.")
+
+    def set_battery_level(self, val):
+        if self.recorder is not None:
+            self.recorder.record("battery", "manual", {"level": val})
+        with self.state_lock:
+            self.battery_level = val
+            was_returning = self.return_to_base
+            self.return_to_base = val <= 20
+
+        self.emit(("update_battery", val))
+        self.adapt_pacing()
+        if val <= 20:
+            self.log("Manual battery low. Return-to-base mode ON.")
+        elif was_returning:
+            self.log("Manual battery restore. Normal mode ON.")
+
+
+# ------------ Sensor Workers ------------
+
+class SensorWorkers:
+    """Spreads sensor decoding, anomaly detection and windows over worker
+    processes, so ingest isn't bound to the one core the GIL allows.
+
+    The ingest loop still accepts connections and answers codec hellos, then
+    hands each connection's raw bytes to one worker (connection ID modulo
+    the worker count) through that worker's shared-memory ring. Sharding by
+    connection rather than by sensor ID keeps the loop from decoding
+    anything and keeps a connection's interned sensor IDs in one place; a
+    sensor that reconnects may land on another worker, which then just
+    continues its window from scratch. Workers send anomalies back as they
+    find them and their changed window summaries when asked. Each keeps its
+    own sensor registry and expires its own silent sensors; a sensor only
+    leaves `summaries` when the worker that last summarized it expires it.
+    """
+
+    def __init__(self, engine, count):
+        self.engine = engine
+        self.count = count
+        self.workers = []
+        self.summaries = {}  # sensor ID -> latest summary from any worker
+        self.owners = {}  # sensor ID -> index of the worker that sent that summary
+        self.sensor_summary = merge_summaries(())  # all workers' registry summaries, as of the last snapshot
+        self.connections = {}  # forwarded connection ID -> protocol
+        self.backlog = deque()  # (protocol, worker, data) waiting for ring space
+        self.paused = set()
+        self.worker_metrics = {}
+        self.ctx = None
+        self.results = None
+        self.replies = {}
+        self.request_id = 0
+        self.request_lock = threading.Lock()
+        self.cond = threading.Condition()
+
+    def start(self):
+        # Spawned, not forked: this process already runs threads.
+        ctx = self.ctx = multiprocessing.get_context("spawn")
+        self.results = ctx.Queue()
+        self.workers = [SensorWorker(ctx, i, self.results) for i in range(self.count)]
+        threading.Thread(target=self.collect, daemon=True).start()
+        metrics.lines("drone_workers", "Metrics reported by each sensor worker process", self.render_metrics)
+
+    def stop(self):
+        for worker in self.workers:
+            worker.stop()
+        if self.results is not None:
+            self.results.put(None)
+
+    # Called by the sensor server, on its loop thread.
+
+    def data(self, protocol, data):
+        self.connections[protocol.id] = protocol
+        worker = self.workers[protocol.id % len(self.workers)]
+        if self.backlog or not worker.ring.put(protocol.id, data):
+            self.hold(protocol, worker, data)
+
+    def closed(self, protocol):
+        if self.connections.pop(protocol.id, None) is not None:
+            worker = self.workers[protocol.id % len(self.workers)]
+            if self.backlog or not worker.ring.put(protocol.id, None):
+                self.hold(protocol, worker, None)
+
+    def hold(self, protocol, worker, data):
+        # A full ring pushes back on the sensors: their connections stop
+        # being read until the backlog is in.
+        if not self.backlog:
+            self.engine.sensor_server.loop.call_later(WORKER_RETRY_INTERVAL, self.retry)
+        self.backlog.append((protocol, worker, data))
+        if data is not None and protocol not in self.paused:
+            self.paused.add(protocol)
+            protocol.transport.pause_reading()
+
+    def retry(self):
+        backlog = self.backlog
+        while backlog:
+            protocol, worker, data = backlog[0]
+            if not worker.process.is_alive():
+                # Nothing will ever drain its ring; its connections are
+                # closed once it is restarted.
+                self.backlog = backlog = deque(entry for entry in backlog if entry[1] is not worker)
+                continue
+            if not worker.ring.put(protocol.id, data):
+                self.engine.sensor_server.loop.call_later(WORKER_RETRY_INTERVAL, self.retry)
+                return
+            backlog.popleft()
+        for protocol in self.paused:
+            protocol.transport.resume_reading()
+        self.paused.clear()
+
+    def drop(self, conn_id):
+        protocol = self.connections.get(conn_id)
+        if protocol is not None:
+            protocol.transport.close()
+
+    def retire(self, index, dead):
+        # The dead worker took its connections' codec state with it, so
+        # they are closed and their sensors reconnect to its replacement.
+        self.backlog = deque(entry for entry in self.backlog if entry[1] is not dead)
+        for conn_id, protocol in list(self.connections.items()):
+            if conn_id % len(self.workers) == index:
+                protocol.transport.close()
+        dead.control.close()
+        dead.ring.close()
+
+    # Results from the workers.
+
+    def collect(self):
+        engine = self.engine
+        while True:
+            msg = self.results.get()
+            if msg is None:
+                return
+            kind = msg[0]
+            if kind == "anomalies":
+                ANOMALIES.inc(len(msg[1]))
+                engine.send_alert(msg[1])
+            elif kind == "summaries":
+                with self.cond:
+                    if msg[2] == self.request_id:
+                        self.replies[msg[1]] = msg[3]
+                        self.cond.notify_all()
+            elif kind == "metrics":
+                self.worker_metrics[msg[1]] = msg[2]
+            elif kind == "error":
+                engine.log(f"Sensor worker {msg[1]} failed to handle a frame: {msg[2]}")
+            elif kind == "drop" and engine.sensor_server.loop is not None:
+                engine.sensor_server.loop.call_soon_threadsafe(self.drop, msg[1])
+
+    def request(self, *command):
+        # Returns {worker index: reply} from the workers that answered.
+        with self.request_lock:
+            with self.cond:
+                self.request_id += 1
+                request_id = self.request_id
+                self.replies = {}
+            asked = []
+            for index, worker in enumerate(self.workers):
+                if not worker.process.is_alive():
+                    worker = self.revive(index)
+                try:
+                    worker.send((command[0], request_id) + command[1:])
+                except OSError:
+                    continue  # died just now; revived next time
+                asked.append(index)
+            deadline = time.monotonic() + WORKER_REPLY_TIMEOUT
+            with self.cond:
+                # Checked in slices, so a worker dying mid-request doesn't
+                # hold the whole aggregation up until the timeout.
+                while True:
+                    waiting = [index for index in asked if index not in self.replies]
+                    if not waiting or not any(self.workers[index].process.is_alive() for index in waiting):
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.cond.wait(min(remaining, 0.1))
+                replies, self.replies = self.replies, {}
+        if len(replies) < len(self.workers):
+            self.engine.log(f"Only {len(replies)} of {len(self.workers)} sensor workers replied")
+        return replies
+
+    def revive(self, index):
+        # Runs under request_lock, on the aggregation thread that also owns
+        # summaries and owners.
+        dead = self.workers[index]
+        WORKER_RESTARTS.inc()
+        self.engine.log(f"Sensor worker {index} exited with code {dead.process.exitcode}; restarting it")
+        worker = self.workers[index] = SensorWorker(self.ctx, index, self.results)
+        for sensor_id in [s for s, owner in self.owners.items() if owner == index]:
+            del self.owners[sensor_id]
+            del self.summaries[sensor_id]
+            self.engine.last_sent.pop(sensor_id, None)
+        loop = self.engine.sensor_server.loop
+        if loop is not None:
+            loop.call_soon_threadsafe(self.retire, index, dead)
         else:
-            listbox.insert(tk.END, msg)
-            listbox.yview(tk.END)
+            self.retire(index, dead)
+        return worker
+
+    def snapshot(self):
+        summaries, owners = self.summaries, self.owners
+        replies = self.request("snapshot")
+        for index, (changed, _, _) in replies.items():
+            summaries.update(changed)
+            owners.update(dict.fromkeys(changed, index))
+        # Only after every reply is in: a sensor one worker expired may
+        # have just turned up on another.
+        expired = [sensor_id for index, (_, gone, _) in replies.items()
+                   for sensor_id in gone if owners.get(sensor_id) == index]
+        for sensor_id in expired:
+            del summaries[sensor_id]
+            del owners[sensor_id]
+        if expired:
+            self.engine.forget_sensors(expired)
+        self.sensor_summary = merge_summaries(summary for _, _, summary in replies.values())
+        return dict(summaries)
+
+    def flush(self, count, age):
+        flushed = {}
+        for index, changed in self.request("flush", count, age).items():
+            flushed.update(changed)
+            self.owners.update(dict.fromkeys(changed, index))
+        self.summaries.update(flushed)
+        return flushed
+
+    def render_metrics(self):
+        for index, text in sorted(self.worker_metrics.items()):
+            yield from metrics.relabel(text, "worker", index)
+
+
+class SensorWorker:
+    """One worker process, with its ring and control pipe."""
+
+    def __init__(self, ctx, index, results):
+        self.ring = Ring(ctx.Semaphore(0))
+        self.control, child = ctx.Pipe()
+        self.lock = threading.Lock()
+        self.process = ctx.Process(
+            target=run_sensor_worker,
+            args=(index, self.ring.name, self.ring.capacity, self.ring.wakeup, child, results,
+                  WINDOW_SIZE, AGGREGATIONS, ANOMALY_RULES, SENSOR_ANOMALY_RULES, SENSOR_TTL),
+            daemon=True)
+        self.process.start()
+        child.close()
+
+    def send(self, command):
+        with self.lock:
+            self.control.send(command)
+        self.ring.wake()
+
+    def stop(self):
+        try:
+            self.send(None)
+        except OSError:
+            pass
+        self.process.join(timeout=5)
+        self.ring.close()
+
+
+def run_sensor_worker(index, ring_name, capacity, wakeup, control, results, window_size, aggregations,
+                      rules, sensor_rules, sensor_ttl):
+    # The parent handles Ctrl+C and stops workers through the control pipe.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    ring = Ring(wakeup, capacity, ring_name)
+    buffers = ShardedWindowStats(window_size, aggregations, shards=1)
+    detector = DetectorPipeline(rules, sensor_rules)
+    registry = SensorRegistry(sensor_ttl)  # keyed by connection ID, not address
+    metrics.lines("drone_sensor_health", "Per-sensor errors, silence and reading rate",
+                  lambda: sensor_health(registry))
+    connections = {}  # connection ID -> (FrameDecoder, ReadingDecoder), None once dropped
+    next_report = time.monotonic() + WORKER_REPORT_INTERVAL
+    while True:
+        records = ring.get(WORKER_BATCH_BYTES)
+        anomalies = []
+        error = None
+        for conn_id, data in records:
+            if data is None:
+                connections.pop(conn_id, None)
+                continue
+            decoders = connections.get(conn_id, ())
+            if decoders is None:
+                continue
+            if not decoders:
+                decoders = connections[conn_id] = (FrameDecoder(), ReadingDecoder())
+            try:
+                frames = decoders[0].feed(data)
+            except FrameError:
+                FRAMING_ERRORS.inc()
+                registry.error(conn_id)
+                connections[conn_id] = None
+                results.put(("drop", conn_id))
+                continue
+            FRAMES.inc(len(frames))
+            decode = decoders[1].decode
+            for frame in frames:
+                try:
+                    try:
+                        msg = decode(frame)
+                    except (ValueError, KeyError, struct.error):
+                        DECODE_ERRORS.inc()
+                        registry.error(conn_id)
+                        continue
+                    if msg is None or msg.get("type") == "hello":
+                        continue
+                    reading = parse_reading(msg)
+                    if reading is None:
+                        INVALID_READINGS.inc()
+                        registry.error(conn_id)
+                        continue
+                    sensor_id, temperature, humidity, timestamp = reading
+                    SENSOR_MESSAGES.inc(sensor_id)
+                    registry.seen(sensor_id, conn_id)
+                    buffers.append(sensor_id, temperature, humidity, timestamp)
+                    found = detector.evaluate(sensor_id, temperature, humidity, timestamp)
+                except Exception as e:
+                    # One odd frame mustn't take the worker, and every
+                    # sensor it serves, down with it.
+                    WORKER_FRAME_ERRORS.inc()
+                    registry.error(conn_id)
+                    error = error or repr(e)
+                    continue
+                if found:
+                    anomalies.extend(found)
+        if anomalies:
+            results.put(("anomalies", anomalies))
+        if error:
+            results.put(("error", index, error))  # the first per batch is enough
+
+        while control.poll():
+            command = control.recv()
+            if command is None:
+                ring.close()
+                return
+            if command[0] == "snapshot":
+                detector.expire()
+                expired = registry.expire()
+                buffers.forget(expired)
+                for sensor_id in expired:
+                    detector.forget(sensor_id)
+                    SENSOR_MESSAGES.forget(sensor_id)
+                reply = (buffers.flush(count=1), expired, registry.summary())
+            else:
+                reply = buffers.flush(command[2], command[3])
+            results.put(("summaries", index, command[1], reply))
+
+        now = time.monotonic()
+        if now >= next_report:
+            results.put(("metrics", index, metrics.REGISTRY.render()))
+            next_report = now + WORKER_REPORT_INTERVAL
+        if not records:
+            ring.wait(0.05)
+
+
+# ------------ GUI ------------
+
+def run_gui(engine):
+    # Tk is only imported when a window is actually wanted.
+    import tkinter as tk
+    from gui_log import LogView
+
+    message_queue = Queue()
+    engine.subscribe(message_queue.put)
+    metrics.gauge("drone_gui_queue_depth", "Status lines waiting for the GUI", message_queue.qsize)
+
+    root = tk.Tk()
+    root.title(f"Drone Server - {engine.drone_id}")
+
+    top_frame = tk.Frame(root)
+    top_frame.grid(row=0, column=0, padx=10, pady=5)
+
+    # battery gui start
+    battery_frame = tk.Frame(top_frame)
+    battery_frame.grid(row=0, column=0, padx=10, pady=5)
+
+    battery_label = tk.Label(battery_frame, text=f"Battery Level: {engine.battery_level}%", font=("Arial", 12, "bold"))
+    battery_label.grid(row=0, column=0, padx=10, pady=5)
+
+    battery_slider = tk.Scale(battery_frame, from_=0, to=100, orient="horizontal", label="Adjust Battery Level",
+                              command=lambda val: engine.set_battery_level(int(val)))
+    battery_slider.set(engine.battery_level)
+    battery_slider.grid(row=1, column=0, padx=10, pady=5)
+    # battery gui end
+
+    # port config start
+    frm_ports = tk.Frame(top_frame)
+    frm_ports.grid(row=0, column=1, padx=10)
+
+    tk.Label(frm_ports, text="Sensor Port").pack()
+    ent_sensor_port = tk.Entry(frm_ports)
+    ent_sensor_port.insert(0, str(engine.port))
+    ent_sensor_port.pack()
+
+    tk.Label(frm_ports, text="Central Server Port").pack()
+    ent_central_port = tk.Entry(frm_ports)
+    ent_central_port.insert(0, str(engine.central_port))
+    ent_central_port.pack()
+
+    def change_ports():
+        try:
+            new_sensor_port = int(ent_sensor_port.get())
+            new_central_port = int(ent_central_port.get())
+        except ValueError:
+            engine.log("Invalid port number. Must be between 1 and 65535.")
+            return
+        engine.change_ports(new_sensor_port, new_central_port)
+
+    btn_check = tk.Button(frm_ports, text="Change Ports", command=change_ports)
+    btn_check.pack(pady=5)
+    # port config end
+
+    frm_log = tk.Frame(master=root, relief=tk.RIDGE, borderwidth=3)
+    listbox = tk.Listbox(master=frm_log, width=120, height=35)
+    scrollbar = tk.Scrollbar(master=frm_log, orient="vertical")
+    listbox.pack(side=tk.LEFT, fill=tk.BOTH)
+    scrollbar.pack(side=tk.RIGHT, fill=tk.BOTH)
+    listbox.config(yscrollcommand=scrollbar.set)
+    scrollbar.config(command=listbox.yview)
+    frm_log.grid(row=2, column=0, padx=10, pady=10)
+    log_view = LogView(listbox)
+
+    def update_gui():
+        battery = []
+        def take_battery(msg):
+            if isinstance(msg, tuple) and msg[0] == "update_battery":
+                battery.append(msg[1])
+                return True
+            return False
+        log_view.drain(message_queue, take_battery)
+        if battery:
+            battery_slider.set(battery[-1])
+            battery_label.config(text=f"Battery Level: {battery[-1]}%")
+        root.after(100, update_gui)
+
+    engine.start()
     root.after(100, update_gui)
+    root.mainloop()
+
+
+def print_status(msg):
+    if isinstance(msg, str):
+        print(msg, flush=True)
+
+
+def run_headless(engine, quiet):
+    if not quiet:
+        engine.subscribe(print_status)
+    engine.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        print(f"[{datetime.now()}] Stopping drone...")
+    finally:
+        engine.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drone Server")
+    parser.add_argument("--headless", action="store_true", help="Run without the Tk GUI")
+    parser.add_argument("--quiet", action="store_true", help="Headless: don't print status lines")
+    parser.add_argument("--drone-id", default=DRONE_ID, help=f"Unique drone ID (default: {DRONE_ID})")
+    parser.add_argument("--host", default=HOST, help=f"Sensor listen address (default: {HOST})")
+    parser.add_argument("--port", type=int, default=PORT, help=f"Sensor port (default: {PORT})")
+    parser.add_argument("--central-host", default=CENTRAL_SERVER_HOST,
+                        help=f"Central Server host (default: {CENTRAL_SERVER_HOST})")
+    parser.add_argument("--central-port", type=int, default=CENTRAL_SERVER_PORT,
+                        help=f"Central Server port (default: {CENTRAL_SERVER_PORT})")
+    parser.add_argument("--spool-dir", default=SPOOL_DIR, help=f"Return-to-base spool directory (default: {SPOOL_DIR})")
+    parser.add_argument("--aggregation-interval", type=float, default=AGGREGATION_INTERVAL,
+                        help=f"Seconds between aggregation ticks at full battery (default: {AGGREGATION_INTERVAL})")
+    parser.add_argument("--flush-readings", type=int, default=FLUSH_READINGS,
+                        help="Send a sensor's window early once it has this many new readings")
+    parser.add_argument("--flush-age", type=float, default=FLUSH_AGE,
+                        help="Send a sensor's window early once its oldest unsent reading is this many seconds old")
+    parser.add_argument("--record", metavar="PATH",
+                        help="Record sensor readings and battery changes to a capture file (see capture.py)")
+    parser.add_argument("--workers", type=int, default=WORKERS,
+                        help=f"Processes decoding and aggregating sensor readings; 0 does it all on the "
+                             f"ingest thread (default: {WORKERS})")
+    metrics.add_arguments(parser)
+    args = parser.parse_args()
+    if args.record and args.workers:
+        parser.error("--record needs --workers 0: readings are decoded in the worker processes")
+    metrics.start_from_args(args)
+
+    engine = DroneEngine(args.host, args.port, args.central_host, args.central_port, args.spool_dir,
+                         drone_id=args.drone_id, aggregation_interval=args.aggregation_interval,
+                         flush_readings=args.flush_readings, flush_age=args.flush_age, workers=args.workers)
+    if args.record:
+        engine.recorder = Recorder(args.record)
+    if args.headless:
+        run_headless(engine, args.quiet)
+    else:
+        run_gui(engine)
 
-# ------------ Thread Starters ------------
 
-threading.Thread(target=start_sensor_server, daemon=True).start()
-threading.Thread(target=edge_processing, daemon=True).start()
-threading.Thread(target=forward_queued_data, daemon=True).start()
-threading.Thread(target=battery_drain, daemon=True).start()
-root.after(100, update_gui)
-root.mainloop()
+if __name__ == "__main__":
+    main()
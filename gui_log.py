@@ -0,0 +1,62 @@
+import queue
+import tkinter as tk
+from collections import deque
+
+# Bounded, batched rendering of a message queue into a Tk Listbox. Each
+# frame drains the queue, keeps only the newest lines that fit in one
+# batch, folds runs of identical messages into one row and replaces
+# everything it skipped with a single "N messages suppressed" row, then
+# inserts the batch with one insert() and one yview().
+
+MAX_LINES = 2000        # rows kept in the listbox
+MAX_BATCH = 200         # rows rendered per frame
+MAX_DRAIN = 50000       # messages taken off the queue per frame
+
+
+class LogView:
+    def __init__(self, listbox, max_lines=MAX_LINES, max_batch=MAX_BATCH, color=None):
+        self.listbox = listbox
+        self.max_lines = max_lines
+        self.max_batch = max_batch
+        self.color = color
+        self.suppressed = 0  # total since startup
+
+    def drain(self, source, handle=None):
+        # handle(msg) may claim non-text messages (e.g. battery updates) by
+        # returning True.
+        lines = deque(maxlen=self.max_batch)  # [text, repeats]
+        skipped = 0
+        for _ in range(MAX_DRAIN):
+            try:
+                msg = source.get_nowait()
+            except queue.Empty:
+                break
+            if handle is not None and handle(msg):
+                continue
+            if lines and lines[-1][0] == msg:
+                lines[-1][1] += 1
+                continue
+            if len(lines) == self.max_batch:
+                skipped += lines[0][1]
+            lines.append([msg, 1])
+        self.render(lines, skipped)
+
+    def render(self, lines, skipped=0):
+        if not lines and not skipped:
+            return
+        rows = []
+        if skipped:
+            self.suppressed += skipped
+            rows.append(f"... {skipped} messages suppressed ...")
+        rows.extend(text if repeats == 1 else f"{text} (x{repeats})" for text, repeats in lines)
+
+        listbox = self.listbox
+        first = listbox.size()
+        listbox.insert(tk.END, *rows)
+        if self.color is not None:
+            for i in range(first, first + len(rows)):
+                listbox.itemconfig(i, {'fg': self.color})
+        excess = listbox.size() - self.max_lines
+        if excess > 0:
+            listbox.delete(0, excess - 1)
+        listbox.yview(tk.END)
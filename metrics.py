@@ -0,0 +1,217 @@
+import bisect
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# In-process counters, histograms and gauges, cheap enough to leave on in
+# the hot paths (a few hundred ns per event: no locks, no formatting, no
+# clock reads beyond what the caller times). Everything is rendered in the
+# Prometheus text format on demand, either over HTTP (serve) or to a
+# callback every few seconds (dump_periodically).
+#
+# Updates are plain attribute/dict writes. Under the GIL a rare increment
+# racing another thread's increment of the same metric can be lost, which
+# is acceptable for monitoring and is what keeps them this cheap.
+
+LATENCY_BOUNDS = (1e-6, 4e-6, 1.6e-5, 6.4e-5, 2.56e-4, 1e-3, 4e-3, 1.6e-2, 6.4e-2, 0.25, 1, 4, 16)
+MAX_LABELS = 50  # keyed series shown per render, busiest first
+
+
+class Counter:
+    def __init__(self, name, doc):
+        self.name = name
+        self.doc = doc
+        self.value = 0
+
+    def inc(self, n=1):
+        self.value += n
+
+    def render(self, now):
+        yield f"{self.name} {self.value}"
+
+
+class KeyedCounter:
+    """A counter per key (sensor, drone, ...) that also reports per-second rates.
+
+    Rates cover the interval since the previous render.
+    """
+
+    def __init__(self, name, doc, label):
+        self.name = name
+        self.doc = doc
+        self.label = label
+        self.values = {}
+        self._last = {}
+        self._last_time = time.monotonic()
+
+    def inc(self, key, n=1):
+        values = self.values
+        values[key] = values.get(key, 0) + n
+
+    def render(self, now):
+        values = dict(self.values)
+        elapsed = max(now - self._last_time, 1e-9)
+        rates = {key: (count - self._last.get(key, 0)) / elapsed for key, count in values.items()}
+        self._last, self._last_time = values, now
+        yield f"{self.name}_keys {len(values)}"
+        yield f"{self.name} {sum(values.values())}"
+        for key in sorted(rates, key=rates.get, reverse=True)[:MAX_LABELS]:
+            yield f'{self.name}{{{self.label}="{key}"}} {values[key]}'
+            yield f'{self.name}_per_second{{{self.label}="{key}"}} {rates[key]:.2f}'
+
+    def forget(self, key):
+        self.values.pop(key, None)
+        self._last.pop(key, None)
+
+
+class Histogram:
+    def __init__(self, name, doc, bounds=LATENCY_BOUNDS):
+        self.name = name
+        self.doc = doc
+        self.bounds = list(bounds)
+        self.buckets = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.buckets[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def render(self, now):
+        cumulative = 0
+        for bound, n in zip(self.bounds, self.buckets):
+            cumulative += n
+            yield f'{self.name}_bucket{{le="{bound:g}"}} {cumulative}'
+        yield f'{self.name}_bucket{{le="+Inf"}} {self.count}'
+        yield f"{self.name}_count {self.count}"
+        yield f"{self.name}_sum {self.sum:.6f}"
+        yield f"{self.name}_max {self.max:.6f}"
+
+
+class Gauge:
+    # Read only when rendered, so depths cost nothing on the hot path.
+    def __init__(self, name, doc, read):
+        self.name = name
+        self.doc = doc
+        self.read = read
+
+    def render(self, now):
+        try:
+            yield f"{self.name} {self.read()}"
+        except Exception as e:
+            yield f"# {self.name} unavailable: {e}"
+
+
+class Lines:
+    # Pre-rendered lines from elsewhere, e.g. another process's registry.
+    def __init__(self, name, doc, read):
+        self.name = name
+        self.doc = doc
+        self.read = read
+
+    def render(self, now):
+        return self.read()
+
+
+def relabel(text, label, value):
+    """Adds label="value" to every sample line of a rendered registry."""
+    for line in text.splitlines():
+        if not line or line.startswith("#"):
+            continue
+        name, sample = line.split(" ", 1)
+        if name.endswith("}"):
+            yield f'{name[:-1]},{label}="{value}"}} {sample}'
+        else:
+            yield f'{name}{{{label}="{value}"}} {sample}'
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+
+    def _add(self, metric):
+        # Re-registering a name (e.g. a restarted engine) replaces the old one.
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, doc):
+        return self.metrics.get(name) or self._add(Counter(name, doc))
+
+    def keyed(self, name, doc, label):
+        return self.metrics.get(name) or self._add(KeyedCounter(name, doc, label))
+
+    def histogram(self, name, doc, bounds=LATENCY_BOUNDS):
+        return self.metrics.get(name) or self._add(Histogram(name, doc, bounds))
+
+    def gauge(self, name, doc, read):
+        return self._add(Gauge(name, doc, read))
+
+    def lines(self, name, doc, read):
+        return self._add(Lines(name, doc, read))
+
+    def render(self):
+        now = time.monotonic()
+        lines = []
+        for metric in list(self.metrics.values()):
+            lines.append(f"# HELP {metric.name} {metric.doc}")
+            lines.extend(metric.render(now))
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+counter = REGISTRY.counter
+keyed = REGISTRY.keyed
+histogram = REGISTRY.histogram
+gauge = REGISTRY.gauge
+lines = REGISTRY.lines
+
+
+# ------------ Exposition ------------
+
+def serve(port, host="127.0.0.1", registry=REGISTRY):
+    """Serves GET /metrics on a daemon thread; returns the HTTP server."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/", "/metrics"):
+                self.send_error(404)
+                return
+            body = registry.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def dump_periodically(interval, write, registry=REGISTRY):
+    def run():
+        while True:
+            time.sleep(interval)
+            write(registry.render())
+
+    threading.Thread(target=run, daemon=True).start()
+
+
+def add_arguments(parser):
+    parser.add_argument("--metrics-port", type=int, help="Serve metrics over HTTP on this local port")
+    parser.add_argument("--metrics-dump", type=float, metavar="SECONDS", help="Print all metrics every SECONDS")
+
+
+def start_from_args(args):
+    if args.metrics_port:
+        serve(args.metrics_port)
+    if args.metrics_dump:
+        dump_periodically(args.metrics_dump, lambda text: print(text, flush=True))
@@ -0,0 +1,169 @@
+import json
+import socket
+import struct
+import zlib
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:  # optional, zlib is always available
+    lz4_frame = None
+
+# Wire format shared by sensor -> drone and drone -> central streams:
+# every message is a 4-byte big-endian length followed by that many bytes
+# of payload (UTF-8 JSON by default).
+
+HEADER = struct.Struct("!I")
+HEADER_SIZE = HEADER.size
+MAX_FRAME_SIZE = 1024 * 1024  # 1 MiB, guards against garbage length headers
+
+# Compressed batches (drone -> central, negotiated in the uplink hello): one
+# frame holding a tag byte and the compressed bytes of several ordinary
+# frames. JSON frames always start with "{", so the two never collide.
+COMPRESSION_TAGS = {"lz4": b"L", "zlib": b"Z"}
+COMPRESSIONS = ("lz4", "zlib") if lz4_frame is not None else ("zlib",)
+COMPRESS_CHUNK = 256 * 1024  # raw bytes per compressed frame
+MIN_COMPRESS_BYTES = 512     # smaller batches go out as plain frames
+MAX_EXPANDED_SIZE = 64 * MAX_FRAME_SIZE
+
+# TCP keepalive on long-lived connections, so a peer that vanished without
+# a FIN (power loss, dropped radio link) is noticed in about
+# KEEPALIVE_IDLE + KEEPALIVE_INTERVAL * KEEPALIVE_COUNT seconds.
+KEEPALIVE_IDLE = 10
+KEEPALIVE_INTERVAL = 5
+KEEPALIVE_COUNT = 3
+
+
+class FrameError(ValueError):
+    pass
+
+
+def encode_frame(payload):
+    if len(payload) > MAX_FRAME_SIZE:
+        raise FrameError(f"Frame of {len(payload)} bytes exceeds limit of {MAX_FRAME_SIZE}")
+    return HEADER.pack(len(payload)) + payload
+
+
+def pack_json(obj):
+    return encode_frame(json.dumps(obj, separators=(",", ":")).encode())
+
+
+def send_json(sock, obj):
+    sock.sendall(pack_json(obj))
+
+
+class FrameDecoder:
+    """Incremental decoder: feed it raw recv() chunks, get back whole payloads."""
+
+    def __init__(self, max_frame_size=MAX_FRAME_SIZE):
+        self.max_frame_size = max_frame_size
+        self._buf = bytearray()
+        self._pos = 0
+
+    def feed(self, data):
+        buf = self._buf
+        buf += data
+        frames = []
+        pos = self._pos
+        end = len(buf)
+        while end - pos >= HEADER_SIZE:
+            (length,) = HEADER.unpack_from(buf, pos)
+            if length > self.max_frame_size:
+                raise FrameError(f"Frame of {length} bytes exceeds limit of {self.max_frame_size}")
+            if end - pos - HEADER_SIZE < length:
+                break
+            start = pos + HEADER_SIZE
+            frames.append(bytes(buf[start:start + length]))
+            pos = start + length
+        # Compact only once the consumed prefix dominates, so a burst of small
+        # frames doesn't turn into quadratic memmoves.
+        if pos == end:
+            buf.clear()
+            pos = 0
+        elif pos > 65536 and pos * 2 > end:
+            del buf[:pos]
+            pos = 0
+        self._pos = pos
+        return frames
+
+    def feed_json(self, data):
+        return [json.loads(frame) for frame in self.feed(data)]
+
+    def pending(self):
+        return len(self._buf) - self._pos
+
+    def take_pending(self):
+        """Returns and forgets the bytes of any incomplete frame."""
+        data = bytes(self._buf[self._pos:])
+        self._buf.clear()
+        self._pos = 0
+        return data
+
+
+def choose_compression(offered):
+    for method in COMPRESSIONS:
+        if method in (offered or ()):
+            return method
+    return None
+
+
+def _compress(data, method):
+    if method == "lz4":
+        return lz4_frame.compress(data)
+    return zlib.compress(data, 6)
+
+
+def compress_frames(frames, method):
+    """Encoded frames -> wire bytes, packing runs of them into compressed frames."""
+    out = []
+    chunk = []
+    size = 0
+    for frame in frames + [None]:
+        if frame is not None and (not chunk or size + len(frame) <= COMPRESS_CHUNK):
+            chunk.append(frame)
+            size += len(frame)
+            continue
+        raw = b"".join(chunk)
+        packed = COMPRESSION_TAGS[method] + _compress(raw, method) if size >= MIN_COMPRESS_BYTES else raw
+        out.append(encode_frame(packed) if len(packed) + HEADER_SIZE < size else raw)
+        chunk = [frame]
+        size = len(frame) if frame is not None else 0
+    return b"".join(out)
+
+
+def expand_frames(frames):
+    """Yields payloads, unpacking any compressed batch frames in place."""
+    for frame in frames:
+        tag = frame[:1]
+        if tag == b"Z":
+            inflater = zlib.decompressobj()
+            raw = inflater.decompress(frame[1:], MAX_EXPANDED_SIZE)
+            if inflater.unconsumed_tail:
+                raise FrameError(f"Compressed batch expands past {MAX_EXPANDED_SIZE} bytes")
+        elif tag == b"L":
+            if lz4_frame is None:
+                raise FrameError("lz4 batch received but lz4 is not installed")
+            raw = lz4_frame.decompress(frame[1:])
+        else:
+            yield frame
+            continue
+        decoder = FrameDecoder()
+        yield from decoder.feed(raw)
+        if decoder.pending():
+            raise FrameError("Truncated frame inside compressed batch")
+
+
+def set_keepalive(sock):
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+    # Per-socket timers are Linux/BSD only; elsewhere the OS defaults apply.
+    for option, value in (("TCP_KEEPIDLE", KEEPALIVE_IDLE), ("TCP_KEEPINTVL", KEEPALIVE_INTERVAL),
+                          ("TCP_KEEPCNT", KEEPALIVE_COUNT)):
+        if hasattr(socket, option):
+            sock.setsockopt(socket.IPPROTO_TCP, getattr(socket, option), value)
+
+
+def recv_frames(sock, decoder, bufsize=65536):
+    # Returns None on EOF, otherwise the (possibly empty) list of payloads.
+    data = sock.recv(bufsize)
+    if not data:
+        return None
+    return decoder.feed(data)
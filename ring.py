@@ -0,0 +1,120 @@
+import struct
+from multiprocessing import shared_memory
+
+# Single-producer, single-consumer byte ring in shared memory, for handing
+# raw sensor bytes from the drone's ingest loop to a worker process without
+# pickling or a pipe copy per message. Records are
+#   [u32 length][u32 connection ID][length bytes]
+# written at a free-running head offset (wrapping around the data area) and
+# published by storing the new head; the consumer publishes how far it has
+# read the same way. Each counter has exactly one writer, and a record's
+# bytes are in place before the head moves past them.
+#
+# The consumer blocks on a multiprocessing Semaphore when the ring is
+# empty; it raises a "waiting" flag first, so the producer only pays for
+# release() when someone is actually asleep. (Not an Event: Event.set()
+# waits for sleepers to acknowledge, and hangs forever if one was killed.)
+# Extra releases only cost the consumer a spurious wakeup.
+
+RING_BYTES = 4 * 1024 * 1024
+CONTROL = struct.Struct("QQQ")  # head, tail, consumer waiting
+DATA_OFFSET = 64  # the control words get their own cache line
+RECORD = struct.Struct("II")
+CLOSED = 0xFFFFFFFF  # record length marking a closed connection
+
+
+class Ring:
+    def __init__(self, wakeup, capacity=RING_BYTES, name=None):
+        # wakeup is a Semaphore(0); name=None creates the segment and
+        # workers attach to it by name.
+        self.wakeup = wakeup
+        self.capacity = capacity
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=DATA_OFFSET + capacity)
+            self.owner = True
+        else:
+            # Workers are our own children and share our resource tracker,
+            # so attaching doesn't hand them the segment's cleanup.
+            self.shm = shared_memory.SharedMemory(name=name)
+            self.owner = False
+        self.name = self.shm.name
+        self.buf = self.shm.buf
+        self.data = self.shm.buf[DATA_OFFSET:DATA_OFFSET + capacity]
+        if self.owner:
+            CONTROL.pack_into(self.buf, 0, 0, 0, 0)
+
+    # ------------ Producer ------------
+
+    def put(self, conn_id, data):
+        """Appends a record, or returns False if there's no room for it.
+        data=None records that the connection closed."""
+        head, tail, _ = CONTROL.unpack_from(self.buf, 0)
+        length = 0 if data is None else len(data)
+        size = RECORD.size + length
+        if size > self.capacity - (head - tail):
+            return False
+        self._write(head, RECORD.pack(CLOSED if data is None else length, conn_id))
+        if length:
+            self._write(head + RECORD.size, data)
+        struct.pack_into("Q", self.buf, 0, head + size)
+        if struct.unpack_from("Q", self.buf, 16)[0]:
+            self.wakeup.release()
+        return True
+
+    def _write(self, offset, data):
+        start = offset % self.capacity
+        first = min(len(data), self.capacity - start)
+        self.data[start:start + first] = data[:first]
+        if first < len(data):
+            self.data[:len(data) - first] = data[first:]
+
+    def wake(self):
+        self.wakeup.release()
+
+    # ------------ Consumer ------------
+
+    def get(self, max_bytes=None):
+        """Returns [(conn_id, bytes or None)] for the records published so far,
+        stopping after max_bytes of them."""
+        head, tail, _ = CONTROL.unpack_from(self.buf, 0)
+        if max_bytes is not None:
+            limit = min(head, tail + max_bytes)
+        else:
+            limit = head
+        records = []
+        pos = tail
+        while pos < limit:
+            length, conn_id = RECORD.unpack(self._read(pos, RECORD.size))
+            pos += RECORD.size
+            if length == CLOSED:
+                records.append((conn_id, None))
+                continue
+            records.append((conn_id, self._read(pos, length)))
+            pos += length
+        if pos != tail:
+            struct.pack_into("Q", self.buf, 8, pos)
+        return records
+
+    def _read(self, offset, length):
+        start = offset % self.capacity
+        first = min(length, self.capacity - start)
+        data = bytes(self.data[start:start + first])
+        if first < length:
+            data += bytes(self.data[:length - first])
+        return data
+
+    def wait(self, timeout):
+        # Flag first, then re-check: a record published in between is seen
+        # here, and one published after the flag releases the semaphore.
+        struct.pack_into("Q", self.buf, 16, 1)
+        head, tail, _ = CONTROL.unpack_from(self.buf, 0)
+        if head == tail:
+            self.wakeup.acquire(timeout=timeout)
+        struct.pack_into("Q", self.buf, 16, 0)
+
+    def close(self):
+        self.data.release()
+        self.buf = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
@@ -0,0 +1,176 @@
+import heapq
+import itertools
+import threading
+import time
+
+import metrics
+
+# One thread, one heap of periodic jobs on the monotonic clock. Each run is
+# scheduled from the previous *scheduled* time, not from when the last run
+# finished, so cadences don't drift. If the scheduler falls behind (a slow
+# job, a suspended process), a job's policy decides what happens to the runs
+# it missed:
+#   "skip"      run once now, then resume on the original grid
+#   "catch-up"  run every missed slot back to back (at most MAX_CATCH_UP)
+#   "delay"     run once now, and count the next interval from now (drifts
+#               by each run's lateness, like a sleep loop)
+# Jobs that can block for long (network waits) are started with blocking=True
+# and run on their own thread; a run that is still going when the next one is
+# due is counted as an overrun and skipped.
+
+POLICIES = ("skip", "catch-up", "delay")
+MAX_CATCH_UP = 100
+
+
+class Job:
+    def __init__(self, name, func, interval, policy, blocking):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown policy {policy!r}; expected one of {', '.join(POLICIES)}")
+        if interval <= 0:
+            raise ValueError("Interval must be positive")
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.policy = policy
+        self.blocking = blocking
+        self.next_run = None  # None while a run is being dispatched
+        self.last_due = 0.0
+        self.cancelled = False
+        self.running = False
+        self.lateness = metrics.histogram(f"scheduler_{name}_lateness_seconds",
+                                          f"How late {name} runs start, versus schedule")
+        self.duration = metrics.histogram(f"scheduler_{name}_duration_seconds", f"Run time of {name}")
+        self.runs = metrics.counter(f"scheduler_{name}_runs_total", f"Runs of {name}")
+        self.skipped = metrics.counter(f"scheduler_{name}_skipped_total",
+                                       f"Slots of {name} skipped because it fell behind or overran")
+
+    def stats(self):
+        lateness = self.lateness
+        return {
+            "job": self.name,
+            "interval": self.interval,
+            "runs": self.runs.value,
+            "skipped": self.skipped.value,
+            "mean_lateness": lateness.sum / lateness.count if lateness.count else 0.0,
+            "max_lateness": lateness.max,
+            "mean_duration": self.duration.sum / self.duration.count if self.duration.count else 0.0,
+        }
+
+
+class Scheduler:
+    def __init__(self, log=None, name="scheduler"):
+        self.log = log or (lambda text: None)
+        self.name = name
+        self.jobs = []
+        self._heap = []
+        self._order = itertools.count()
+        self._cond = threading.Condition()
+        self._stopping = False
+        self._thread = None
+
+    def every(self, interval, func, name=None, policy="skip", blocking=False, delay=None):
+        """Runs func() every interval seconds, first after `delay` (default: one interval)."""
+        job = Job(name or func.__name__, func, interval, policy, blocking)
+        with self._cond:
+            job.last_due = time.monotonic()
+            job.next_run = job.last_due + (interval if delay is None else delay)
+            self.jobs.append(job)
+            self._push(job)
+        return job
+
+    def set_interval(self, job, interval):
+        # Takes effect from the job's last scheduled run; safe to call from
+        # inside the job itself.
+        with self._cond:
+            job.interval = interval
+            if job.next_run is not None:
+                job.next_run = job.last_due + interval
+                self._push(job)
+
+    def cancel(self, job):
+        with self._cond:
+            job.cancelled = True
+            self._cond.notify()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=5)
+
+    def stats(self):
+        return [job.stats() for job in self.jobs]
+
+    def _push(self, job):
+        # A job rescheduled early leaves a stale heap entry behind; _run drops
+        # entries whose time no longer matches the job's.
+        heapq.heappush(self._heap, (job.next_run, next(self._order), job))
+        self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._stopping:
+                    if self._heap:
+                        due, _, job = self._heap[0]
+                        if job.cancelled or due != job.next_run:
+                            heapq.heappop(self._heap)
+                            continue
+                        wait = due - time.monotonic()
+                        if wait <= 0:
+                            heapq.heappop(self._heap)
+                            job.next_run = None
+                            job.last_due = due
+                            break
+                        self._cond.wait(wait)
+                    else:
+                        self._cond.wait()
+                if self._stopping:
+                    return
+            self._dispatch(job, due)
+
+    def _dispatch(self, job, due):
+        now = time.monotonic()
+        if job.running:
+            job.skipped.inc()
+        else:
+            job.lateness.observe(now - due)
+            job.runs.inc()
+            if job.blocking:
+                job.running = True
+                threading.Thread(target=self._call, args=(job,), name=job.name, daemon=True).start()
+            else:
+                self._call(job)
+        with self._cond:
+            if not job.cancelled:
+                job.next_run = self._next_run(job, due)
+                self._push(job)
+
+    def _next_run(self, job, due):
+        now = time.monotonic()
+        if job.policy == "delay":
+            return now + job.interval
+        next_run = due + job.interval
+        if next_run > now:
+            return next_run
+        missed = int((now - next_run) // job.interval) + 1
+        if job.policy == "catch-up" and missed <= MAX_CATCH_UP:
+            return next_run
+        job.skipped.inc(missed)
+        return next_run + missed * job.interval
+
+    def _call(self, job):
+        started = time.monotonic()
+        try:
+            job.func()
+        except Exception as e:
+            self.log(f"Scheduled job {job.name} failed: {e!r}")
+        finally:
+            job.duration.observe(time.monotonic() - started)
+            job.running = False
@@ -0,0 +1,292 @@
+import asyncio
+import itertools
+import json
+import math
+import socket
+import struct
+import threading
+
+import metrics
+from codec import ReadingDecoder, choose_codec, welcome_frame
+from protocol import FrameDecoder, FrameError, encode_frame, set_keepalive
+
+try:
+    import uvloop
+except ImportError:  # optional, the stock selector loop works fine
+    uvloop = None
+
+LISTEN_BACKLOG = 4096
+# At MAX_CONNECTIONS the server stops accepting until a sensor disconnects;
+# newcomers wait in the kernel's listen backlog instead of being refused.
+MAX_CONNECTIONS = 16384
+# A connection that completes no frame for IDLE_TIMEOUT seconds is closed:
+# silent, half-open and byte-trickling (slowloris) peers alike. Checked
+# every SWEEP_INTERVAL seconds. Keep it well above the sensor interval.
+IDLE_TIMEOUT = 60
+SWEEP_INTERVAL = 5
+
+FRAMES = metrics.counter("ingest_frames_total", "Frames decoded from sensors")
+DECODE_ERRORS = metrics.counter("ingest_decode_errors_total", "Sensor frames that failed to decode")
+FRAMING_ERRORS = metrics.counter("ingest_framing_errors_total", "Sensor connections dropped for bad framing")
+ACCEPTED = metrics.counter("ingest_connections_accepted_total", "Sensor connections accepted")
+ACCEPT_PAUSES = metrics.counter("ingest_accept_pauses_total", "Times accepting paused at MAX_CONNECTIONS")
+IDLE_CLOSED = metrics.counter("ingest_idle_closed_total", "Sensor connections closed for completing no frame in time")
+
+
+def new_event_loop():
+    if uvloop is not None:
+        return uvloop.new_event_loop()
+    return asyncio.new_event_loop()
+
+
+class SensorProtocol(asyncio.Protocol):
+    def __init__(self, server):
+        self.server = server
+        self.decoder = FrameDecoder()
+        self.readings = ReadingDecoder()
+        self.transport = None
+        self.addr = None
+        self.quiet = 0  # idle sweeps since the last complete frame
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.addr = transport.get_extra_info("peername")
+        self.server.protocols.add(self)
+
+    def data_received(self, data):
+        try:
+            frames = self.decoder.feed(data)
+        except FrameError as e:
+            FRAMING_ERRORS.inc()
+            self.server.error(self.addr)
+            self.server.log(f"Dropping {self.addr}: {str(e)}")
+            self.transport.close()
+            return
+        if frames:
+            self.quiet = 0
+        on_message = self.server.on_message
+        decode = self.readings.decode
+        FRAMES.inc(len(frames))
+        for frame in frames:
+            try:
+                msg = decode(frame)
+            except (ValueError, KeyError, struct.error):
+                DECODE_ERRORS.inc()
+                self.server.error(self.addr)
+                self.server.log(f"Invalid frame from {self.addr}")
+                continue
+            if msg is None:
+                continue
+            if msg.get("type") == "hello":
+                self.transport.write(welcome_frame(choose_codec(msg.get("codecs", ()))))
+                continue
+            on_message(msg, self.addr)
+
+    def connection_lost(self, exc):
+        self.server.protocols.discard(self)
+        self.server.release()
+        self.server.log(f"Connection closed for {self.addr}")
+
+
+class ForwardingProtocol(SensorProtocol):
+    # Answers the codec hello itself, then passes everything after it on as
+    # raw bytes, frames and all, for a worker process to decode. Any bytes
+    # count as activity for the idle sweep, since frames aren't seen here.
+    def __init__(self, server, conn_id):
+        super().__init__(server)
+        self.id = conn_id
+        self.forwarding = False
+
+    def data_received(self, data):
+        self.quiet = 0
+        if self.forwarding:
+            self.server.forward.data(self, data)
+            return
+        try:
+            frames = self.decoder.feed(data)
+        except FrameError as e:
+            FRAMING_ERRORS.inc()
+            self.server.log(f"Dropping {self.addr}: {str(e)}")
+            self.transport.close()
+            return
+        if not frames:
+            return
+        self.forwarding = True
+        rest = b"".join(encode_frame(frame) for frame in frames[1:]) + self.decoder.take_pending()
+        try:
+            msg = json.loads(frames[0])
+        except ValueError:
+            msg = None
+        if isinstance(msg, dict) and msg.get("type") == "hello":
+            self.transport.write(welcome_frame(choose_codec(msg.get("codecs", ()))))
+        else:
+            rest = encode_frame(frames[0]) + rest
+        if rest:
+            self.server.forward.data(self, rest)
+
+    def connection_lost(self, exc):
+        super().connection_lost(exc)
+        self.server.forward.closed(self)
+
+
+class SensorIngestServer:
+    """Serves every sensor connection from a single event loop thread.
+
+    on_message(msg, addr) is called on the loop thread for each decoded
+    reading, and on_error(addr), if given, for each bad frame; log(text)
+    receives status lines. With `forward`, readings are not decoded here:
+    forward.data(protocol, bytes) gets each connection's raw bytes after the
+    codec hello and forward.closed(protocol) its end, both on the loop
+    thread.
+    """
+
+    def __init__(self, host, port, on_message, log, max_connections=MAX_CONNECTIONS, idle_timeout=IDLE_TIMEOUT,
+                 forward=None, on_error=None):
+        self.host = host
+        self.port = port
+        self.on_message = on_message
+        self.on_error = on_error
+        self.log = log
+        self.forward = forward
+        self._ids = itertools.count(1)
+        self.max_connections = max_connections
+        self.idle_sweeps = max(1, math.ceil(idle_timeout / SWEEP_INTERVAL))
+        self.connections = 0  # accepted and not yet lost, counted from accept
+        self.protocols = set()
+        self.ready = threading.Event()
+        self.loop = None
+        self._restart = None
+        self._slot_free = None
+        self._stopping = False
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def change_port(self, port):
+        # Safe to call from any thread, e.g. the Tk button callback.
+        self.port = port
+        self.ready.clear()
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self._restart.set)
+
+    def stop(self):
+        self._stopping = True
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self._restart.set)
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def _run(self):
+        loop = new_event_loop()
+        asyncio.set_event_loop(loop)
+        self._restart = asyncio.Event()
+        self._slot_free = asyncio.Event()
+        self.loop = loop
+        try:
+            self.loop.run_until_complete(self._serve())
+        finally:
+            self.loop.close()
+
+    async def _serve(self):
+        sweeper = self.loop.create_task(self._sweep())
+        while not self._stopping:
+            try:
+                infos = await self.loop.getaddrinfo(self.host, self.port, type=socket.SOCK_STREAM,
+                                                    flags=socket.AI_PASSIVE)
+                family, _, _, _, address = infos[0]
+                sock = socket.create_server(address, family=family, backlog=LISTEN_BACKLOG)
+                sock.setblocking(False)
+            except Exception as e:
+                self.log(f"Error starting server: {str(e)}")
+                await asyncio.sleep(2)
+                continue
+            if self.port == 0:
+                self.port = sock.getsockname()[1]
+            accepter = self.loop.create_task(self._accept(sock))
+            self.log(f"Drone started listening on {self.host}:{self.port}...")
+            self.ready.set()
+
+            await self._restart.wait()
+            self._restart.clear()
+            # Established sensor connections are left alone; only the
+            # listening socket moves to the new port.
+            self.log("Closing current server...")
+            accepter.cancel()
+            sock.close()
+            if not self._stopping:
+                self.log(f"Restarting server on {self.host}:{self.port}...")
+        sweeper.cancel()
+        for protocol in list(self.protocols):
+            protocol.transport.abort()
+        await asyncio.sleep(0)  # let the aborted transports close their sockets
+
+    async def _accept(self, sock):
+        # Our own accept loop rather than loop.create_server, so accepting
+        # can pause at max_connections and leave the rest in the backlog.
+        loop = self.loop
+        while True:
+            if self.connections >= self.max_connections:
+                ACCEPT_PAUSES.inc()
+                self._slot_free.clear()
+                await self._slot_free.wait()
+                continue
+            try:
+                conn, _ = await loop.sock_accept(sock)
+                self._connect(conn)
+                # A reconnect storm queues many at once; take them without a
+                # loop round trip each.
+                while self.connections < self.max_connections:
+                    try:
+                        conn, _ = sock.accept()
+                    except (BlockingIOError, InterruptedError):
+                        break
+                    self._connect(conn)
+            except OSError as e:
+                # Out of file descriptors, or a peer gone before accept():
+                # back off briefly instead of spinning.
+                self.log(f"Accept failed: {str(e)}")
+                await asyncio.sleep(0.1)
+
+    def _connect(self, conn):
+        ACCEPTED.inc()
+        self.connections += 1
+        try:
+            conn.setblocking(False)
+            set_keepalive(conn)
+        except OSError:
+            conn.close()  # reset before we got to it
+            self.release()
+            return
+        if self.forward is not None:
+            factory = lambda: ForwardingProtocol(self, next(self._ids) % 0xFFFFFFFF)
+        else:
+            factory = lambda: SensorProtocol(self)
+        task = self.loop.create_task(self.loop.connect_accepted_socket(factory, conn))
+        task.add_done_callback(self._connected)
+
+    def _connected(self, task):
+        if task.cancelled() or task.exception() is not None:
+            self.release()
+
+    def error(self, addr):
+        if self.on_error is not None:
+            self.on_error(addr)
+
+    def release(self):
+        self.connections -= 1
+        if self.connections < self.max_connections:
+            self._slot_free.set()
+
+    async def _sweep(self):
+        while True:
+            await asyncio.sleep(SWEEP_INTERVAL)
+            idle_sweeps = self.idle_sweeps
+            for protocol in list(self.protocols):
+                protocol.quiet += 1
+                if protocol.quiet > idle_sweeps:
+                    IDLE_CLOSED.inc()
+                    self.log(f"Closing idle connection from {protocol.addr}")
+                    protocol.transport.abort()
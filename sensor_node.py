@@ -1,23 +1,50 @@
 import socket
 import threading
 import time
-import json
 import random
 import argparse
+import asyncio
 from datetime import datetime
 
+import metrics
+from codec import CODECS, hello_frame, make_encoder
+from protocol import FrameDecoder
+
 running = False  # Flag to control the sensor thread
 
 # Used to control anomaly timing
 last_anomaly_time = time.time()
 
-def generate_payload(sensor_id):
+SENT = metrics.counter("sensor_readings_sent_total", "Readings written to the drone")
+CONNECTS = metrics.counter("sensor_connects_total", "Connections established to the drone")
+SEND_ERRORS = metrics.counter("sensor_send_errors_total", "Connection or send failures")
+SEND_LAG = metrics.histogram("sensor_send_lag_seconds", "Scheduled send time to bytes handed to the kernel")
+
+# Reconnect delays double from BACKOFF_INITIAL up to BACKOFF_MAX, with full
+# jitter, so sensors dropped together (e.g. by a drone restart) don't all
+# come back in the same instant.
+BACKOFF_INITIAL = 0.5
+BACKOFF_MAX = 30.0
+CONNECT_RATE = 1000  # load generator: connection attempts per second, all sensors together
+
+
+def backoff_delay(attempt):
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_INITIAL * 2 ** attempt))
+
+
+def generate_payload(sensor_id, anomaly_rate=None):
+    # With anomaly_rate, each reading is anomalous with that probability;
+    # otherwise one anomaly is injected every 15-20 s across the process.
     global last_anomaly_time
-    now = time.time()
-    inject_anomaly = (now - last_anomaly_time) > random.randint(15, 20)
+    if anomaly_rate is None:
+        now = time.time()
+        inject_anomaly = (now - last_anomaly_time) > random.randint(15, 20)
+        if inject_anomaly:
+            last_anomaly_time = now
+    else:
+        inject_anomaly = random.random() < anomaly_rate
 
     if inject_anomaly:
-        last_anomaly_time = now
         if random.choice([True, False]):
             # Temperature anomaly
             return {
@@ -44,31 +71,219 @@ def generate_payload(sensor_id):
     }
 
 
-def sensor_thread(host, port, sensor_id, interval):
+def negotiate_codec(s, codec):
+    # "auto" offers the compact codec and falls back to JSON if the drone
+    # doesn't answer the hello (older drones never do).
+    if codec == "json":
+        return make_encoder("json")
+    s.sendall(hello_frame(CODECS if codec == "auto" else (codec, "json")))
+    decoder = FrameDecoder()
+    try:
+        while True:
+            data = s.recv(4096)
+            if not data:
+                raise ConnectionResetError("Drone closed the connection during codec negotiation")
+            for frame in decoder.feed_json(data):
+                if frame.get("type") == "welcome":
+                    return make_encoder(frame.get("codec"))
+    except socket.timeout:
+        return make_encoder("json")
+
+def sensor_thread(host, port, sensor_id, interval, codec="auto"):
     global running
 
     print(f"[{datetime.now()}] {sensor_id} started. Trying to connect to Drone at {host}:{port}...")
 
+    attempt = 0
     while running:
         try:
             with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
                 s.settimeout(1.0)  # Makes all operations interruptible
                 s.connect((host, port))
+                CONNECTS.inc()
                 print(f"[{datetime.now()}] Connected to Drone at {host}:{port}")
+                encoder = negotiate_codec(s, codec)
+                print(f"[{datetime.now()}] Using {encoder.name} encoding")
                 while running:
                     payload = generate_payload(sensor_id)
-                    s.sendall(json.dumps(payload).encode())
+                    s.sendall(encoder.encode(payload))
+                    SENT.inc()
+                    attempt = 0
                     print(f"[{datetime.now()}] Sent: {payload}")
                     time.sleep(interval)
         except ConnectionRefusedError:
-            print(f"[{datetime.now()}] Drone not available. Retrying in 3 seconds...")
-            time.sleep(3)
+            reason = "Drone not available"
         except BrokenPipeError:
-            print(f"[{datetime.now()}] Connection lost. Reconnecting...")
-            time.sleep(3)
+            reason = "Connection lost"
         except Exception as e:
-            print(f"[{datetime.now()}] Error: {str(e)}")
-            time.sleep(3)
+            reason = f"Error: {str(e)}"
+        else:
+            continue
+        SEND_ERRORS.inc()
+        delay = backoff_delay(attempt)
+        attempt += 1
+        print(f"[{datetime.now()}] {reason}. Retrying in {delay:.1f} seconds...")
+        time.sleep(delay)
+
+# ------------ Load Generator ------------
+
+LATENCY_SAMPLES = 100000  # reservoir size for latency percentiles
+
+class Reservoir:
+    # Uniform sample of at most LATENCY_SAMPLES values.
+    def __init__(self):
+        self.values = []
+        self.seen = 0
+
+    def add(self, value):
+        self.seen += 1
+        if len(self.values) < LATENCY_SAMPLES:
+            self.values.append(value)
+        else:
+            i = random.randrange(self.seen)
+            if i < LATENCY_SAMPLES:
+                self.values[i] = value
+
+    def percentiles(self, *qs):
+        ordered = sorted(self.values)
+        if not ordered:
+            return [0.0 for _ in qs]
+        return [ordered[min(int(q / 100 * len(ordered)), len(ordered) - 1)] for q in qs]
+
+class ConnectLimiter:
+    # Hands out connection attempt slots 1/rate seconds apart (with up to a
+    # second's worth available at once), one sleep per caller.
+    def __init__(self, rate):
+        self.rate = rate
+        self.next_slot = 0.0
+
+    async def wait(self):
+        now = asyncio.get_running_loop().time()
+        slot = self.next_slot = max(self.next_slot, now - 1.0) + 1.0 / self.rate
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+class LoadStats:
+    def __init__(self):
+        self.sent = 0
+        self.errors = 0
+        self.connected = 0
+        self.window = Reservoir()  # since the last report
+        self.total = Reservoir()
+
+    def record(self, latency):
+        SENT.inc()
+        SEND_LAG.observe(latency)
+        self.sent += 1
+        self.window.add(latency)
+        self.total.add(latency)
+
+async def negotiate_codec_async(reader, writer, codec):
+    if codec == "json":
+        return make_encoder("json")
+    writer.write(hello_frame(CODECS if codec == "auto" else (codec, "json")))
+    decoder = FrameDecoder()
+    try:
+        while True:
+            data = await asyncio.wait_for(reader.read(4096), timeout=1.0)
+            if not data:
+                raise ConnectionResetError("Drone closed the connection during codec negotiation")
+            for frame in decoder.feed_json(data):
+                if frame.get("type") == "welcome":
+                    return make_encoder(frame.get("codec"))
+    except asyncio.TimeoutError:
+        return make_encoder("json")
+
+async def simulated_sensor(host, port, sensor_id, interval, jitter, anomaly_rate, codec, stats, deadline,
+                           limiter):
+    loop = asyncio.get_running_loop()
+    attempt = 0
+    while running and loop.time() < deadline:
+        writer = None
+        try:
+            await limiter.wait()
+            reader, writer = await asyncio.open_connection(host, port)
+            encoder = await negotiate_codec_async(reader, writer, codec)
+            CONNECTS.inc()
+            stats.connected += 1
+            # Stagger the first reading so sensors don't fire in lockstep.
+            next_send = loop.time() + random.uniform(0, interval)
+            try:
+                while running and next_send < deadline:
+                    delay = next_send - loop.time()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                    writer.write(encoder.encode(generate_payload(sensor_id, anomaly_rate)))
+                    await writer.drain()
+                    now = loop.time()
+                    # Latency: scheduled send time -> bytes handed to the kernel.
+                    stats.record(now - next_send)
+                    attempt = 0
+                    next_send += interval * random.uniform(1 - jitter, 1 + jitter)
+                    if next_send < now - interval:
+                        next_send = now  # too far behind; don't burst to catch up
+                return  # stopped or past the deadline; don't reconnect
+            finally:
+                stats.connected -= 1
+        except (OSError, asyncio.IncompleteReadError) as e:
+            SEND_ERRORS.inc()
+            stats.errors += 1
+            if stats.errors == 1 or stats.errors % 1000 == 0:
+                print(f"[{datetime.now()}] {sensor_id}: {str(e)} ({stats.errors} errors so far)")
+            await asyncio.sleep(backoff_delay(attempt))
+            attempt += 1
+        finally:
+            if writer is not None:
+                writer.close()
+
+async def report(stats, sensors, target_rate, report_interval, deadline):
+    loop = asyncio.get_running_loop()
+    last_sent, last_time = 0, loop.time()
+    while running and loop.time() < deadline:
+        await asyncio.sleep(min(report_interval, max(deadline - loop.time(), 0)))
+        now = loop.time()
+        rate = (stats.sent - last_sent) / (now - last_time)
+        p50, p99 = stats.window.percentiles(50, 99)
+        print(f"[{datetime.now()}] {rate:,.0f} msgs/s (target {target_rate:,.0f}) | "
+              f"latency p50={p50 * 1000:.2f}ms p99={p99 * 1000:.2f}ms | "
+              f"connected {stats.connected}/{sensors} | errors {stats.errors}")
+        last_sent, last_time = stats.sent, now
+        stats.window = Reservoir()
+
+async def load_generator(args):
+    loop = asyncio.get_running_loop()
+    interval = args.sensors / args.rate if args.rate else args.interval
+    target_rate = args.sensors / interval
+    start = loop.time()
+    deadline = start + args.duration if args.duration else float("inf")
+    stats = LoadStats()
+    limiter = ConnectLimiter(args.connect_rate)
+
+    print(f"[{datetime.now()}] Simulating {args.sensors} sensors at {interval:.3f}s "
+          f"(±{args.jitter * 100:.0f}%) each, target {target_rate:,.0f} msgs/s")
+    tasks = [asyncio.create_task(simulated_sensor(
+        args.host, args.port, f"{args.sensor_id}-{n}", interval, args.jitter,
+        args.anomaly_rate, args.codec, stats, deadline, limiter)) for n in range(args.sensors)]
+    reporter = asyncio.create_task(report(stats, args.sensors, target_rate, args.report_interval, deadline))
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        reporter.cancel()
+        elapsed = loop.time() - start
+        p50, p90, p99, p999 = stats.total.percentiles(50, 90, 99, 99.9)
+        print(f"[{datetime.now()}] Sent {stats.sent} readings in {elapsed:.1f}s: "
+              f"{stats.sent / elapsed:,.0f} msgs/s achieved (target {target_rate:,.0f})")
+        print(f"latency ms: p50={p50 * 1000:.2f} p90={p90 * 1000:.2f} "
+              f"p99={p99 * 1000:.2f} p99.9={p999 * 1000:.2f} | errors {stats.errors}")
+
+def raise_fd_limit(needed):
+    try:
+        import resource
+    except ImportError:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < needed:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (min(needed, hard), hard))
 
 def main():
     global running
@@ -76,16 +291,39 @@ def main():
     parser = argparse.ArgumentParser(description="Sensor Node")
     parser.add_argument("host", type=str, help="Drone Server Host Address")
     parser.add_argument("port", type=int, help="Drone Server Port Number")
-    parser.add_argument("sensor_id", type=str, help="Sensor ID (e.g. 'sensor1')")
-    parser.add_argument("--interval", type=int, default=3, help="Interval between payloads in seconds (default: 3)")
+    parser.add_argument("sensor_id", type=str, help="Sensor ID, or ID prefix with --sensors (e.g. 'sensor1')")
+    parser.add_argument("--interval", type=float, default=3, help="Interval between payloads in seconds (default: 3)")
+    parser.add_argument("--codec", choices=("auto",) + CODECS, default="auto",
+                        help="Payload encoding; 'auto' negotiates the compact codec with the drone (default: auto)")
+    load = parser.add_argument_group("load generator")
+    load.add_argument("--sensors", type=int, default=1, help="Simulated sensors in this process (default: 1)")
+    load.add_argument("--rate", type=float, help="Target aggregate messages/sec; overrides --interval")
+    load.add_argument("--jitter", type=float, default=0.1, help="Relative interval jitter, 0-1 (default: 0.1)")
+    load.add_argument("--anomaly-rate", type=float, help="Probability that a reading is anomalous")
+    load.add_argument("--duration", type=float, help="Stop after this many seconds")
+    load.add_argument("--report-interval", type=float, default=5, help="Seconds between rate reports (default: 5)")
+    load.add_argument("--connect-rate", type=float, default=CONNECT_RATE,
+                      help=f"Max connection attempts per second across all sensors (default: {CONNECT_RATE})")
+    metrics.add_arguments(parser)
 
     args = parser.parse_args()
+    if not 0 <= args.jitter < 1:
+        parser.error("--jitter must be in [0, 1)")
 
+    metrics.start_from_args(args)
     running = True
+    if args.sensors > 1 or args.rate or args.duration:
+        raise_fd_limit(args.sensors + 64)
+        try:
+            asyncio.run(load_generator(args))
+        except KeyboardInterrupt:
+            running = False
+        return
+
     try:
         print(f"[{datetime.now()}] Starting {args.sensor_id}: Connecting to {args.host}:{args.port}")
         print("Press Ctrl+C to stop the sensor node.")
-        sensor_thread(args.host, args.port, args.sensor_id, args.interval)
+        sensor_thread(args.host, args.port, args.sensor_id, args.interval, args.codec)
     except KeyboardInterrupt:
         print(f"[{datetime.now()}] Stopping {args.sensor_id}...")
         running = False
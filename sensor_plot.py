@@ -0,0 +1,158 @@
+import fnmatch
+import math
+from collections import deque
+
+import matplotlib.dates as mdates
+
+# Incremental plot of per-sensor averages. Each visible sensor owns two
+# persistent, animated Line2D artists that are updated in place with
+# set_data(); a refresh only re-blits those lines over a cached background
+# unless the axis limits, legend or set of visible sensors changed.
+
+HISTORY_POINTS = 2000     # points kept per sensor
+MAX_DRAWN_POINTS = 300    # points drawn per line after decimation
+SENSORS_PER_PAGE = 10
+HEADROOM = 0.15           # spare axis range so new points rarely force a full redraw
+
+
+class SensorPlot:
+    def __init__(self, fig, ax, canvas, history=HISTORY_POINTS, max_points=MAX_DRAWN_POINTS,
+                 per_page=SENSORS_PER_PAGE):
+        self.fig = fig
+        self.ax = ax
+        self.canvas = canvas
+        self.history = history
+        self.max_points = max_points
+        self.per_page = per_page
+        self.series = {}    # sid -> (times, temps, hums)
+        self.lines = {}     # sid -> (temp line, hum line)
+        self.patterns = []  # fnmatch patterns; empty shows every sensor
+        self.page = 0
+        self.background = None
+        self._layout_dirty = True
+        canvas.mpl_connect("draw_event", self._on_draw)
+
+        ax.set_title("Sensor Averages")
+        ax.set_xlabel("Time")
+        ax.set_ylabel("Value")
+        ax.xaxis.set_major_formatter(mdates.DateFormatter('%H:%M:%S'))
+        fig.autofmt_xdate()
+
+    def add(self, sid, timestamp, temp, hum):
+        series = self.series.get(sid)
+        if series is None:
+            series = self.series[sid] = (deque(maxlen=self.history), deque(maxlen=self.history),
+                                         deque(maxlen=self.history))
+            self._layout_dirty = True
+        series[0].append(mdates.date2num(timestamp))
+        series[1].append(temp)
+        series[2].append(hum)
+
+    # ------------ Selection ------------
+
+    def set_filter(self, text):
+        self.patterns = [p.strip() for p in text.split(",") if p.strip()]
+        self.page = 0
+        self._layout_dirty = True
+
+    def matching(self):
+        sids = sorted(self.series)
+        if self.patterns:
+            sids = [sid for sid in sids if any(fnmatch.fnmatchcase(sid, p) for p in self.patterns)]
+        return sids
+
+    def pages(self):
+        return max(1, math.ceil(len(self.matching()) / self.per_page))
+
+    def turn_page(self, delta):
+        self.page = (self.page + delta) % self.pages()
+        self._layout_dirty = True
+
+    def visible(self):
+        start = self.page * self.per_page
+        return self.matching()[start:start + self.per_page]
+
+    # ------------ Drawing ------------
+
+    def _decimate(self, values):
+        values = list(values)
+        stride = math.ceil(len(values) / self.max_points)
+        if stride <= 1:
+            return values
+        picked = values[::stride]
+        if (len(values) - 1) % stride:
+            picked.append(values[-1])  # always show the newest point
+        return picked
+
+    def _sync_lines(self, visible):
+        for sid in [sid for sid in self.lines if sid not in visible]:
+            for line in self.lines.pop(sid):
+                line.remove()
+        for sid in visible:
+            if sid not in self.lines:
+                temp_line, = self.ax.plot([], [], label=f"{sid} Temp", animated=True)
+                hum_line, = self.ax.plot([], [], label=f"{sid} Hum", animated=True)
+                self.lines[sid] = (temp_line, hum_line)
+
+    def _limits(self):
+        x_lo = y_lo = math.inf
+        x_hi = y_hi = -math.inf
+        for sid in self.lines:
+            times, temps, hums = self.series[sid]
+            if not times:
+                continue
+            x_lo, x_hi = min(x_lo, times[0]), max(x_hi, times[-1])
+            y_lo = min(y_lo, min(temps), min(hums))
+            y_hi = max(y_hi, max(temps), max(hums))
+        if x_lo == math.inf:
+            return None
+        return x_lo, x_hi, y_lo, y_hi
+
+    def _fits(self, limits):
+        x_lo, x_hi, y_lo, y_hi = limits
+        ax_x0, ax_x1 = self.ax.get_xlim()
+        ax_y0, ax_y1 = self.ax.get_ylim()
+        return ax_x0 <= x_lo and x_hi <= ax_x1 and ax_y0 <= y_lo and y_hi <= ax_y1
+
+    def _set_limits(self, limits):
+        x_lo, x_hi, y_lo, y_hi = limits
+        x_span = max(x_hi - x_lo, 1 / 86400)  # at least a second, in days
+        y_span = max(y_hi - y_lo, 1.0)
+        self.ax.set_xlim(x_lo, x_hi + x_span * HEADROOM)
+        self.ax.set_ylim(y_lo - y_span * HEADROOM, y_hi + y_span * HEADROOM)
+
+    def refresh(self):
+        visible = self.visible()
+        self._sync_lines(visible)
+        for sid, (temp_line, hum_line) in self.lines.items():
+            times, temps, hums = self.series[sid]
+            x = self._decimate(times)
+            temp_line.set_data(x, self._decimate(temps))
+            hum_line.set_data(x, self._decimate(hums))
+
+        limits = self._limits()
+        full = self._layout_dirty or self.background is None
+        if limits is not None and not self._fits(limits):
+            self._set_limits(limits)
+            full = True
+        if full:
+            if self.lines:
+                self.ax.legend(loc="upper left", fontsize="small")
+            elif self.ax.get_legend() is not None:
+                self.ax.get_legend().remove()
+            self._layout_dirty = False
+            self.canvas.draw()  # _on_draw recaptures the background and draws the lines
+        else:
+            self.canvas.restore_region(self.background)
+            for line_pair in self.lines.values():
+                for line in line_pair:
+                    self.ax.draw_artist(line)
+        self.canvas.blit(self.ax.bbox)
+
+    def _on_draw(self, event):
+        # Full redraws (including Tk resizes) skip animated artists, so
+        # capture the clean background and paint the lines back on top.
+        self.background = self.canvas.copy_from_bbox(self.ax.bbox)
+        for line_pair in self.lines.values():
+            for line in line_pair:
+                self.ax.draw_artist(line)
@@ -0,0 +1,130 @@
+import threading
+import time
+from collections import OrderedDict
+
+# Sensors silent this long are forgotten: on the drone their window,
+# detector state and metrics go too. Checked every aggregation tick.
+SENSOR_TTL = 120.0
+RATE_ALPHA = 0.2  # weight of the newest gap in a sensor's smoothed reading interval
+
+
+class SensorInfo:
+    __slots__ = ("sensor_id", "addr", "first_seen", "last_seen", "readings", "errors", "interval")
+
+    def __init__(self, sensor_id, addr, now):
+        self.sensor_id = sensor_id
+        self.addr = addr
+        self.first_seen = now
+        self.last_seen = now
+        self.readings = 1
+        self.errors = 0
+        self.interval = None  # smoothed seconds between readings
+
+    def rate(self, now):
+        # A sensor gone quiet decays towards 0 instead of keeping its last rate.
+        interval = max(self.interval or 0.0, now - self.last_seen)
+        return 1.0 / interval if interval else 0.0
+
+
+class SensorRegistry:
+    """Live sensors, by ID and by the address they report from.
+
+    seen() is called for every valid reading and error(addr) for every bad
+    frame or reading from a connection; expire() forgets sensors silent for
+    longer than ttl and returns their IDs so their windows and detector
+    state can go too. Entries stay in least recently seen order, so expiry
+    only ever looks at the sensors it removes. summary() reports the counts
+    since the previous call, for the uplink packets. Safe from any thread.
+    """
+
+    def __init__(self, ttl=SENSOR_TTL):
+        self.ttl = ttl
+        self.sensors = OrderedDict()  # sensor ID -> SensorInfo, least recently seen first
+        self.by_addr = {}  # address -> set of sensor IDs reporting from it
+        self.unattributed_errors = 0  # errors from addresses with no known sensor
+        self.lock = threading.Lock()
+        self._joined = 0
+        self._expired = 0
+        self._errors = 0
+
+    def seen(self, sensor_id, addr, now=None):
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            info = self.sensors.get(sensor_id)
+            if info is None:
+                self.sensors[sensor_id] = SensorInfo(sensor_id, addr, now)
+                self.by_addr.setdefault(addr, set()).add(sensor_id)
+                self._joined += 1
+                return
+            gap = now - info.last_seen
+            info.interval = gap if info.interval is None else info.interval + RATE_ALPHA * (gap - info.interval)
+            info.last_seen = now
+            info.readings += 1
+            self.sensors.move_to_end(sensor_id)
+            if info.addr != addr:
+                # Reconnected from a new address.
+                self._unlink(info)
+                info.addr = addr
+                self.by_addr.setdefault(addr, set()).add(sensor_id)
+
+    def error(self, addr):
+        with self.lock:
+            self._errors += 1
+            sensor_ids = self.by_addr.get(addr)
+            if not sensor_ids:
+                self.unattributed_errors += 1
+                return
+            for sensor_id in sensor_ids:
+                self.sensors[sensor_id].errors += 1
+
+    def expire(self, now=None):
+        now = time.monotonic() if now is None else now
+        expired = []
+        with self.lock:
+            sensors = self.sensors
+            while sensors:
+                info = next(iter(sensors.values()))
+                if now - info.last_seen <= self.ttl:
+                    break
+                del sensors[info.sensor_id]
+                self._unlink(info)
+                expired.append(info.sensor_id)
+            self._expired += len(expired)
+        return expired
+
+    def _unlink(self, info):
+        sensor_ids = self.by_addr.get(info.addr)
+        if sensor_ids is not None:
+            sensor_ids.discard(info.sensor_id)
+            if not sensor_ids:
+                del self.by_addr[info.addr]
+
+    def health(self, now=None):
+        """Returns {sensor_id: {address, last seen, rate, readings, errors}}."""
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            return {sensor_id: {"addr": info.addr, "last_seen": round(now - info.last_seen, 1),
+                                "rate": round(info.rate(now), 2), "readings": info.readings, "errors": info.errors}
+                    for sensor_id, info in self.sensors.items()}
+
+    def summary(self, now=None):
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            rate = sum((info.rate(now) for info in self.sensors.values()), 0.0)
+            summary = {"live": len(self.sensors), "joined": self._joined, "expired": self._expired,
+                       "errors": self._errors, "readings_per_second": round(rate, 1)}
+            self._joined = self._expired = self._errors = 0
+        return summary
+
+    def __len__(self):
+        return len(self.sensors)
+
+
+def merge_summaries(summaries):
+    """Adds up summary() results, e.g. from several worker processes."""
+    merged = {"live": 0, "joined": 0, "expired": 0, "errors": 0, "readings_per_second": 0.0}
+    for summary in summaries:
+        for key in merged:
+            merged[key] += summary.get(key, 0)
+    merged["readings_per_second"] = round(merged["readings_per_second"], 1)
+    return merged
@@ -0,0 +1,213 @@
+import json
+import os
+import threading
+import time
+
+from protocol import HEADER, HEADER_SIZE, MAX_FRAME_SIZE, FrameDecoder, encode_frame
+
+# Disk-backed store-and-forward queue. Packets are appended as length-prefixed
+# JSON frames to numbered segment files; a small cursor file records how far
+# the forwarder got, so a restarted drone resumes where it left off and the
+# backlog never has to live in memory.
+
+SEGMENT_BYTES = 4 * 1024 * 1024
+MAX_SPOOL_BYTES = 256 * 1024 * 1024
+FSYNC_EVERY = 64        # appends between fsyncs
+FSYNC_INTERVAL = 1.0    # seconds between fsyncs
+READ_CHUNK = MAX_FRAME_SIZE + HEADER_SIZE  # always holds at least one frame
+DROP_POLICIES = ("oldest", "newest")
+
+
+class Spool:
+    def __init__(self, directory, segment_bytes=SEGMENT_BYTES, max_bytes=MAX_SPOOL_BYTES,
+                 drop_policy="oldest", fsync_every=FSYNC_EVERY, fsync_interval=FSYNC_INTERVAL):
+        if drop_policy not in DROP_POLICIES:
+            raise ValueError(f"Unknown drop policy {drop_policy!r}; expected one of {', '.join(DROP_POLICIES)}")
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.max_bytes = max_bytes
+        self.drop_policy = drop_policy
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.dropped = 0
+        self._lock = threading.Lock()
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+        os.makedirs(directory, exist_ok=True)
+        self._sizes = {}  # segment id -> bytes on disk
+        for name in os.listdir(directory):
+            if name.endswith(".seg"):
+                self._sizes[int(name[:-4])] = os.path.getsize(self._path(int(name[:-4])))
+        self._segments = sorted(self._sizes)
+        if not self._segments:
+            self._segments.append(0)
+            self._sizes[0] = 0
+        self._recover_tail()
+        self._writer = open(self._path(self._segments[-1]), "ab", buffering=0)
+        self._read_segment, self._read_offset = self._load_cursor()
+
+    def _path(self, segment):
+        return os.path.join(self.directory, f"{segment:010d}.seg")
+
+    def _cursor_path(self):
+        return os.path.join(self.directory, "cursor")
+
+    def _recover_tail(self):
+        # A crash mid-append can leave a torn frame at the end of the newest
+        # segment; cut it off so later appends stay readable.
+        segment = self._segments[-1]
+        path = self._path(segment)
+        if not os.path.exists(path):
+            return
+        valid = 0
+        with open(path, "rb") as f:
+            data = f.read()
+        while len(data) - valid >= HEADER_SIZE:
+            (length,) = HEADER.unpack_from(data, valid)
+            if len(data) - valid - HEADER_SIZE < length:
+                break
+            valid += HEADER_SIZE + length
+        if valid != len(data):
+            with open(path, "r+b") as f:
+                f.truncate(valid)
+            self._sizes[segment] = valid
+
+    def _load_cursor(self):
+        try:
+            with open(self._cursor_path()) as f:
+                segment, offset = (int(v) for v in f.read().split())
+        except (OSError, ValueError):
+            return self._segments[0], 0
+        if segment not in self._sizes:
+            # That segment was already consumed or dropped.
+            return self._segments[0], 0
+        return segment, min(offset, self._sizes[segment])
+
+    def _save_cursor(self):
+        tmp = self._cursor_path() + ".tmp"
+        with open(tmp, "w") as f:
+            f.write(f"{self._read_segment} {self._read_offset}")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self._cursor_path())
+
+    # ------------ Writing ------------
+
+    def append(self, packet):
+        # Returns False if the packet was rejected by the "newest" drop policy.
+        frame = encode_frame(json.dumps(packet, separators=(",", ":")).encode())
+        with self._lock:
+            if self._total_bytes() + len(frame) > self.max_bytes:
+                if not self._make_room(len(frame)):
+                    self.dropped += 1
+                    return False
+            if self._sizes[self._segments[-1]] >= self.segment_bytes:
+                self._roll()
+            self._writer.write(frame)
+            self._sizes[self._segments[-1]] += len(frame)
+            self._unsynced += 1
+            now = time.monotonic()
+            if self._unsynced >= self.fsync_every or now - self._last_sync >= self.fsync_interval:
+                os.fsync(self._writer.fileno())
+                self._unsynced = 0
+                self._last_sync = now
+            return True
+
+    def _total_bytes(self):
+        return sum(self._sizes.values())
+
+    def _make_room(self, needed):
+        if self.drop_policy == "newest":
+            return False
+        # Drop whole segments from the old end, never the one being written.
+        while self._total_bytes() + needed > self.max_bytes and len(self._segments) > 1:
+            segment = self._segments.pop(0)
+            self.dropped += self._count_frames(segment)
+            del self._sizes[segment]
+            os.remove(self._path(segment))
+            if self._read_segment <= segment:
+                self._read_segment, self._read_offset = self._segments[0], 0
+                self._save_cursor()
+        return self._total_bytes() + needed <= self.max_bytes
+
+    def _count_frames(self, segment):
+        with open(self._path(segment), "rb") as f:
+            data = f.read()
+        pos = self._read_offset if segment == self._read_segment else 0
+        count = 0
+        while len(data) - pos >= HEADER_SIZE:
+            pos += HEADER_SIZE + HEADER.unpack_from(data, pos)[0]
+            count += 1
+        return count
+
+    def _roll(self):
+        os.fsync(self._writer.fileno())
+        self._writer.close()
+        segment = self._segments[-1] + 1
+        self._segments.append(segment)
+        self._sizes[segment] = 0
+        self._writer = open(self._path(segment), "ab", buffering=0)
+        self._unsynced = 0
+
+    # ------------ Reading ------------
+
+    def read_batch(self, max_records):
+        """Returns (packets, cursor) from the current read position.
+
+        Nothing is consumed until commit(cursor) is called, so a batch that
+        fails to send is simply read again.
+        """
+        with self._lock:
+            segment, offset = self._read_segment, self._read_offset
+            packets = []
+            while len(packets) < max_records:
+                size = self._sizes.get(segment)
+                if size is None:
+                    break
+                if offset >= size:
+                    if segment == self._segments[-1]:
+                        break
+                    segment = self._segments[self._segments.index(segment) + 1]
+                    offset = 0
+                    continue
+                with open(self._path(segment), "rb") as f:
+                    f.seek(offset)
+                    data = f.read(min(size - offset, READ_CHUNK))
+                frames = FrameDecoder().feed(data)
+                if not frames:
+                    break
+                for frame in frames[:max_records - len(packets)]:
+                    packets.append(json.loads(frame))
+                    offset += HEADER_SIZE + len(frame)
+            return packets, (segment, offset)
+
+    def commit(self, cursor):
+        with self._lock:
+            segment, offset = cursor
+            if segment not in self._sizes:
+                return
+            self._read_segment, self._read_offset = segment, offset
+            # Segments wholly before the cursor are done with.
+            while self._segments[0] < segment:
+                done = self._segments.pop(0)
+                del self._sizes[done]
+                os.remove(self._path(done))
+            self._save_cursor()
+
+    def pending_bytes(self):
+        with self._lock:
+            total = self._total_bytes()
+            for segment in self._segments:
+                if segment >= self._read_segment:
+                    break
+                total -= self._sizes[segment]
+            return total - self._read_offset
+
+    def __bool__(self):
+        return self.pending_bytes() > 0
+
+    def close(self):
+        with self._lock:
+            os.fsync(self._writer.fileno())
+            self._writer.close()
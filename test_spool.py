@@ -0,0 +1,64 @@
+import os
+import tempfile
+import unittest
+
+from protocol import HEADER
+from spool import Spool
+
+
+def packet(i):
+    return {"seq_no": i, "averages": {f"sensor_{i}": {"avg_temperature": 20.0, "avg_humidity": 40.0}}}
+
+
+class SpoolRecoveryTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.directory = self.tmp.name
+
+    def reopen(self, spool, **kwargs):
+        spool.close()
+        return Spool(self.directory, **kwargs)
+
+    def test_torn_tail_is_cut_off(self):
+        spool = Spool(self.directory)
+        for i in range(3):
+            spool.append(packet(i))
+        spool.close()
+        # A crash mid-append: a header promising more bytes than were written.
+        segment = os.path.join(self.directory, sorted(n for n in os.listdir(self.directory)
+                                                      if n.endswith(".seg"))[-1])
+        with open(segment, "ab") as f:
+            f.write(HEADER.pack(100) + b'{"seq_no": 3')
+
+        spool = Spool(self.directory)
+        spool.append(packet(4))
+        packets, _ = spool.read_batch(10)
+        self.assertEqual([p["seq_no"] for p in packets], [0, 1, 2, 4])
+        spool.close()
+
+    def test_resumes_from_committed_cursor(self):
+        spool = Spool(self.directory, segment_bytes=256)
+        for i in range(10):
+            spool.append(packet(i))
+        packets, cursor = spool.read_batch(4)
+        self.assertEqual([p["seq_no"] for p in packets], [0, 1, 2, 3])
+        spool.commit(cursor)
+        # Read but never committed, e.g. the drone died waiting for the ack.
+        spool.read_batch(3)
+
+        spool = self.reopen(spool, segment_bytes=256)
+        packets, cursor = spool.read_batch(100)
+        self.assertEqual([p["seq_no"] for p in packets], list(range(4, 10)))
+        spool.commit(cursor)
+        self.assertFalse(spool)
+
+        spool = self.reopen(spool, segment_bytes=256)
+        self.assertEqual(spool.read_batch(100)[0], [])
+        segments = [n for n in os.listdir(self.directory) if n.endswith(".seg")]
+        self.assertEqual(len(segments), 1)  # consumed segments are removed
+        spool.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,348 @@
+import argparse
+import os
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from codec import to_epoch_ms
+
+# Embedded time-series store for the central server: drone averages and
+# anomalies go to SQLite in WAL mode through a single writer thread that
+# commits in batches, while readers use their own connections and are
+# never blocked by writes.
+
+BATCH_SIZE = 2000
+FLUSH_INTERVAL = 0.5     # seconds a row may wait before its batch is committed
+MAX_QUEUED = 200000      # rows; handle_drone blocks beyond this
+WAKE = ("wake", None)    # queued by wait_written, never stored
+RETRY_INTERVAL = 1.0     # seconds between attempts at a batch SQLite couldn't commit (e.g. disk full)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS averages (
+    ts REAL NOT NULL,
+    drone_id TEXT NOT NULL,
+    sensor_id TEXT NOT NULL,
+    avg_temperature REAL,
+    avg_humidity REAL
+);
+CREATE INDEX IF NOT EXISTS averages_sensor_ts ON averages (sensor_id, ts);
+CREATE TABLE IF NOT EXISTS anomalies (
+    ts REAL NOT NULL,
+    drone_id TEXT NOT NULL,
+    sensor_id TEXT NOT NULL,
+    type TEXT NOT NULL,
+    value REAL,
+    reading_timestamp TEXT
+);
+CREATE INDEX IF NOT EXISTS anomalies_sensor_ts ON anomalies (sensor_id, ts);
+CREATE INDEX IF NOT EXISTS anomalies_ts ON anomalies (ts);
+"""
+
+
+def packet_time(payload, default):
+    # The drone's own timestamp, so backlog flushed after return-to-base
+    # lands at the time it was measured rather than when it arrived.
+    try:
+        return to_epoch_ms(payload["timestamp"]) / 1000
+    except (KeyError, TypeError, ValueError):
+        return default
+
+
+def shard_path(path, index):
+    # central.db -> central.shard0.db: each central server shard process
+    # writes its own file, so they don't contend for SQLite's writer lock.
+    root, ext = os.path.splitext(path)
+    return f"{root}.shard{index}{ext}"
+
+
+def shard_paths(path):
+    """The database at path, if any, and every shard file found next to it."""
+    paths = [path] if os.path.exists(path) else []
+    index = 0
+    while os.path.exists(shard_path(path, index)):
+        paths.append(shard_path(path, index))
+        index += 1
+    return paths
+
+
+def merge_rollups(rollups):
+    # Rows from rollup() over several files; buckets are combined weighted by count.
+    merged = {}
+    for rows in rollups:
+        for bucket, n, avg_t, min_t, max_t, avg_h, min_h, max_h in rows:
+            acc = merged.get(bucket)
+            if acc is None:
+                merged[bucket] = [n, avg_t, min_t, max_t, avg_h, min_h, max_h]
+                continue
+            total = acc[0] + n
+            acc[1] = weighted(acc[1], acc[0], avg_t, n, total)
+            acc[4] = weighted(acc[4], acc[0], avg_h, n, total)
+            acc[2], acc[3] = extreme(min, acc[2], min_t), extreme(max, acc[3], max_t)
+            acc[5], acc[6] = extreme(min, acc[5], min_h), extreme(max, acc[6], max_h)
+            acc[0] = total
+    return [(bucket, *acc) for bucket, acc in sorted(merged.items())]
+
+
+def weighted(a, n_a, b, n_b, total):
+    if a is None or b is None:
+        return b if a is None else a
+    return (a * n_a + b * n_b) / total
+
+
+def extreme(pick, a, b):
+    return b if a is None else a if b is None else pick(a, b)
+
+
+def number(value):
+    # REAL columns take numbers or NULL; anything else rejects the row.
+    if value is None or (isinstance(value, (int, float)) and not isinstance(value, bool)):
+        return value
+    raise ValueError(f"not a number: {value!r}")
+
+
+def text(value):
+    if value is None:
+        raise ValueError("missing")
+    return value if isinstance(value, str) else str(value)
+
+
+class TimeSeriesStore:
+    """record_packet() queues a packet's rows and returns a mark;
+    wait_written(mark) blocks until they, and every row queued before them,
+    have been committed (or have failed for good and been counted in
+    failed). Rows with values of the wrong type are counted in rejected and
+    never queued.
+    """
+
+    def __init__(self, path, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL, read_only=False, log=None):
+        self.path = path
+        self.read_only = read_only
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.log = log or (lambda text: None)
+        self.written = 0
+        self.rejected = 0
+        self.failed = 0
+        self.queued = 0
+        self._done = 0  # rows written or failed
+        self._waiters = 0
+        self._done_cond = threading.Condition()
+        self._put_lock = threading.Lock()
+        self._queue = queue.Queue(maxsize=MAX_QUEUED)
+        self._local = threading.local()
+        self._stopping = False
+        self._thread = None
+        if read_only:
+            return
+
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+        conn.commit()
+        self._thread = threading.Thread(target=self._write_loop, daemon=True)
+        self._thread.start()
+
+    def _connect(self):
+        if self.read_only:
+            return sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, timeout=30)
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _reader(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    # ------------ Writing ------------
+
+    def record_packet(self, payload, received_at=None):
+        received_at = time.time() if received_at is None else received_at
+        ts = packet_time(payload, received_at)
+        drone_id = str(payload.get("drone_id", "unknown"))
+        rows = []
+        rejected = 0
+        averages = payload.get("averages", {})
+        for sid, stats in averages.items() if isinstance(averages, dict) else ():
+            try:
+                rows.append(("avg", (ts, drone_id, sid, number(stats.get("avg_temperature")),
+                                     number(stats.get("avg_humidity")))))
+            except (AttributeError, ValueError):
+                rejected += 1
+        anomalies = payload.get("anomalies", [])
+        for a in anomalies if isinstance(anomalies, list) else ():
+            try:
+                timestamp = a.get("timestamp")
+                rows.append(("anom", (ts, drone_id, text(a.get("sensor_id")), text(a.get("type")),
+                                      number(a.get("value")), None if timestamp is None else text(timestamp))))
+            except (AttributeError, ValueError):
+                rejected += 1
+        # Marks count rows in queue order, so they're handed out under the
+        # same lock that orders the puts.
+        with self._put_lock:
+            self.rejected += rejected
+            for row in rows:
+                self._queue.put(row)
+            self.queued += len(rows)
+            return self.queued
+
+    def wait_written(self, mark, timeout=None):
+        # True once every row up to mark is done with; False on timeout or close.
+        with self._done_cond:
+            if self._done >= mark:
+                return True
+            self._waiters += 1
+            try:
+                # Wakes a writer lingering for more rows, so it commits now.
+                self._queue.put_nowait(WAKE)
+            except queue.Full:
+                pass  # then it isn't lingering
+            try:
+                self._done_cond.wait_for(lambda: self._done >= mark or self._stopping, timeout)
+            finally:
+                self._waiters -= 1
+            return self._done >= mark
+
+    def _write_loop(self):
+        conn = self._connect()
+        while not (self._stopping and self._queue.empty()):
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            batch = [] if first is WAKE else [first]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                # Someone waiting to ack: commit what's here now rather than
+                # lingering for more.
+                remaining = 0 if self._waiters else deadline - time.monotonic()
+                try:
+                    row = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if row is not WAKE:
+                    batch.append(row)
+            if not batch:
+                continue
+            self._write_batch(conn, batch)
+            with self._done_cond:
+                self._done += len(batch)
+                self._done_cond.notify_all()
+        conn.close()
+
+    def _write_batch(self, conn, batch):
+        while True:
+            try:
+                self._insert(conn, batch)
+                self.written += len(batch)
+                return
+            except sqlite3.OperationalError as e:
+                # Locked, disk full, I/O error: the rows are fine, so keep
+                # them (handle_drone holds its acks meanwhile) unless closing.
+                if self._stopping:
+                    self.failed += len(batch)
+                    self.log(f"Time-series store closing, {len(batch)} rows lost: {str(e)}")
+                    return
+                self.log(f"Error writing to the time-series store: {str(e)}. Retrying in {RETRY_INTERVAL}s")
+                time.sleep(RETRY_INTERVAL)
+            except sqlite3.Error:
+                break
+        # Some row SQLite won't take; find it rather than lose the batch.
+        for row in batch:
+            try:
+                self._insert(conn, [row])
+                self.written += 1
+            except sqlite3.Error as e:
+                self.failed += 1
+                self.log(f"Time-series store rejected a row {row}: {str(e)}")
+
+    def _insert(self, conn, batch):
+        averages = [row for kind, row in batch if kind == "avg"]
+        anomalies = [row for kind, row in batch if kind == "anom"]
+        with conn:
+            if averages:
+                conn.executemany("INSERT INTO averages VALUES (?, ?, ?, ?, ?)", averages)
+            if anomalies:
+                conn.executemany("INSERT INTO anomalies VALUES (?, ?, ?, ?, ?, ?)", anomalies)
+
+    def close(self):
+        with self._done_cond:
+            self._stopping = True
+            self._done_cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+
+    # ------------ Queries ------------
+
+    def query(self, sensor_id, start, end, drone_id=None, limit=None):
+        sql = ("SELECT ts, drone_id, sensor_id, avg_temperature, avg_humidity FROM averages "
+               "WHERE sensor_id = ? AND ts >= ? AND ts < ?")
+        args = [sensor_id, start, end]
+        if drone_id is not None:
+            sql += " AND drone_id = ?"
+            args.append(drone_id)
+        sql += " ORDER BY ts"
+        if limit is not None:
+            sql += " LIMIT ?"
+            args.append(limit)
+        return self._reader().execute(sql, args).fetchall()
+
+    def anomalies(self, start, end, sensor_id=None, limit=None):
+        sql = "SELECT ts, drone_id, sensor_id, type, value, reading_timestamp FROM anomalies WHERE ts >= ? AND ts < ?"
+        args = [start, end]
+        if sensor_id is not None:
+            sql += " AND sensor_id = ?"
+            args.append(sensor_id)
+        sql += " ORDER BY ts"
+        if limit is not None:
+            sql += " LIMIT ?"
+            args.append(limit)
+        return self._reader().execute(sql, args).fetchall()
+
+    def rollup(self, sensor_id, start, end, bucket_seconds):
+        # Downsampled (bucket_start, count, avg/min/max temperature, avg/min/max humidity).
+        sql = ("SELECT CAST(ts / ? AS INTEGER) * ? AS bucket, COUNT(*), "
+               "AVG(avg_temperature), MIN(avg_temperature), MAX(avg_temperature), "
+               "AVG(avg_humidity), MIN(avg_humidity), MAX(avg_humidity) "
+               "FROM averages WHERE sensor_id = ? AND ts >= ? AND ts < ? "
+               "GROUP BY bucket ORDER BY bucket")
+        return self._reader().execute(sql, (bucket_seconds, bucket_seconds, sensor_id, start, end)).fetchall()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the central server's time-series store")
+    parser.add_argument("db", help="Path to the SQLite database (e.g. central.db); "
+                                   "the files of a sharded central server next to it are read too")
+    parser.add_argument("command", choices=("query", "rollup", "anomalies"))
+    parser.add_argument("sensor_id", nargs="?", help="Sensor ID (required for query and rollup)")
+    parser.add_argument("--since", type=float, default=3600, help="Seconds back from now (default: 3600)")
+    parser.add_argument("--bucket", type=float, default=60, help="Rollup bucket in seconds (default: 60)")
+    parser.add_argument("--limit", type=int, help="Maximum rows for query/anomalies")
+    args = parser.parse_args()
+    if args.command != "anomalies" and not args.sensor_id:
+        parser.error(f"{args.command} needs a sensor_id")
+
+    paths = shard_paths(args.db)
+    if not paths:
+        parser.error(f"no database at {args.db}")
+    stores = [TimeSeriesStore(path, read_only=True) for path in paths]
+    end = time.time()
+    start = end - args.since
+    if args.command == "query":
+        rows = sorted(row for store in stores for row in store.query(args.sensor_id, start, end, limit=args.limit))
+    elif args.command == "rollup":
+        rows = merge_rollups(store.rollup(args.sensor_id, start, end, args.bucket) for store in stores)
+    else:
+        rows = sorted(row for store in stores
+                      for row in store.anomalies(start, end, args.sensor_id, limit=args.limit))
+    if args.limit is not None and args.command != "rollup":
+        rows = rows[:args.limit]
+    for row in rows:
+        print(datetime.fromtimestamp(row[0]).isoformat(sep=" ", timespec="seconds"), *row[1:], sep="\t")
+
+
+if __name__ == "__main__":
+    main()
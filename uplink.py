@@ -0,0 +1,307 @@
+import json
+import os
+import random
+import socket
+import threading
+import time
+from collections import deque
+
+import metrics
+from protocol import COMPRESSIONS, FrameDecoder, FrameError, compress_frames, pack_json, set_keepalive
+
+CONNECT_TIMEOUT = 5.0
+BACKOFF_INITIAL = 0.5
+BACKOFF_MAX = 30.0
+MAX_INFLIGHT = 256
+MAX_BATCH = 64
+WELCOME_TIMEOUT = 0.5  # older central servers never send one
+
+ACK_LATENCY = metrics.histogram("uplink_ack_latency_seconds", "Time from Uplink.send() to the central server's ack")
+PACKETS_SENT = metrics.counter("uplink_packets_sent_total", "Packets written to the central server, resends included")
+RAW_BYTES = metrics.counter("uplink_raw_bytes_total", "Uplink bytes before compression")
+WIRE_BYTES = metrics.counter("uplink_wire_bytes_total", "Uplink bytes actually written")
+CONNECT_FAILURES = metrics.counter("uplink_connect_failures_total", "Failed connection attempts to the central server")
+UNSENDABLE = metrics.counter("uplink_unsendable_total", "Packets dropped because they could not be encoded")
+
+
+class Uplink:
+    """Long-lived, pipelined drone -> central connection.
+
+    send() only enqueues; a background thread keeps one TCP connection open,
+    writes up to MAX_INFLIGHT packets ahead of the central server's
+    acknowledgements and resends whatever was unacknowledged after a
+    reconnect. Each packet carries a sequence number and every connection
+    opens with a hello naming this uplink's session (and drone), so the
+    central server can route it and drop resent packets it already processed.
+    The hello also offers batch compression; a central server that supports
+    it answers with a welcome naming the method, and later batches use it.
+
+    set_pacing() trades latency for fewer, larger writes: a partial batch
+    waits up to `linger` seconds for more packets before it is sent.
+    """
+
+    def __init__(self, host, port, log, max_inflight=MAX_INFLIGHT, drone_id=None, compression=COMPRESSIONS):
+        self.host = host
+        self.port = port
+        self.log = log
+        self.drone_id = drone_id
+        self.offered_compression = list(compression)
+        self.compression = None  # agreed with the current connection
+        self.max_batch = MAX_BATCH
+        self.linger = 0.0
+        self.rtt = None  # smoothed write -> ack time, seconds
+        self.failures = 0  # consecutive failed connection attempts
+        self.max_inflight = max_inflight
+        self.session = os.urandom(8).hex()
+        self.connected = False
+        self.down_since = None  # when the link was lost or first failed to connect
+        self.acked = 0
+        self._seq = 0
+        self._pending = deque()
+        self._inflight = deque()
+        self._sent_at = deque()  # (seq, monotonic time of send()) until acked
+        self._written_at = deque()  # (last seq of a batch, monotonic time written)
+        self._pending_since = 0.0
+        self._cond = threading.Condition()
+        self._sock = None
+        self._stopping = False
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        self._drop_connection()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def send(self, packet, urgent=False):
+        # urgent flushes everything pending now instead of lingering.
+        with self._cond:
+            self._seq += 1
+            now = time.monotonic()
+            if urgent:
+                self._pending_since = 0.0
+            elif not self._pending:
+                self._pending_since = now
+            self._pending.append(dict(packet, seq=self._seq))
+            self._sent_at.append((self._seq, now))
+            self._cond.notify_all()
+            return self._seq
+
+    def set_address(self, host, port):
+        if (host, port) == (self.host, self.port):
+            return
+        self.host = host
+        self.port = port
+        self._drop_connection()
+
+    def set_pacing(self, max_batch, linger):
+        with self._cond:
+            self.max_batch = max_batch
+            self.linger = linger
+            self._cond.notify_all()
+
+    def backlog(self):
+        with self._cond:
+            return len(self._pending) + len(self._inflight)
+
+    def unsent(self):
+        """Takes every packet not yet acknowledged (without its sequence
+        number), oldest first; for saving them once the uplink is stopped."""
+        with self._cond:
+            packets = list(self._inflight) + list(self._pending)
+            self._inflight.clear()
+            self._pending.clear()
+            self._sent_at.clear()
+        for packet in packets:
+            packet.pop("seq", None)
+        return packets
+
+    def wait_acked(self, seq, timeout=None):
+        # Blocks until the central server has acknowledged everything up to seq.
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self.acked < seq and not self._stopping:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return self.acked >= seq
+
+    # ------------ Connection management ------------
+
+    def _run(self):
+        delay = BACKOFF_INITIAL
+        while not self._stopping:
+            with self._cond:
+                while not self._pending and not self._inflight and not self._stopping:
+                    self._cond.wait()
+            if self._stopping:
+                break
+            try:
+                sock = socket.create_connection((self.host, self.port), timeout=CONNECT_TIMEOUT)
+            except OSError as e:
+                CONNECT_FAILURES.inc()
+                self.failures += 1
+                if self.down_since is None:
+                    self.down_since = time.monotonic()
+                self.log(f"Error connecting to Central Server: {str(e)}. Retrying in {delay:.1f}s")
+                self._sleep(delay * random.uniform(0.5, 1.0))
+                delay = min(delay * 2, BACKOFF_MAX)
+                continue
+
+            delay = BACKOFF_INITIAL
+            self.failures = 0
+            sock.settimeout(None)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            set_keepalive(sock)
+            with self._cond:
+                self._sock = sock
+                self.connected = True
+                self.down_since = None
+                self.compression = None
+            self.log(f"Uplink connected to Central Server at {self.host}:{self.port}")
+            reader = threading.Thread(target=self._read_acks, args=(sock,), daemon=True)
+            reader.start()
+            try:
+                sock.sendall(pack_json({"type": "hello", "session": self.session, "drone_id": self.drone_id,
+                                        "compression": self.offered_compression}))
+                with self._cond:
+                    self._cond.wait_for(lambda: self.compression or self._stopping or self._sock is not sock,
+                                        timeout=WELCOME_TIMEOUT)
+                self._write_loop(sock)
+            except OSError as e:
+                if not self._stopping:
+                    self.log(f"Uplink to Central Server lost: {str(e)}")
+            except Exception as e:
+                # Never let the thread die: reconnect and carry on.
+                self.log(f"Uplink error: {e!r}")
+                self._sleep(BACKOFF_INITIAL)
+            finally:
+                self._drop_connection()
+                reader.join(timeout=1)
+                with self._cond:
+                    # Unacknowledged packets go back to the front, in order.
+                    self._pending.extendleft(reversed(self._inflight))
+                    self._inflight.clear()
+                    self._written_at.clear()
+                    self._pending_since = 0.0  # resend without lingering
+
+    def _ready_to_write(self):
+        # 0 when a batch should go out now, else seconds to wait (None: until notified).
+        if not self._pending or len(self._inflight) >= self.max_inflight:
+            return None
+        if len(self._pending) >= self.max_batch:
+            return 0
+        return max(0.0, self._pending_since + self.linger - time.monotonic())
+
+    def _write_loop(self, sock):
+        while True:
+            with self._cond:
+                while not self._stopping and self._sock is sock:
+                    wait = self._ready_to_write()
+                    if wait == 0:
+                        break
+                    self._cond.wait(wait)
+                if self._stopping or self._sock is not sock:
+                    return
+                batch = []
+                while self._pending and len(batch) < self.max_batch and len(self._inflight) < self.max_inflight:
+                    packet = self._pending.popleft()
+                    self._inflight.append(packet)
+                    batch.append(packet)
+                now = time.monotonic()
+                if self._pending:
+                    self._pending_since = now
+                self._written_at.append((batch[-1]["seq"], now))
+                compression = self.compression
+            frames = []
+            for packet in batch:
+                try:
+                    frames.append(pack_json(packet))
+                except (FrameError, TypeError, ValueError) as e:
+                    self._discard(packet, e)
+            if not frames:
+                continue
+            data = compress_frames(frames, compression) if compression else b"".join(frames)
+            sock.sendall(data)
+            PACKETS_SENT.inc(len(frames))
+            RAW_BYTES.inc(sum(len(frame) for frame in frames))
+            WIRE_BYTES.inc(len(data))
+
+    def _discard(self, packet, error):
+        # A packet that can't be encoded (e.g. over MAX_FRAME_SIZE) would
+        # fail again on every resend; drop it. Acks are cumulative, so the
+        # gap in sequence numbers is harmless.
+        with self._cond:
+            try:
+                self._inflight.remove(packet)
+            except ValueError:
+                pass
+        UNSENDABLE.inc()
+        self.log(f"Dropped uplink packet {packet.get('seq')}: {error}")
+
+    def _read_acks(self, sock):
+        decoder = FrameDecoder()
+        try:
+            while True:
+                data = sock.recv(65536)
+                if not data:
+                    break
+                for frame in decoder.feed(data):
+                    msg = json.loads(frame)
+                    if msg.get("type") == "welcome":
+                        with self._cond:
+                            if msg.get("compression") in self.offered_compression:
+                                self.compression = msg["compression"]
+                            self._cond.notify_all()
+                        continue
+                    ack = msg.get("ack")
+                    if ack is not None:
+                        self._acknowledge(ack)
+        except (OSError, FrameError, ValueError):
+            pass
+        finally:
+            if self._sock is sock and not self._stopping:
+                self.log("Uplink to Central Server closed by peer")
+            self._drop_connection(sock)
+
+    def _acknowledge(self, seq):
+        with self._cond:
+            while self._inflight and self._inflight[0]["seq"] <= seq:
+                self._inflight.popleft()
+            now = time.monotonic()
+            while self._sent_at and self._sent_at[0][0] <= seq:
+                ACK_LATENCY.observe(now - self._sent_at.popleft()[1])
+            while self._written_at and self._written_at[0][0] <= seq:
+                rtt = now - self._written_at.popleft()[1]
+                self.rtt = rtt if self.rtt is None else 0.8 * self.rtt + 0.2 * rtt
+            self.acked = max(self.acked, seq)
+            self._cond.notify_all()
+
+    def _drop_connection(self, sock=None):
+        with self._cond:
+            if sock is not None and sock is not self._sock:
+                return
+            sock = self._sock
+            self._sock = None
+            if self.connected:
+                self.down_since = time.monotonic()
+            self.connected = False
+            self._cond.notify_all()
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            sock.close()
+
+    def _sleep(self, seconds):
+        with self._cond:
+            self._cond.wait_for(lambda: self._stopping, timeout=seconds)
@@ -0,0 +1,248 @@
+import math
+import re
+import threading
+from array import array
+from time import perf_counter
+
+# Columnar per-sensor ring buffers. Each window keeps its readings in
+# fixed-size float arrays plus running sums, so appending is O(1) and the
+# mean/stddev of a window can be read without touching the readings.
+
+FIELDS = ("temperature", "humidity")
+BASIC_AGGREGATIONS = ("mean", "min", "max", "stddev")
+PERCENTILE = re.compile(r"^p(\d{1,2}(?:\.\d+)?)$")
+SHARDS = 16
+
+
+def check_aggregations(aggregations):
+    for agg in aggregations:
+        if agg not in BASIC_AGGREGATIONS and not PERCENTILE.match(agg):
+            raise ValueError(f"Unknown aggregation {agg!r}; expected one of "
+                             f"{', '.join(BASIC_AGGREGATIONS)} or a percentile like p95")
+    return tuple(aggregations)
+
+
+def stat_key(agg, field):
+    # "mean" keeps the historical avg_* names the central server expects.
+    if agg == "mean":
+        return f"avg_{field}"
+    return f"{agg}_{field}"
+
+
+def percentile(values, q):
+    # Linear interpolation between closest ranks, as numpy.percentile does.
+    ordered = sorted(values)
+    if len(ordered) == 1:
+        return ordered[0]
+    pos = (len(ordered) - 1) * q / 100.0
+    lo = int(pos)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (pos - lo)
+
+
+class SensorWindow:
+    __slots__ = ("size", "count", "head", "total", "temperature", "humidity",
+                 "timestamps", "sum_temperature", "sum_humidity", "sq_temperature", "sq_humidity")
+
+    def __init__(self, size):
+        self.size = size
+        self.count = 0
+        self.head = 0   # next slot to write
+        self.total = 0  # readings ever appended
+        self.temperature = array("d", bytes(8 * size))
+        self.humidity = array("d", bytes(8 * size))
+        self.timestamps = [None] * size
+        self.sum_temperature = self.sum_humidity = 0.0
+        self.sq_temperature = self.sq_humidity = 0.0
+
+    def append(self, temperature, humidity, timestamp):
+        i = self.head
+        if self.count == self.size:
+            old_t = self.temperature[i]
+            old_h = self.humidity[i]
+            self.sum_temperature -= old_t
+            self.sum_humidity -= old_h
+            self.sq_temperature -= old_t * old_t
+            self.sq_humidity -= old_h * old_h
+        else:
+            self.count += 1
+        self.temperature[i] = temperature
+        self.humidity[i] = humidity
+        self.timestamps[i] = timestamp
+        self.sum_temperature += temperature
+        self.sum_humidity += humidity
+        self.sq_temperature += temperature * temperature
+        self.sq_humidity += humidity * humidity
+        self.total += 1
+        self.head = (i + 1) % self.size
+        if self.head == 0:
+            # Once per lap, recompute exactly so subtraction error can't drift.
+            self._resum()
+
+    def _resum(self):
+        n = self.count
+        t = self.temperature[:n] if n < self.size else self.temperature
+        h = self.humidity[:n] if n < self.size else self.humidity
+        self.sum_temperature = math.fsum(t)
+        self.sum_humidity = math.fsum(h)
+        self.sq_temperature = math.fsum(v * v for v in t)
+        self.sq_humidity = math.fsum(v * v for v in h)
+
+    def __len__(self):
+        return self.count
+
+    def column(self, field):
+        values = self.temperature if field == "temperature" else self.humidity
+        return values if self.count == self.size else values[:self.count]
+
+    def mean(self, field):
+        total = self.sum_temperature if field == "temperature" else self.sum_humidity
+        return total / self.count
+
+    def stddev(self, field):
+        sq = self.sq_temperature if field == "temperature" else self.sq_humidity
+        mean = self.mean(field)
+        return math.sqrt(max(sq / self.count - mean * mean, 0.0))
+
+    def aggregate(self, agg, field):
+        if agg == "mean":
+            return self.mean(field)
+        if agg == "stddev":
+            return self.stddev(field)
+        if agg == "min":
+            return min(self.column(field))
+        if agg == "max":
+            return max(self.column(field))
+        return percentile(self.column(field), float(agg[1:]))
+
+    def newest(self, n):
+        # The n most recent readings, newest first.
+        i = self.head
+        for _ in range(min(n, self.count)):
+            i = (i - 1) % self.size
+            yield self.timestamps[i], self.temperature[i], self.humidity[i]
+
+    def readings(self):
+        # Oldest first, as (timestamp, temperature, humidity).
+        start = (self.head - self.count) % self.size
+        for n in range(self.count):
+            i = (start + n) % self.size
+            yield self.timestamps[i], self.temperature[i], self.humidity[i]
+
+
+class WindowStats:
+    """Per-sensor SensorWindows with a configured window length and aggregations."""
+
+    def __init__(self, size=5, aggregations=("mean",)):
+        if size < 1:
+            raise ValueError("Window size must be at least 1")
+        self.size = size
+        aggregations = check_aggregations(aggregations)
+        # The uplink packet format always carries the mean.
+        if "mean" not in aggregations:
+            aggregations = ("mean",) + aggregations
+        self.aggregations = aggregations
+        self._plan = [(stat_key(agg, field), agg, field) for agg in aggregations for field in FIELDS]
+        self.windows = {}
+
+    def append(self, sensor_id, temperature, humidity, timestamp=None):
+        window = self.windows.get(sensor_id)
+        if window is None:
+            window = self.windows[sensor_id] = SensorWindow(self.size)
+        window.append(temperature, humidity, timestamp)
+        return window
+
+    def summarize(self, window):
+        n = window.count
+        summary = {
+            "avg_temperature": round(window.sum_temperature / n, 2),
+            "avg_humidity": round(window.sum_humidity / n, 2)
+        }
+        for key, agg, field in self._plan:
+            if agg != "mean":
+                summary[key] = round(window.aggregate(agg, field), 2)
+        return summary
+
+    def items(self):
+        return self.windows.items()
+
+    def __len__(self):
+        return len(self.windows)
+
+
+class ShardedWindowStats:
+    """WindowStats split by sensor ID into independently locked shards.
+
+    append() holds one shard's lock for one O(1) append. snapshot() swaps
+    each shard's pending sensors (updated since they were last summarized)
+    for an empty dict and re-summarizes only those, so the aggregation tick
+    holds any one lock just long enough to summarize that shard's changed
+    windows. flush() summarizes just the pending sensors that have piled up
+    enough readings, or waited long enough, to go out ahead of the tick.
+    All take an optional observe_wait(seconds) callback for lock wait times.
+    """
+
+    def __init__(self, size=5, aggregations=("mean",), shards=SHARDS):
+        self.shards = [WindowStats(size, aggregations) for _ in range(shards)]
+        self.locks = [threading.Lock() for _ in range(shards)]
+        self._pending = [{} for _ in range(shards)]  # sensor ID -> [new readings, perf_counter of first]
+        self._summaries = [{} for _ in range(shards)]  # sensor ID -> last summary
+
+    def append(self, sensor_id, temperature, humidity, timestamp=None, observe_wait=None):
+        i = hash(sensor_id) % len(self.shards)
+        waited = perf_counter()
+        with self.locks[i]:
+            if observe_wait is not None:
+                observe_wait(perf_counter() - waited)
+            self.shards[i].append(sensor_id, temperature, humidity, timestamp)
+            pending = self._pending[i].get(sensor_id)
+            if pending is None:
+                self._pending[i][sensor_id] = [1, waited]
+            else:
+                pending[0] += 1
+
+    def snapshot(self, observe_wait=None):
+        """Returns {sensor_id: summary} for every sensor with readings."""
+        averages = {}
+        for i, shard in enumerate(self.shards):
+            waited = perf_counter()
+            with self.locks[i]:
+                if observe_wait is not None:
+                    observe_wait(perf_counter() - waited)
+                pending, self._pending[i] = self._pending[i], {}
+                summaries = self._summaries[i]
+                for sensor_id in pending:
+                    summaries[sensor_id] = shard.summarize(shard.windows[sensor_id])
+                averages.update(summaries)
+        return averages
+
+    def flush(self, count=None, age=None, observe_wait=None):
+        """Returns {sensor_id: summary} for the sensors with at least `count`
+        readings not yet summarized, or whose oldest is `age` seconds old."""
+        flushed = {}
+        oldest = perf_counter() - age if age is not None else None
+        for i, shard in enumerate(self.shards):
+            waited = perf_counter()
+            with self.locks[i]:
+                if observe_wait is not None:
+                    observe_wait(perf_counter() - waited)
+                pending = self._pending[i]
+                due = [sensor_id for sensor_id, (n, first) in pending.items()
+                       if (count is not None and n >= count) or (oldest is not None and first <= oldest)]
+                summaries = self._summaries[i]
+                for sensor_id in due:
+                    del pending[sensor_id]
+                    flushed[sensor_id] = summaries[sensor_id] = shard.summarize(shard.windows[sensor_id])
+        return flushed
+
+    def forget(self, sensor_ids):
+        """Drops the windows of sensors that have gone away."""
+        for sensor_id in sensor_ids:
+            i = hash(sensor_id) % len(self.shards)
+            with self.locks[i]:
+                self.shards[i].windows.pop(sensor_id, None)
+                self._pending[i].pop(sensor_id, None)
+                self._summaries[i].pop(sensor_id, None)
+
+    def __len__(self):
+        return sum(len(shard) for shard in self.shards)